@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+"""Approximate nearest-neighbour search: an inverted-file (IVF) index.
+
+`VectorIndex` scores every row for every query. That cost is linear in the
+corpus size, and past a few hundred thousand label chunks it dominates
+retrieval. `IVFIndex` is a drop-in `VectorIndex` that clusters the rows
+with spherical k-means (in NumPy) into ``nlist`` lists, about sqrt(n) by
+default. A query is compared with the centroids first, and then scored
+exactly against the rows of the ``nprobe`` closest lists only. Raising
+`nprobe` trades latency for recall; ``nprobe == nlist`` is exact search.
+
+Training runs once the index holds `RAG_IVF_MIN_ROWS` rows, and again each
+time it has doubled since the last training. Rows added in between join the
+list of their nearest centroid. Below the threshold, and before the first
+training, searches are exact, so small indexes behave as before.
+
+Rows are stored grouped by list, so a probe scores one contiguous slice of
+the matrix; gathering scattered rows would cost as much as the exact scan.
+Writes break the grouping. It is restored (one pass over the rows) by the
+next search or by `optimize`.
+
+``python -m agents.bench_ann`` reports recall@k against exact search and
+latency for a range of ``nprobe`` values.
+"""
+
+import os
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+import numpy as np
+
+from .vector_index import DEFAULT_DIM, EmbedFn, VectorIndex, hash_embed, normalize_rows, top_k
+
+__all__ = [
+    "RAG_IVF_NPROBE",
+    "RAG_IVF_MIN_ROWS",
+    "kmeans",
+    "IVFIndex",
+]
+
+# Lists probed per query; the recall/latency knob.
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+# Below this many rows search stays exact and no clustering is trained.
+RAG_IVF_MIN_ROWS = int(os.getenv("RAG_IVF_MIN_ROWS", "20000"))
+
+# k-means trains on a sample of this many rows per list.
+_SAMPLE_PER_LIST = 64
+# Rows scored per matrix product while assigning; bounds scratch memory.
+_BLOCK_ROWS = 16384
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), _BLOCK_ROWS):
+        out[start : start + _BLOCK_ROWS] = np.argmax(x[start : start + _BLOCK_ROWS] @ centroids.T, axis=1)
+    return out
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = 8, seed: int = 0) -> np.ndarray:
+    """Spherical k-means of the unit rows of *x*; returns ``(k, dim)`` unit centroids."""
+
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        sums = np.add.reduceat(x[np.argsort(assign, kind="stable")], starts, axis=0)
+        centroids[filled] = normalize_rows(sums)
+        # An empty list restarts from a random row.
+        centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()))]
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+    """`VectorIndex` whose searches only score the rows of nearby clusters."""
+
+    def __init__(
+        self,
+        embed: EmbedFn = hash_embed,
+        dim: int = DEFAULT_DIM,
+        nprobe: int = RAG_IVF_NPROBE,
+        min_rows: int = RAG_IVF_MIN_ROWS,
+        nlist: int | None = None,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(embed, dim)
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.nlist = nlist
+        self.seed = seed
+        self.centroids: np.ndarray | None = None
+        # List of every row, parallel to the row buffer.
+        self._assign = np.zeros(self._buf.shape[0], dtype=np.int32)
+        self._trained_rows = 0
+        # Start row of every list while rows are grouped; None after writes.
+        self._offsets: np.ndarray | None = None
+
+    def _reserve(self, n_rows: int) -> None:
+        super()._reserve(n_rows)
+        if self._buf.shape[0] > len(self._assign):
+            assign = np.zeros(self._buf.shape[0], dtype=np.int32)
+            assign[: len(self._assign)] = self._assign
+            self._assign = assign
+
+    # -- mutation ----------------------------------------------------------
+
+    def add_embedded(self, items: Iterable[tuple[str, str]], vectors: np.ndarray) -> None:
+        pending = dict(items)
+        super().add_embedded(pending.items(), vectors)
+        if not pending:
+            return
+        if len(self) >= max(self.min_rows, 2 * self._trained_rows):
+            self.train()
+        elif self.centroids is not None:
+            rows = np.fromiter((self._pos[doc_id] for doc_id in pending), dtype=np.int64)
+            self._assign[rows] = _nearest(self._buf[rows], self.centroids)
+            self._offsets = None
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        for doc_id in doc_ids:
+            pos = self._pos.get(doc_id)
+            if pos is None:
+                continue
+            # The parent moves the last row into the hole; move its list too.
+            last = len(self) - 1
+            super().remove([doc_id])
+            self._assign[pos] = self._assign[last]
+        self._offsets = None
+
+    def train(self, nlist: int | None = None) -> None:
+        """Cluster the current rows into *nlist* lists (default ~sqrt(rows))."""
+
+        n = len(self)
+        if n == 0:
+            return
+        k = min(n, nlist or self.nlist or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(self.seed)
+        sample = rng.choice(n, min(n, k * _SAMPLE_PER_LIST), replace=False)
+        self.centroids = kmeans(self.matrix[sample], k, seed=self.seed)
+        self._assign[:n] = _nearest(self.matrix, self.centroids)
+        self._trained_rows = n
+        self.optimize()
+
+    def optimize(self) -> None:
+        """Group the rows by list again after writes (no-op when grouped).
+
+        Searches do this on demand. Call it up front when the index will be
+        searched from several threads without a lock.
+        """
+
+        if self.centroids is None or self._offsets is not None:
+            return
+        n = len(self)
+        assign = self._assign[:n]
+        order = np.argsort(assign, kind="stable")
+        self._buf[:n] = self._buf[order]
+        self._ids = [self._ids[i] for i in order]
+        self._docs = [self._docs[i] for i in order]
+        self._pos = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._assign[:n] = assign[order]
+        sizes = np.bincount(self._assign[:n], minlength=len(self.centroids))
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+    # -- search ------------------------------------------------------------
+
+    def search_batch(
+        self, queries: Sequence[str], k: int = 3, threshold: float | None = None
+    ) -> list[list[tuple[str, float]]]:
+        if self.centroids is None:
+            return super().search_batch(queries, k, threshold)
+        if not queries:
+            return []
+        q = normalize_rows(np.asarray(self.embed(list(queries))))
+        self.optimize()
+        offsets = self._offsets
+        probes = top_k(q @ self.centroids.T, min(self.nprobe, len(self.centroids)))
+        results = []
+        for row, probe in zip(q, probes):
+            spans = [(offsets[c], offsets[c + 1]) for c, _ in probe]
+            scores = np.concatenate([self._buf[a:b] @ row for a, b in spans])
+            rows = np.concatenate([np.arange(a, b) for a, b in spans])
+            hits = top_k(scores[None, :], k, threshold)[0]
+            results.append([(self._ids[rows[i]], s) for i, s in hits])
+        return results
+
+    def stats(self) -> dict[str, Any]:
+        sizes = (
+            np.bincount(self._assign[: len(self)], minlength=len(self.centroids))
+            if self.centroids is not None
+            else np.zeros(0, dtype=np.int64)
+        )
+        return {
+            "rows": len(self),
+            "lists": len(sizes),
+            "nprobe": self.nprobe,
+            "trained_rows": self._trained_rows,
+            "largest_list": int(sizes.max()) if len(sizes) else 0,
+        }
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+"""Semantic answer cache for the RAG branch.
+
+Answers are keyed by the normalised question plus a hash of the exact context
+the model saw, so a cached answer is only reused when retrieval produced the
+same evidence. The key keeps every word but a few fillers ("the", "of",
+"is"): "When should I take aspirin?" and "Why should I take aspirin?" are
+different questions. Within one context, a question with exactly the same
+terms as a cached one, in another order ("max dose of ibuprofen?" vs
+"ibuprofen maximum dose"), is served as a near-duplicate hit, unless word
+order matters to it ("aspirin before ibuprofen"). Any added or missing term
+is a miss: "max dose of ibuprofen for kids" must not get the adult answer, and
+embedding similarity cannot tell those two apart.
+
+Entries expire after a TTL and are evicted least-recently-used once either
+the entry count or the approximate memory cap is exceeded. Entries remember
+which documents their context came from; `invalidate_docs` drops them when
+one of those documents changes.
+"""
+
+import dataclasses
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from . import metrics
+from .bm25 import tokenize
+
+__all__ = [
+    "normalize_question",
+    "context_hash",
+    "CacheStats",
+    "AnswerCache",
+    "answer_cache",
+]
+
+# Words a question can lose without changing what it asks. Everything else
+# stays in the key, including question words ("when" vs "why"), negations,
+# conjunctions ("with" vs "or") and pronouns ("kids" vs "my kids"), so
+# questions that differ in them are cached apart. "s" is what is left of
+# "what's" / "aspirin's" once the apostrophe splits the word.
+_FILLER = frozenset("a an the of is are was be please s".split())
+
+# Terms whose order carries meaning ("aspirin before ibuprofen"): questions
+# with one of them are only served on an exact match.
+_ORDERED = frozenset("before after then than until instead".split())
+
+
+def normalize_question(question: str) -> str:
+    """Reduce *question* to its key terms: lower-cased, punctuation and
+    filler words dropped, units and "maximum"/"minimum" folded."""
+
+    return " ".join(tokenize(question, stopwords=_FILLER))
+
+
+def _terms(norm: str) -> frozenset[str]:
+    return frozenset(norm.split())
+
+
+def context_hash(context: str) -> str:
+    return hashlib.sha256(context.encode()).hexdigest()[:32]
+
+
+@dataclass
+class _Entry:
+    answer: str
+    doc_ids: frozenset[str]
+    expires_at: float
+    size: int
+
+
+@dataclass
+class CacheStats:
+    exact_hits: int = 0
+    near_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.near_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "entries": self.entries,
+            "bytes": self.bytes,
+        }
+
+
+class AnswerCache:
+    """Thread-safe LRU/TTL cache of RAG answers with near-duplicate lookup."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        # context hash -> questions cached for it (near-duplicate candidates)
+        self._by_context: dict[str, set[str]] = {}
+        # doc id -> keys whose context includes that document
+        self._by_doc: dict[str, set[tuple[str, str]]] = {}
+        self._bytes = 0
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -- bookkeeping -------------------------------------------------------
+
+    def _drop(self, key: tuple[str, str]) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        question, ctx = key
+        bucket = self._by_context.get(ctx)
+        if bucket is not None:
+            bucket.discard(question)
+            if not bucket:
+                del self._by_context[ctx]
+        for doc_id in entry.doc_ids:
+            keys = self._by_doc.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_doc[doc_id]
+
+    def _live(self, key: tuple[str, str], now: float) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._drop(key)
+            self._stats.expirations += 1
+            return None
+        return entry
+
+    # -- public API --------------------------------------------------------
+
+    def lookup(self, question: str, context: str) -> str | None:
+        """Return a cached answer for *question* under *context*, if any."""
+
+        norm = normalize_question(question)
+        ctx = context_hash(context)
+        with self._lock:
+            now = self.clock()
+            key = (norm, ctx)
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats.exact_hits += 1
+                return entry.answer
+
+            terms = _terms(norm)
+            candidates = () if terms & _ORDERED else self._by_context.get(ctx, ())
+            for q in list(candidates):
+                if _terms(q) != terms:
+                    continue
+                entry = self._live((q, ctx), now)
+                if entry is not None:
+                    self._entries.move_to_end((q, ctx))
+                    self._stats.near_hits += 1
+                    return entry.answer
+
+            self._stats.misses += 1
+            return None
+
+    def store(
+        self,
+        question: str,
+        context: str,
+        answer: str,
+        doc_ids: Iterable[str] = (),
+    ) -> None:
+        """Cache *answer*; *doc_ids* are the documents behind *context*."""
+
+        norm = normalize_question(question)
+        ctx = context_hash(context)
+        key = (norm, ctx)
+        entry = _Entry(
+            answer=answer,
+            doc_ids=frozenset(doc_ids),
+            expires_at=self.clock() + self.ttl_seconds,
+            # Rough footprint: strings as UTF-8 plus bookkeeping.
+            size=len(norm.encode()) + len(answer.encode()) + 64,
+        )
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._by_context.setdefault(ctx, set()).add(norm)
+            for doc_id in entry.doc_ids:
+                self._by_doc.setdefault(doc_id, set()).add(key)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._entries)))
+                self._stats.evictions += 1
+
+    def invalidate_docs(self, doc_ids: Iterable[str]) -> int:
+        """Drop every entry whose context used one of *doc_ids*."""
+
+        dropped = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                for key in list(self._by_doc.get(str(doc_id), ())):
+                    if key in self._entries:
+                        self._drop(key)
+                        dropped += 1
+            self._stats.invalidations += dropped
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_doc.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            snapshot = dataclasses.replace(self._stats)
+            snapshot.entries = len(self._entries)
+            snapshot.bytes = self._bytes
+            return snapshot
+
+
+# Process-wide cache used by `rag_answer`.
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("RAG_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RAG_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("RAG_CACHE_TTL_SECONDS", "3600")),
+)
+metrics.register("answer_cache", lambda: answer_cache.stats().as_dict())
@@ -0,0 +1,237 @@
+"""
+Offline agent latency benchmark.
+
+Run from ``backend/`` with:
+    python -m agents.bench_agent --ttft-ms 300 --token-ms 20 --tokens 40 --runs 20
+
+Every prompt in ``agents/testprompts.txt`` is replayed through the compiled
+graph and through the ``/chat`` route (mounted on a bare FastAPI app with an
+in-memory checkpointer, so no database or provider is needed), with
+`FakeStreamingChatModel` standing in for the LLM. The report lists the branch
+each prompt was routed to, then time-to-first-token and end-to-end latency
+percentiles per target. ``--json`` prints the same numbers for CI.
+
+``--prefill-us`` adds that many microseconds of time-to-first-token per prompt
+token, so prompt size shows up in the latencies.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+import agents.graph as agent_graph
+from .answer_cache import answer_cache
+from .fake_llm import FakeStreamingChatModel
+from .intent import load_examples
+from .metrics import percentile
+from .state import ANSWER_NODES
+
+# Same ``label:``-headed format as the intent examples.
+PROMPTS_FILE = Path(__file__).with_name("testprompts.txt")
+
+
+def percentiles(samples: list[float]) -> dict[str, float | None]:
+    """p50/p95/p99 of *samples* (seconds) in milliseconds; ``None`` without samples."""
+
+    ordered = sorted(samples)
+    report: dict[str, float | None] = {}
+    for pct in (50, 95, 99):
+        value = percentile(ordered, pct)
+        report[f"p{pct}_ms"] = None if value is None else value * 1000
+    return report
+
+
+async def _run_graph(graph: Any, prompt: str) -> tuple[str, float, float]:
+    """Return (answering node, TTFT, total seconds) for one graph run."""
+
+    start = time.perf_counter()
+    ttft = None
+    branch = ""
+    async for message, metadata in graph.astream(
+        {"messages": [{"role": "user", "content": prompt}]}, stream_mode="messages"
+    ):
+        node = metadata.get("langgraph_node")
+        if node in ANSWER_NODES and message.content:
+            branch = node
+            if ttft is None:
+                ttft = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return branch, total if ttft is None else ttft, total
+
+
+def _chat_app() -> Any:
+    from fastapi import FastAPI
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from app.api.routes import agent as agent_route
+
+    app = FastAPI()
+    app.include_router(agent_route.router)
+    app.state.chat_graph = agent_graph.build_graph(InMemorySaver())
+    return app
+
+
+async def _run_route(app: Any, prompt: str) -> tuple[float, float]:
+    """POST *prompt* to ``/chat/`` over raw ASGI; return (TTFT, total seconds)."""
+
+    body = json.dumps(
+        {"threadId": str(uuid.uuid4()), "messages": [{"role": "user", "content": prompt}]}
+    ).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/chat/",
+        "raw_path": b"/chat/",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("bench", 0),
+        "server": ("bench", 80),
+        "state": {},
+    }
+    sent = False
+    ttft = None
+    finished = asyncio.Event()
+
+    async def receive() -> dict[str, Any]:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal ttft
+        if message["type"] != "http.response.body":
+            return
+        if ttft is None and b'"type": "0"' in message.get("body", b""):
+            ttft = time.perf_counter() - start
+        if not message.get("more_body", False):
+            finished.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    total = time.perf_counter() - start
+    return total if ttft is None else ttft, total
+
+
+async def _bench(runs: int, targets: list[str], keep_cache: bool) -> dict[str, Any]:
+    prompts = load_examples(PROMPTS_FILE)
+    graph = agent_graph.build_graph()
+    app = _chat_app() if "route" in targets else None
+    routing: dict[str, str] = {}
+    samples: dict[str, dict[str, list[float]]] = {
+        t: {"ttft": [], "total": []} for t in targets
+    }
+
+    for _ in range(runs):
+        for prompt, _ in prompts:
+            for target in targets:
+                if not keep_cache:
+                    answer_cache.clear()
+                if target == "graph":
+                    branch, ttft, total = await _run_graph(graph, prompt)
+                    routing[prompt] = branch
+                else:
+                    ttft, total = await _run_route(app, prompt)
+                samples[target]["ttft"].append(ttft)
+                samples[target]["total"].append(total)
+
+    return {
+        "prompts": len(prompts),
+        "runs": runs,
+        "routing": routing,
+        "latency": {
+            target: {
+                "ttft": percentiles(s["ttft"]),
+                "end_to_end": percentiles(s["total"]),
+            }
+            for target, s in samples.items()
+        },
+    }
+
+
+def run_benchmark(
+    ttft_ms: float = 300.0,
+    token_ms: float = 20.0,
+    tokens: int = 40,
+    runs: int = 10,
+    targets: tuple[str, ...] = ("graph", "route"),
+    keep_cache: bool = False,
+    prefill_us: float = 0.0,
+) -> dict[str, Any]:
+    """Replay the test prompts with a fake model installed and return the report."""
+
+    previous = agent_graph.llm
+    agent_graph.llm = FakeStreamingChatModel(
+        ttft=ttft_ms / 1000,
+        token_latency=token_ms / 1000,
+        prompt_token_latency=prefill_us / 1e6,
+        max_tokens=tokens,
+    )
+    try:
+        return asyncio.run(_bench(runs, list(targets), keep_cache))
+    finally:
+        agent_graph.llm = previous
+
+
+def _ms(value: float | None) -> str:
+    return "     n/a" if value is None else f"{value:8.1f}"
+
+
+def _print_report(report: dict[str, Any]) -> None:
+    print(f"{report['prompts']} prompts x {report['runs']} runs")
+    print("routing:")
+    for prompt, branch in report["routing"].items():
+        print(f"  {branch:<11} {prompt}")
+    for target, stats in report["latency"].items():
+        print(f"{target}:")
+        for metric, values in stats.items():
+            print(
+                f"  {metric:<11} p50 {_ms(values['p50_ms'])} ms   "
+                f"p95 {_ms(values['p95_ms'])} ms   p99 {_ms(values['p99_ms'])} ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--prefill-us", type=float, default=0.0)
+    parser.add_argument(
+        "--targets", nargs="+", choices=["graph", "route"], default=["graph", "route"]
+    )
+    parser.add_argument(
+        "--keep-cache", action="store_true", help="let the answer cache serve repeats"
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    report = run_benchmark(
+        args.ttft_ms,
+        args.token_ms,
+        args.tokens,
+        args.runs,
+        tuple(args.targets),
+        args.keep_cache,
+        args.prefill_us,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+ANN benchmark: recall@k and latency of `IVFIndex` against exact search.
+
+Run from ``backend/`` with:
+    python -m agents.bench_ann --sizes 50000 200000 --nprobe 1 2 4 8 16 32
+
+Documents come from the synthetic corpus of `bench_retrieval`. Every
+document is embedded once; the exact `VectorIndex` and the `IVFIndex` hold
+the same vectors. Two query sets are scored:
+
+* lookup: "what is the dose of <drug>" style questions (`sample_queries`)
+* passage: a document with 40% of its words dropped, i.e. a query that is
+  genuinely close to one document, as a real embedding model produces
+
+For each ``nprobe`` the report shows recall@k (the share of the exact top-k
+also returned by IVF) for both sets, query latency and the speed-up over
+exact search, so an operating point can be chosen and set as
+``RAG_IVF_NPROBE``. The synthetic snippets all share one template, which
+makes clusters overlap; expect better recall on real corpora.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+
+from .ann import IVFIndex
+from .bench_retrieval import sample_queries, synthetic_corpus, time_queries
+from .vector_index import VectorIndex, hash_embed
+
+
+def _recall(exact: VectorIndex, ann: IVFIndex, queries: list[str], k: int) -> float:
+    truth = exact.search_batch(queries, k)
+    found = ann.search_batch(queries, k)
+    return statistics.fmean(
+        len({i for i, _ in want} & {i for i, _ in got}) / max(len(want), 1)
+        for want, got in zip(truth, found)
+    )
+
+
+def passage_queries(corpus: dict[str, str], n: int, seed: int = 2) -> list[str]:
+    rng = random.Random(seed)
+    docs = rng.sample(list(corpus.values()), min(n, len(corpus)))
+    return [" ".join(w for w in doc.split() if rng.random() < 0.6) for doc in docs]
+
+
+def run_benchmark(sizes: list[int], nprobes: list[int], n_queries: int, k: int) -> None:
+    for size in sizes:
+        corpus = synthetic_corpus(size)
+        queries = sample_queries(corpus, n_queries)
+        passages = passage_queries(corpus, n_queries)
+        start = time.perf_counter()
+        vectors = hash_embed(list(corpus.values()))
+        embed_s = time.perf_counter() - start
+
+        exact = VectorIndex()
+        exact.add_embedded(corpus.items(), vectors)
+        ann = IVFIndex(min_rows=size + 1)  # train explicitly below
+        ann.add_embedded(corpus.items(), vectors)
+        start = time.perf_counter()
+        ann.train()
+        train_s = time.perf_counter() - start
+
+        stats = ann.stats()
+        print(
+            f"corpus={size} docs, {len(queries)} queries, k={k}: embedding {embed_s:.1f} s, "
+            f"IVF training {train_s:.2f} s, {stats['lists']} lists (largest {stats['largest_list']})"
+        )
+        base = time_queries(lambda q: exact.search(q, k), queries)
+        print(f"  {'exact':<12} recall@{k} lookup 1.000 passage 1.000   p50 {base['p50_ms']:8.3f} ms   p95 {base['p95_ms']:8.3f} ms")
+        for nprobe in nprobes:
+            ann.nprobe = nprobe
+            timed = time_queries(lambda q: ann.search(q, k), queries)
+            print(
+                f"  nprobe={nprobe:<5} recall@{k} lookup {_recall(exact, ann, queries, k):.3f} "
+                f"passage {_recall(exact, ann, passages, k):.3f}   "
+                f"p50 {timed['p50_ms']:8.3f} ms   p95 {timed['p95_ms']:8.3f} ms   "
+                f"{base['p50_ms'] / timed['p50_ms']:5.1f}x faster"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50_000, 200_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.nprobe, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Context compression benchmark: answer prompt size and latency, off vs on.
+
+Run from ``backend/`` with:
+    python -m agents.bench_compress --ttft-ms 300 --prefill-us 200 --runs 10
+
+Replays ``agents/testprompts.txt`` through the compiled graph with the fake
+model (see `agents.bench_agent`) twice, with `context_compressor` disabled and
+then enabled. Only the prompts routed to RAG are affected. For them the report
+gives the mean prompt tokens of ``rag_answer``, as reported by the model, the
+p50 of ``rag_retrieve`` (which includes the compression stage, also listed on
+its own) and the mean time of ``rag_answer``, all from the tracer. Means are
+used for the answer because prompts without any overlap with their snippets
+are not compressed, and one of those can be the median. The fake model
+charges ``--prefill-us`` per prompt token before its first token, so a
+shorter prompt answers sooner in proportion.
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Any
+
+from .bench_agent import run_benchmark
+from .compress import context_compressor
+from .tracing import tracer
+
+
+def _run(enabled: bool, args: argparse.Namespace) -> dict[str, Any]:
+    previous = context_compressor.enabled
+    context_compressor.enabled = enabled
+    tracer.reset()
+    context_compressor.reset()
+    try:
+        report = run_benchmark(
+            args.ttft_ms, args.token_ms, args.tokens, args.runs, ("graph",), prefill_us=args.prefill_us
+        )
+    finally:
+        context_compressor.enabled = previous
+    nodes = tracer.stats()["nodes"]
+    answer = nodes["rag_answer"]
+    return {
+        "rag_answers": answer["calls"],
+        "prompt_tokens": answer["prompt_tokens"] / answer["calls"] if answer["calls"] else 0.0,
+        "retrieve_p50_ms": nodes["rag_retrieve"]["p50_ms"],
+        "compress_p50_ms": nodes.get("compress", {}).get("p50_ms"),
+        "answer_mean_ms": answer["mean_ms"],
+        "graph_ttft_p50_ms": report["latency"]["graph"]["ttft"]["p50_ms"],
+        "compression": context_compressor.stats() if enabled else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--prefill-us", type=float, default=200.0)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {"off": _run(False, args), "on": _run(True, args)}
+    for mode, r in results.items():
+        compress = "-" if r["compress_p50_ms"] is None else f"{r['compress_p50_ms']:.3f}"
+        print(
+            f"compression {mode:<3}  {r['rag_answers']} RAG answers  "
+            f"prompt {r['prompt_tokens']:6.1f} tokens   retrieve p50 {r['retrieve_p50_ms']:.3f} ms "
+            f"(compress {compress})   rag_answer mean {r['answer_mean_ms']:.1f} ms   "
+            f"TTFT p50 (all prompts) {r['graph_ttft_p50_ms']:.1f} ms"
+        )
+    off, on = results["off"], results["on"]
+    stats = on["compression"]
+    print(
+        f"context: {stats['tokens_in']} -> {stats['tokens_out']} tokens over {stats['calls']} calls "
+        f"({stats['saved_ratio']:.1%} saved), {stats['sentences_in']} -> {stats['sentences_out']} sentences"
+    )
+    if off["prompt_tokens"]:
+        saved = off["prompt_tokens"] - on["prompt_tokens"]
+        print(
+            f"answer prompt: {saved:.1f} tokens saved per RAG answer "
+            f"({saved / off['prompt_tokens']:.1%}); mean rag_answer time "
+            f"{on['answer_mean_ms'] - off['answer_mean_ms']:+.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
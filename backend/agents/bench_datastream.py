@@ -0,0 +1,110 @@
+"""
+DataStream encoder benchmark: one frame per token vs. `DataStreamWriter`.
+
+Run with:
+    python -m agents.bench_datastream --answers 200 --chars 1200
+
+A synthetic answer is streamed as single characters and as word-sized tokens.
+Each is encoded by the previous per-token ``json.dumps`` encoder and by the
+coalescing writer. The report shows frames and bytes per answer and CPU time
+per request. The burst case (tokens arrive back to back) isolates encoding
+cost. The paced case (``--token-ms`` between tokens) shows how the 16 ms
+deadline bounds the frame rate for a realistically streaming model.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections.abc import AsyncIterator, Callable
+
+from .datastream import DataStreamWriter
+
+_SENTENCE = (
+    "Ibuprofen (Advil, Motrin) is usually taken at 200-400 mg every 4-6 hours; "
+    "do not exceed 1,200 mg per day without a doctor's advice. "
+)
+
+
+def answer_text(chars: int) -> str:
+    return (_SENTENCE * (chars // len(_SENTENCE) + 1))[:chars]
+
+
+def split_tokens(text: str, mode: str) -> list[str]:
+    if mode == "char":
+        return list(text)
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+async def _arrivals(tokens: list[str], delay: float) -> AsyncIterator[str]:
+    for token in tokens:
+        if delay:
+            await asyncio.sleep(delay)
+        yield token
+
+
+async def legacy_encoder(tokens: AsyncIterator[str]) -> list[bytes]:
+    """The encoder ``/chat`` used before: one ``json.dumps`` frame per token."""
+
+    return [(json.dumps({"type": "0", "value": t}) + "\n").encode() async for t in tokens]
+
+
+async def coalescing_encoder(tokens: AsyncIterator[str]) -> list[bytes]:
+    return [frame async for frame in DataStreamWriter().frames(tokens)]
+
+
+def measure(
+    encoder: Callable[[AsyncIterator[str]], object],
+    tokens: list[str],
+    answers: int,
+    delay: float,
+) -> dict[str, float]:
+    async def run() -> list[list[bytes]]:
+        return [await encoder(_arrivals(tokens, delay)) for _ in range(answers)]  # type: ignore[misc]
+
+    cpu = time.process_time()
+    results = asyncio.run(run())
+    cpu = time.process_time() - cpu
+    frames = results[0]
+    return {
+        "frames": len(frames),
+        "bytes": sum(map(len, frames)),
+        "cpu_us": cpu / answers * 1e6,
+    }
+
+
+def _report(name: str, stats: dict[str, float]) -> None:
+    print(
+        f"  {name:<11} frames/answer {stats['frames']:7.0f}   "
+        f"bytes/answer {stats['bytes']:8.0f}   CPU/request {stats['cpu_us']:9.1f} us"
+    )
+
+
+def run_benchmark(answers: int, chars: int, token_ms: float) -> None:
+    text = answer_text(chars)
+    for mode in ("char", "word"):
+        tokens = split_tokens(text, mode)
+        print(f"{mode} tokens: {len(tokens)} per answer")
+        for label, delay, n in (
+            ("burst", 0.0, answers),
+            (f"paced {token_ms:g} ms", token_ms / 1000, max(1, answers // 100)),
+        ):
+            print(f" {label}")
+            _report("per-token", measure(legacy_encoder, tokens, n, delay))
+            _report("coalesced", measure(coalescing_encoder, tokens, n, delay))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--answers", type=int, default=200)
+    parser.add_argument("--chars", type=int, default=1200)
+    parser.add_argument("--token-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    run_benchmark(args.answers, args.chars, args.token_ms)
+
+
+if __name__ == "__main__":
+    main()
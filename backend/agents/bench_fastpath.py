@@ -0,0 +1,126 @@
+"""
+Fast-path benchmark: dose/cost lookups with and without `agents.fast_path`.
+
+Run from ``backend/`` with:
+    python -m agents.bench_fastpath --ttft-ms 300 --token-ms 20 --runs 5
+
+A small demo formulary is loaded into the medication index, exactly as the
+API does at startup. `FakeStreamingChatModel` stands in for the LLM. The
+prompts below are replayed through the graph twice: once with the fast path
+enabled and once with every medication question sent through RAG. The report
+shows how many prompts the fast path answered and the latency percentiles
+of each run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import uuid
+from types import SimpleNamespace
+from typing import Any
+
+import agents.graph as agent_graph
+from .answer_cache import answer_cache
+from .bench_agent import _ms, _run_graph, percentiles
+from .fake_llm import FakeStreamingChatModel
+from .fast_path import fast_path
+from .med_index import medication_index
+from .rag_utils import get_matcher, get_retriever, set_matcher, set_retriever
+
+FORMULARY = [
+    ("Advil", "ibuprofen", 200, 0.25),
+    ("Motrin", "ibuprofen", 400, 0.30),
+    ("Tylenol", "acetaminophen", 500, 0.10),
+    ("Bayer", "aspirin", 325, 0.05),
+    ("Aleve", "naproxen", 220, 0.20),
+]
+
+LOOKUPS = [
+    "What's the dose of Advil?",
+    "How much does Tylenol cost?",
+    "What is the price of Aleve?",
+    "Motrin dosage",
+    "How many mg is Bayer?",
+    "How much is naproxen?",
+]
+OPEN_ENDED = [
+    "What is the maximum daily dose of ibuprofen?",
+    "Can I take Tylenol with alcohol?",
+    "Is aspirin safe during pregnancy?",
+    "What are the side effects of naproxen?",
+]
+
+
+async def _replay(graph: Any, prompts: list[str], runs: int) -> list[float]:
+    totals = []
+    for _ in range(runs):
+        for prompt in prompts:
+            answer_cache.clear()
+            _, _, total = await _run_graph(graph, prompt)
+            totals.append(total)
+    return totals
+
+
+def run_benchmark(ttft_ms: float, token_ms: float, tokens: int, runs: int) -> dict[str, Any]:
+    rows = [
+        SimpleNamespace(id=uuid.uuid4(), brand_name=b, generic=g, dose_mg=d, cost_usd=c)
+        for b, g, d, c in FORMULARY
+    ]
+    previous = (agent_graph.llm, get_retriever(), get_matcher(), fast_path.enabled)
+    medication_index.load(rows)
+    set_retriever(medication_index)
+    set_matcher(medication_index.matcher)
+    agent_graph.llm = FakeStreamingChatModel(
+        ttft=ttft_ms / 1000, token_latency=token_ms / 1000, max_tokens=tokens
+    )
+    graph = agent_graph.build_graph()
+    report: dict[str, Any] = {}
+    try:
+        for label, enabled in (("fast_path", True), ("rag_only", False)):
+            fast_path.enabled = enabled
+            fast_path.reset()
+            report[label] = {
+                "lookups": percentiles(asyncio.run(_replay(graph, LOOKUPS, runs))),
+                "open_ended": percentiles(asyncio.run(_replay(graph, OPEN_ENDED, runs))),
+            }
+            if enabled:
+                stats = fast_path.stats()
+                report["answered"] = stats["answered"]
+                report["considered"] = stats["considered"]
+                report["mean_answer_us"] = stats["mean_answer_us"]
+    finally:
+        agent_graph.llm, retriever, matcher, fast_path.enabled = previous
+        set_retriever(retriever)
+        set_matcher(matcher)
+    report["prompts"] = {"lookups": len(LOOKUPS) * runs, "open_ended": len(OPEN_ENDED) * runs}
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    report = run_benchmark(args.ttft_ms, args.token_ms, args.tokens, args.runs)
+
+    prompts = report["prompts"]
+    print(
+        f"fast path answered {report['answered']} of {prompts['lookups']} lookups "
+        f"({report['considered']} considered), {report['mean_answer_us']:.1f} us per answer; "
+        f"{prompts['open_ended']} open-ended prompts went to the model"
+    )
+    for label in ("fast_path", "rag_only"):
+        print(f"{label}:")
+        for kind in ("lookups", "open_ended"):
+            values = report[label][kind]
+            print(
+                f"  {kind:<11} p50 {_ms(values['p50_ms'])} ms   "
+                f"p95 {_ms(values['p95_ms'])} ms   p99 {_ms(values['p99_ms'])} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Hybrid retrieval benchmark: vector, BM25, fused, and fused + rerank.
+
+Run from ``backend/`` with:
+    python -m agents.bench_hybrid --size 5000 --queries 200
+
+The corpus is the synthetic formulary of `bench_retrieval`, where each
+snippet reads "<Name> is a <form> used for <use> and <use>. Typical adult
+dose is <n> mg ...". Three query sets:
+
+* name: "what is the dose of <name>", relevant = that drug
+* typo: the same with one letter of the name changed, relevant = that drug
+* strength: "<n> mg <form> for <use>", relevant = every drug with that dose,
+  form and use
+
+Scores are hit@3 (a relevant snippet in the top three) for name and typo,
+and precision@3 for strength. Both sources search one `MedicationIndex`, as
+the API does, and every mode runs through `gather_hits`, so the fused modes
+query its vector and BM25 indexes concurrently. The per-stage latencies come
+from the tracer: one line per source, plus ``fusion`` and ``rerank``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+from types import SimpleNamespace
+
+from .bench_retrieval import synthetic_corpus
+from .med_index import MedicationIndex
+from .rag_utils import RAG_BM25_MIN_SCORE, RAG_MIN_SCORE, RAG_TOP_K
+from .sources import Source, gather_hits
+from .tracing import tracer
+
+_FACTS = re.compile(r"is an? (.+?) used for (\w+) and (\w+)\. Typical adult dose is (\d+) mg")
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(name) - 1)
+    return name[:i] + rng.choice("aeiou".replace(name[i], "")) + name[i + 1 :]
+
+
+def query_sets(corpus: dict[str, str], n: int, seed: int = 4) -> dict[str, list[tuple[str, set[str]]]]:
+    rng = random.Random(seed)
+    facts = {name: _FACTS.search(doc).groups() for name, doc in corpus.items()}
+    names = rng.sample(list(corpus), min(n, len(corpus)))
+    strength = []
+    for name in names:
+        form, use, _, dose = facts[name]
+        relevant = {m for m, (f, u1, u2, d) in facts.items() if f == form and d == dose and use in (u1, u2)}
+        strength.append((f"{dose} mg {form} for {use}", relevant))
+    return {
+        "name": [(f"what is the dose of {name}", {name}) for name in names],
+        "typo": [(f"what is the dose of {_typo(name, rng)}", {name}) for name in names],
+        "strength": strength,
+    }
+
+
+def _sources(corpus: dict[str, str]) -> dict[str, Source]:
+    # One row per drug, rendered as its corpus snippet instead of `medication_doc`.
+    rows = [SimpleNamespace(id=name, brand_name=name, generic=name, dose_mg=0, cost_usd=0.0) for name in corpus]
+    index = MedicationIndex(render=lambda row: corpus[row.id])
+    index.load(rows)
+
+    def vector_hits(q: str) -> list[tuple[str, str]]:
+        return [(i, corpus[i]) for i, _ in index.search(q, RAG_TOP_K, RAG_MIN_SCORE)]
+
+    def lexical_hits(q: str) -> list[tuple[str, str]]:
+        return [(i, corpus[i]) for i, _ in index.search_lexical(q, RAG_TOP_K, RAG_BM25_MIN_SCORE)]
+
+    return {"vector": Source("vector", vector_hits), "lexical": Source("lexical", lexical_hits)}
+
+
+def run_benchmark(size: int, n_queries: int) -> None:
+    corpus = synthetic_corpus(size)
+    sets = query_sets(corpus, n_queries)
+    sources = _sources(corpus)
+    modes = {
+        "vector": ([sources["vector"]], False),
+        "bm25": ([sources["lexical"]], False),
+        "hybrid": (list(sources.values()), False),
+        "hybrid+rerank": (list(sources.values()), True),
+    }
+    print(f"corpus={size} docs, {n_queries} queries per set, top {RAG_TOP_K} per source")
+    for mode, (chosen, reorder) in modes.items():
+        tracer.reset()
+        scores = {}
+        walls = []
+        for set_name, queries in sets.items():
+            values = []
+            for query, relevant in queries:
+                start = time.perf_counter()
+                hits = asyncio.run(gather_hits(query, chosen, reorder))
+                walls.append((time.perf_counter() - start) * 1000)
+                top = [doc_id for doc_id, _ in hits[:3]]
+                if set_name == "strength":
+                    values.append(len(relevant.intersection(top)) / 3)
+                else:
+                    values.append(bool(relevant.intersection(top)))
+            scores[set_name] = statistics.fmean(values)
+        nodes = tracer.stats()["nodes"]
+        stages = "  ".join(
+            f"{name.removeprefix('source:')} {stats['p50_ms']:.3f}" for name, stats in nodes.items()
+        )
+        print(
+            f"  {mode:<14} name {scores['name']:.3f}  typo {scores['typo']:.3f}  "
+            f"strength {scores['strength']:.3f}   end-to-end p50 {statistics.median(walls):.3f} ms   "
+            f"stage p50 ms: {stages}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run_benchmark(args.size, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Ingestion benchmark on synthetic drug labels.
+
+Run from ``backend/`` with:
+    python -m agents.bench_ingest --files 20 --mb-per-file 2
+
+Writes *files* label-like text files to a temporary directory. Each label
+mixes product-specific sections with boilerplate warnings that every label
+repeats, some copies lightly edited. The files are then ingested three
+times: cold, unchanged (everything should be skipped), and after touching
+one file and editing another. The report shows throughput, peak RSS, how
+many chunks deduplication dropped, and what each re-run cost.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .bench_retrieval import synthetic_corpus
+from .ingest import _peak_rss_mb, ingest, load_index
+
+_VOCAB = (
+    "tablet capsule dose daily patients adults children hepatic renal impairment "
+    "clinical trials reported adverse reactions nausea headache dizziness rash "
+    "pharmacokinetics plasma concentration half life hours metabolism excretion "
+    "contraindicated hypersensitivity pregnancy lactation overdose symptoms "
+    "treatment monitoring interaction inhibitors inducers increase decrease "
+    "exposure efficacy placebo controlled study week baseline mean change"
+).split()
+
+_BOILERPLATE = [
+    "WARNINGS: Keep out of reach of children. In case of overdose, get medical help "
+    "or contact a Poison Control Center right away. Do not use if you have ever had "
+    "an allergic reaction to any other pain reliever or fever reducer. Stop use and "
+    "ask a doctor if an allergic reaction occurs, symptoms get worse or last more "
+    "than 10 days, or redness or swelling is present. If pregnant or breast-feeding, "
+    "ask a health professional before use. ",
+    "STORAGE AND HANDLING: Store at 20 to 25 C (68 to 77 F); excursions permitted "
+    "between 15 and 30 C. Protect from light and moisture. Dispense in a tight, "
+    "light-resistant container as defined in the USP. Keep the bottle tightly closed "
+    "and discard any unused medicine after the expiration date printed on the label. ",
+]
+
+
+def _label(name: str, size: int, rng: random.Random) -> str:
+    parts = [f"{name.upper()} PRESCRIBING INFORMATION\n\n"]
+    written = len(parts[0])
+    while written < size:
+        if rng.random() < 0.3:
+            text = rng.choice(_BOILERPLATE)
+            if rng.random() < 0.5:
+                # A lightly edited copy, as different manufacturers print it.
+                words = text.split()
+                words[rng.randrange(len(words))] = rng.choice(_VOCAB)
+                text = " ".join(words) + " "
+        else:
+            text = " ".join(rng.choices(_VOCAB, k=rng.randint(60, 200))) + f" ({name}).\n"
+        parts.append(text)
+        written += len(text)
+    return "".join(parts)
+
+
+def write_labels(root: Path, files: int, mb_per_file: float, seed: int = 0) -> list[Path]:
+    rng = random.Random(seed)
+    paths = []
+    for name in list(synthetic_corpus(files, seed))[:files]:
+        path = root / f"{name}.txt"
+        path.write_text(_label(name, int(mb_per_file * 1e6), rng))
+        paths.append(path)
+    return paths
+
+
+def _line(label: str, report) -> None:
+    print(
+        f"{label:<10} {report.seconds:7.2f} s  {report.mb_per_s:7.1f} MB/s  "
+        f"read {report.bytes_read / 1e6:7.1f} MB  ingested {report.ingested:3d}  "
+        f"reused {report.reused:3d}  skipped {report.skipped:3d}  "
+        f"chunks {report.chunks:7d}  duplicates {report.duplicates:6d}  "
+        f"embedding {report.embed_seconds:6.2f} s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--mb-per-file", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        labels = root / "labels"
+        labels.mkdir()
+        paths = write_labels(labels, args.files, args.mb_per_file)
+        total = sum(p.stat().st_size for p in paths) / 1e6
+        baseline = _peak_rss_mb()
+        print(f"{len(paths)} labels, {total:.1f} MB; RSS before ingest {baseline:.0f} MB")
+
+        cold = ingest([labels], root / "index")
+        _line("cold", cold)
+        other = cold.seconds - cold.embed_seconds
+        print(
+            f"           without embedding: {cold.bytes_read / 1e6 / other:.1f} MB/s "
+            "(read, chunk, MinHash, write)"
+        )
+        print(
+            f"           peak RSS {cold.peak_rss_mb:.0f} MB; dropped "
+            f"{cold.duplicates / max(cold.chunks, 1):.1%} of chunks as near-duplicates"
+        )
+        _line("unchanged", ingest([labels], root / "index"))
+
+        paths[0].touch()
+        with paths[1].open("a") as f:
+            f.write("\nREVISED: new dosing information for renal impairment.\n")
+        _line("1 touched, 1 edited", ingest([labels], root / "index"))
+
+        start = time.perf_counter()
+        index = load_index(root / "index")
+        print(f"load_index: {len(index)} chunks in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Intent routing benchmark: keyword regex vs. `IntentRouter`.
+
+Run from ``backend/`` with:
+    python -m agents.bench_intent --folds 5
+
+Accuracy is measured by k-fold cross-validation over
+``agents/intent_examples.txt``. Each fold's prompts are classified by a
+router trained on the other folds. Three routers are
+compared: the old keyword router (`is_med_query`), the classifier alone
+(no threshold), and the full router (drug names, then classifier with
+margin threshold, then regex fallback). Latency is the time per routing
+decision after warm-up. ``--margins`` sweeps the confidence threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from .intent import CHAT, INTENT_MIN_MARGIN, MED, IntentClassifier, IntentRouter, load_examples
+from .rag_utils import is_med_query
+
+
+def _folds(examples: list[tuple[str, str]], k: int, seed: int) -> list[list[tuple[str, str]]]:
+    shuffled = examples[:]
+    random.Random(seed).shuffle(shuffled)
+    return [shuffled[i::k] for i in range(k)]
+
+
+def cross_validate(k: int = 5, margin: float = INTENT_MIN_MARGIN, seed: int = 0) -> dict[str, float]:
+    examples = load_examples()
+    folds = _folds(examples, k, seed)
+    correct = {"regex": 0, "classifier": 0, "router": 0}
+    fallbacks = 0
+    for i, held_out in enumerate(folds):
+        train = [ex for j, fold in enumerate(folds) if j != i for ex in fold]
+        classifier = IntentClassifier().fit(train)
+        router = IntentRouter(classifier, min_margin=margin)
+        for text, label in held_out:
+            correct["regex"] += (MED if is_med_query(text) else CHAT) == label
+            correct["classifier"] += classifier.predict(text)[0] == label
+            intent = router.classify(text)
+            correct["router"] += intent.label == label
+            fallbacks += intent.decided_by == "fallback"
+    n = len(examples)
+    return {
+        **{f"{name}_accuracy": hits / n for name, hits in correct.items()},
+        "fallback_rate": fallbacks / n,
+        "examples": n,
+    }
+
+
+def latency_us(repeat: int = 20) -> dict[str, float]:
+    texts = [text for text, _ in load_examples()]
+    router = IntentRouter()
+    router.classify("warm up")
+
+    def timed(fn) -> list[float]:
+        samples = []
+        for _ in range(repeat):
+            for text in texts:
+                start = time.perf_counter()
+                fn(text)
+                samples.append((time.perf_counter() - start) * 1e6)
+        return sorted(samples)
+
+    router_samples = timed(router.classify)
+    regex_samples = timed(is_med_query)
+
+    def pct(samples: list[float], p: float) -> float:
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+    return {
+        "router_p50_us": pct(router_samples, 50),
+        "router_p99_us": pct(router_samples, 99),
+        "regex_p50_us": pct(regex_samples, 50),
+        "regex_p99_us": pct(regex_samples, 99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--margins", type=float, nargs="*", default=[INTENT_MIN_MARGIN])
+    args = parser.parse_args()
+
+    for margin in args.margins:
+        result = cross_validate(args.folds, margin, args.seed)
+        print(
+            f"margin {margin:.3f}: {int(result['examples'])} examples, {args.folds}-fold CV   "
+            f"regex {result['regex_accuracy']:.1%}   "
+            f"classifier {result['classifier_accuracy']:.1%}   "
+            f"router {result['router_accuracy']:.1%} "
+            f"(fallback on {result['fallback_rate']:.1%})"
+        )
+    lat = latency_us()
+    print(
+        f"latency: router p50 {lat['router_p50_us']:.1f} us, p99 {lat['router_p99_us']:.1f} us; "
+        f"regex p50 {lat['regex_p50_us']:.1f} us, p99 {lat['regex_p99_us']:.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Retrieval micro-benchmarks on a synthetic medication corpus.
+
+Run with:
+    python -m agents.bench_retrieval --sizes 10000 100000
+
+Each corpus entry mimics a `MED_CORPUS` snippet for a made-up drug, so the
+numbers reflect how the retrievers scale with formulary size rather than
+answer quality.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from collections.abc import Callable, Sized
+
+from .bm25 import BM25Index
+
+_SYLLABLES = ["ab", "ce", "di", "flo", "gan", "hex", "ix", "lor", "met", "nap",
+              "ox", "pra", "quin", "ro", "sal", "tel", "vu", "xan", "zo", "ly"]
+_FORMS = ["tablet", "capsule", "oral solution", "injection"]
+_USES = ["pain", "fever", "hypertension", "infection", "allergy", "insomnia",
+         "inflammation", "nausea", "migraine", "asthma"]
+
+
+def synthetic_corpus(n_docs: int, seed: int = 0) -> dict[str, str]:
+    """Return ``{drug_name: snippet}`` with *n_docs* unique made-up drugs."""
+
+    rng = random.Random(seed)
+    corpus: dict[str, str] = {}
+    while len(corpus) < n_docs:
+        name = "".join(rng.choices(_SYLLABLES, k=4)) + rng.choice(["ol", "ine", "am", "ex"])
+        if name in corpus:
+            continue
+        dose = rng.choice([5, 10, 25, 50, 81, 100, 200, 250, 500, 1000])
+        corpus[name] = (
+            f"{name.capitalize()} is a {rng.choice(_FORMS)} used for "
+            f"{rng.choice(_USES)} and {rng.choice(_USES)}. Typical adult dose is "
+            f"{dose} mg every {rng.choice([4, 6, 8, 12, 24])} hours."
+        )
+    return corpus
+
+
+def linear_scan(corpus: dict[str, str]) -> Callable[[str], list[str]]:
+    """The original `retrieve_med_docs` strategy: substring test per key."""
+
+    def run(query: str) -> list[str]:
+        query_lc = query.lower()
+        hits = [doc for key, doc in corpus.items() if key in query_lc]
+        return hits or list(corpus.values())
+
+    return run
+
+
+def sample_queries(corpus: dict[str, str], n: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    names = rng.sample(list(corpus), min(n, len(corpus)))
+    templates = ["what is the dose of {}", "is {} a tablet", "{} 500 mg for pain?"]
+    queries = [rng.choice(templates).format(name) for name in names]
+    # A share of off-topic questions exercises the no-hit path.
+    queries += ["what is the weather like today"] * max(1, n // 10)
+    return queries
+
+
+def time_queries(fn: Callable[[str], Sized], queries: list[str]) -> dict[str, float]:
+    """Return mean/p50/p95 latency (ms) and mean hits per query over *queries*.
+
+    Every query is run once untimed first so lazily built structures are warm.
+    """
+
+    for query in queries:
+        fn(query)
+    samples = []
+    hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        hits += len(fn(query))
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+        "hits": hits / len(queries),
+    }
+
+
+def _report(name: str, build_s: float, stats: dict[str, float]) -> None:
+    print(
+        f"  {name:<14} build {build_s * 1000:9.1f} ms   "
+        f"mean {stats['mean_ms']:8.3f} ms   p50 {stats['p50_ms']:8.3f} ms   "
+        f"p95 {stats['p95_ms']:8.3f} ms   docs/query {stats['hits']:9.1f}"
+    )
+
+
+def run_benchmark(sizes: list[int], n_queries: int, k: int) -> None:
+    for size in sizes:
+        corpus = synthetic_corpus(size)
+        queries = sample_queries(corpus, n_queries)
+        print(f"corpus={size} docs, {len(queries)} queries, k={k}")
+
+        start = time.perf_counter()
+        scan = linear_scan(corpus)
+        _report("linear-scan", time.perf_counter() - start, time_queries(scan, queries))
+
+        start = time.perf_counter()
+        bm25 = BM25Index()
+        bm25.add(corpus.items())
+        build = time.perf_counter() - start
+        _report("bm25", build, time_queries(lambda q: bm25.search(q, k), queries))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
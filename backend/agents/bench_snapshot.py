@@ -0,0 +1,125 @@
+"""
+Index snapshot benchmark: embedding at startup vs. mapping a snapshot.
+
+Run from ``backend/`` with:
+    python -m agents.bench_snapshot --sizes 1000 20000 --workers 4
+
+For each corpus size (synthetic drugs from `bench_retrieval`) and each
+snapshot dtype, the report shows:
+
+* build: embedding every document into a `VectorIndex` (startup without a snapshot)
+* load: `open_snapshot`, i.e. header parse plus ``numpy.memmap``
+* file size next to the float32 matrix a worker would otherwise hold
+* top-3 recall against the float32 index and the p50 query time of both
+
+With ``--workers N`` (Linux only), N processes map the same snapshot and
+touch every row. Each then reads its own resident (RSS) and proportional
+(PSS) share of the mapping from ``/proc/self/smaps``. PSS near size / N
+means the page cache copy is shared rather than duplicated per worker.
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from .bench_retrieval import sample_queries, synthetic_corpus
+from .index_snapshot import SNAPSHOT_DTYPES, open_snapshot, save_snapshot
+from .vector_index import VectorIndex
+
+
+def _p50_ms(fn, queries: list[str]) -> float:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _mapping_kb(path: str) -> tuple[int, int]:
+    rss = pss = 0
+    inside = False
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            if "-" in line.split(" ", 1)[0]:
+                inside = line.rstrip().endswith(path)
+            elif inside and line.startswith("Rss:"):
+                rss += int(line.split()[1])
+            elif inside and line.startswith("Pss:"):
+                pss += int(line.split()[1])
+    return rss, pss
+
+
+def _worker(path: str, barrier, results) -> None:
+    mapped = open_snapshot(path)
+    mapped.search("warm every page", k=1)
+    barrier.wait()  # all workers hold the mapping before anyone measures
+    results.put(_mapping_kb(path))
+    barrier.wait()
+
+
+def shared_pages(path: Path, workers: int) -> list[tuple[int, int]]:
+    ctx = multiprocessing.get_context("fork")
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(str(path), barrier, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    out = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return out
+
+
+def run_benchmark(sizes: list[int], workers: int, n_queries: int) -> None:
+    for size in sizes:
+        corpus = synthetic_corpus(size)
+        queries = sample_queries(corpus, n_queries)
+
+        start = time.perf_counter()
+        exact = VectorIndex()
+        exact.add(corpus.items())
+        build_s = time.perf_counter() - start
+        float32_mb = exact.matrix.nbytes / 1e6
+        truth = {q: [i for i, _ in exact.search(q, k=3)] for q in queries}
+        exact_ms = _p50_ms(exact.search, queries)
+        print(f"{size} documents: build {build_s * 1000:8.1f} ms, float32 matrix {float32_mb:.1f} MB, "
+              f"query p50 {exact_ms:.3f} ms")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for dtype in SNAPSHOT_DTYPES:
+                path = save_snapshot(exact, Path(tmp) / f"{dtype}.idx", "bench", dtype)
+                start = time.perf_counter()
+                mapped = open_snapshot(path, "bench", dtype=dtype)
+                load_ms = (time.perf_counter() - start) * 1000
+                recall = statistics.fmean(
+                    len(set(truth[q]) & {i for i, _ in mapped.search(q, k=3)}) / max(len(truth[q]), 1)
+                    for q in queries
+                )
+                print(
+                    f"  {dtype:<8} load {load_ms:7.2f} ms   file {path.stat().st_size / 1e6:6.1f} MB   "
+                    f"recall@3 {recall:.3f}   query p50 {_p50_ms(mapped.search, queries):.3f} ms"
+                )
+                if workers > 1 and Path("/proc/self/smaps").exists():
+                    usage = shared_pages(path, workers)
+                    print(
+                        f"           {workers} workers: mapping RSS {usage[0][0] / 1024:.1f} MB each, "
+                        f"PSS {statistics.fmean(p for _, p in usage) / 1024:.1f} MB each"
+                    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.workers, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Import-time benchmark for the API entry point.
+
+Run from ``backend/`` with the app's environment configured:
+    python -m agents.bench_startup --runs 10
+
+Every sample is a fresh interpreter, so nothing is shared between runs.
+Three scenarios are measured:
+
+* ``app.main``               – what a worker, test run or script pays on import
+* ``app.main (agent off)``   – the same with ``AGENT_ENABLED=false``
+* ``app.main + agent``       – additionally importing the graph and creating
+  the chat model, i.e. what importing ``app.main`` cost when the agent was
+  built at import time (and what the lifespan warm-up now pays once)
+
+Creating the chat model needs provider credentials, so the last scenario is
+skipped unless ``AGENT_MODEL`` is a fake model or its provider's
+``<PROVIDER>_API_KEY`` variable is set.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import app.main
+{extra}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("agents.graph", "langgraph", "langchain.chat_models") if m in sys.modules]
+print(__import__("json").dumps({{"seconds": elapsed, "loaded": heavy}}))
+"""
+
+SCENARIOS: dict[str, tuple[str, dict[str, str]]] = {
+    "app.main": ("", {}),
+    "app.main (agent off)": ("", {"AGENT_ENABLED": "false"}),
+    "app.main + agent": (
+        "import agents.graph as g; g.get_llm(); g.build_graph()",
+        {},
+    ),
+}
+
+# Scenarios that create the chat model.
+_NEEDS_MODEL = {"app.main + agent"}
+
+
+def has_model_credentials(env: dict[str, str] | None = None) -> bool:
+    """Best effort: whether `AGENT_MODEL` is fake or its provider's API key is set."""
+
+    from .fake_llm import is_fake_model
+    from .llm import AGENT_MODEL, provider_of
+
+    env = dict(os.environ) if env is None else env
+    return is_fake_model(AGENT_MODEL) or bool(env.get(f"{provider_of(AGENT_MODEL).upper()}_API_KEY"))
+
+
+def measure(extra: str, env: dict[str, str], runs: int) -> tuple[list[float], list[str]]:
+    """Return per-run import seconds and the heavy modules the last run loaded."""
+
+    samples: list[float] = []
+    loaded: list[str] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(extra=extra)],
+            env={**os.environ, **env},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return samples, loaded
+
+
+def run_benchmark(runs: int) -> None:
+    print(f"{runs} fresh interpreters per scenario")
+    credentials = has_model_credentials()
+    for name, (extra, env) in SCENARIOS.items():
+        if name in _NEEDS_MODEL and not credentials:
+            print(f"  {name:<22} skipped: no credentials for the chat model")
+            continue
+        samples, loaded = measure(extra, env, runs)
+        print(
+            f"  {name:<22} mean {statistics.fmean(samples) * 1000:8.1f} ms   "
+            f"median {statistics.median(samples) * 1000:8.1f} ms   "
+            f"min {min(samples) * 1000:8.1f} ms   "
+            f"loaded: {', '.join(loaded) or '-'}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    run_benchmark(args.runs)
+
+
+if __name__ == "__main__":
+    main()
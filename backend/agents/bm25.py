@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+"""Sparse lexical retrieval (BM25) over an incremental inverted index.
+
+Exact drug names and dose strings ("81 mg", "500mg tablet") are matched far
+more reliably by term statistics than by embeddings. The index keeps one
+posting list per term, so a query only touches the postings of its own terms;
+per-query scoring is done with NumPy over those postings.
+
+Searches only read the index, so several threads may search at once, but
+writes must not overlap with anything; `MedicationIndex` guards them with a
+readers-writer lock.
+"""
+
+import re
+from collections import Counter
+from collections.abc import Collection, Iterable
+from typing import List
+
+import numpy as np
+
+from .vector_index import STOPWORDS
+
+__all__ = ["tokenize", "BM25Index"]
+
+# Digits glued to units ("500mg") are split so "500 mg" and "500mg" agree.
+_TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|[a-z]+")
+
+# Unit and dosage-form spellings folded onto one canonical token.
+_ALIASES = {
+    "milligram": "mg",
+    "milligrams": "mg",
+    "mgs": "mg",
+    "microgram": "mcg",
+    "micrograms": "mcg",
+    "gram": "g",
+    "grams": "g",
+    "gm": "g",
+    "milliliter": "ml",
+    "milliliters": "ml",
+    "millilitre": "ml",
+    "tablets": "tablet",
+    "tab": "tablet",
+    "tabs": "tablet",
+    "capsules": "capsule",
+    "cap": "capsule",
+    "caps": "capsule",
+    "doses": "dose",
+    "dosing": "dose",
+    "dosage": "dose",
+    "maximum": "max",
+    "minimum": "min",
+}
+
+
+def tokenize(text: str, stopwords: Collection[str] = STOPWORDS) -> List[str]:
+    """Lower-case *text* and split it into BM25 terms.
+
+    Numbers are kept (doses matter), units and dosage forms are normalised,
+    and function words (*stopwords*) are dropped.
+    """
+
+    tokens = []
+    for tok in _TOKEN_RE.findall(str(text).lower()):
+        tok = _ALIASES.get(tok, tok)
+        if tok not in stopwords:
+            tokens.append(tok)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index that supports add/remove in place.
+
+    Documents are addressed by string ids. Internally each document gets a
+    small integer slot; slots of removed documents are recycled. Posting
+    lists are mutated as dicts and materialised as NumPy arrays lazily, the
+    first time a query needs them after a change.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[int, int]] = {}
+        self._arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._slot: dict[str, int] = {}
+        self._ids: list[str | None] = []
+        self._docs: list[str | None] = []
+        self._terms: list[Counter[str] | None] = []
+        self._free: list[int] = []
+        self._lengths = np.zeros(16, dtype=np.float32)
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._slot)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._slot
+
+    def get(self, doc_id: str) -> str | None:
+        slot = self._slot.get(doc_id)
+        return None if slot is None else self._docs[slot]
+
+    # -- mutation ----------------------------------------------------------
+
+    def add(self, items: Iterable[tuple[str, str]]) -> None:
+        """Insert or replace ``(doc_id, text)`` pairs."""
+
+        for doc_id, text in items:
+            if doc_id in self._slot:
+                self._remove_one(doc_id)
+            terms = Counter(tokenize(text))
+            if self._free:
+                slot = self._free.pop()
+                self._ids[slot], self._docs[slot], self._terms[slot] = doc_id, text, terms
+            else:
+                slot = len(self._ids)
+                self._ids.append(doc_id)
+                self._docs.append(text)
+                self._terms.append(terms)
+                if slot >= self._lengths.shape[0]:
+                    grown = np.zeros(2 * self._lengths.shape[0], dtype=np.float32)
+                    grown[: self._lengths.shape[0]] = self._lengths
+                    self._lengths = grown
+            self._slot[doc_id] = slot
+            length = sum(terms.values())
+            self._lengths[slot] = length
+            self._total_len += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[slot] = tf
+                self._arrays.pop(term, None)
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        """Drop documents by id; unknown ids are ignored."""
+
+        for doc_id in doc_ids:
+            if doc_id in self._slot:
+                self._remove_one(doc_id)
+
+    def _remove_one(self, doc_id: str) -> None:
+        slot = self._slot.pop(doc_id)
+        terms = self._terms[slot] or Counter()
+        for term in terms:
+            posting = self._postings[term]
+            del posting[slot]
+            if not posting:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_len -= int(self._lengths[slot])
+        self._lengths[slot] = 0
+        self._ids[slot] = self._docs[slot] = self._terms[slot] = None
+        self._free.append(slot)
+
+    # -- search ------------------------------------------------------------
+
+    def _posting_arrays(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self._postings.get(term)
+            if not posting:
+                return None
+            arrays = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float64, count=len(posting)),
+            )
+            # Concurrent searches may both build these; either copy is valid.
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> list[tuple[str, float]]:
+        """Return the top-``k`` ``(doc_id, score)`` pairs for *query*."""
+
+        n_docs = len(self._slot)
+        if n_docs == 0 or k <= 0:
+            return []
+        avgdl = self._total_len / n_docs if self._total_len else 1.0
+
+        slot_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            arrays = self._posting_arrays(term)
+            if arrays is None:
+                continue
+            slots, tf = arrays
+            df = slots.shape[0]
+            idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[slots] / avgdl)
+            slot_parts.append(slots)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not slot_parts:
+            return []
+
+        # Sum the per-term scores of each touched document. Nothing shared is
+        # written, so concurrent searches cannot see each other's partial sums.
+        touched, inverse = np.unique(np.concatenate(slot_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        m = min(k, scores.shape[0])
+        best = np.argpartition(-scores, m - 1)[:m]
+        best = best[np.argsort(-scores[best], kind="stable")]
+
+        hits: list[tuple[str, float]] = []
+        for i in best:
+            score = float(scores[i])
+            if threshold is not None and score < threshold:
+                break
+            hits.append((self._ids[int(touched[i])], score))  # type: ignore[arg-type]
+        return hits
+
+    def retrieve(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> List[str]:
+        """Return the text of the best matching documents for *query*."""
+
+        return [self._docs[self._slot[i]] for i, _ in self.search(query, k, threshold)]  # type: ignore[misc]
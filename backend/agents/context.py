@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+"""Token-budgeted context assembly for the RAG answer prompt.
+
+`build_context` takes retrieved snippets in rank order and packs as many as
+fit into a fixed token budget, truncating the last one if needed, so every
+`rag_answer` call has a bounded prompt no matter how much was retrieved.
+
+Tokens are counted locally with a regex that approximates BPE tokenisers
+(words, numbers and punctuation, with long words split every four
+characters). It needs no downloads and errs on the side of over-counting.
+"""
+
+import os
+import re
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+
+__all__ = [
+    "RAG_CONTEXT_TOKENS",
+    "CONTEXT_SEPARATOR",
+    "ContextResult",
+    "count_tokens",
+    "truncate_tokens",
+    "build_context",
+]
+
+# Upper bound on the number of context tokens placed in the answer prompt.
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1024"))
+
+CONTEXT_SEPARATOR = "\n---\n"
+
+_PIECE_RE = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate the number of model tokens in *text*."""
+
+    return len(_PIECE_RE.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of *text* holding at most *max_tokens* tokens."""
+
+    if max_tokens <= 0:
+        return ""
+    for i, match in enumerate(_PIECE_RE.finditer(text)):
+        if i == max_tokens:
+            return text[: match.start()].rstrip()
+    return text
+
+
+@dataclass
+class ContextResult:
+    """Packed context plus accounting for the prompt it will produce."""
+
+    text: str
+    tokens: int
+    budget: int
+    docs: list[str] = field(default_factory=list)
+    # Ids of `docs`, one per kept snippet, when `build_context` was given ids.
+    doc_ids: list[str] = field(default_factory=list)
+    dropped: int = 0
+    truncated: bool = False
+
+
+def build_context(
+    docs: Sequence[str],
+    budget: int | None = None,
+    count: Callable[[str], int] = count_tokens,
+    separator: str = CONTEXT_SEPARATOR,
+    ids: Sequence[str] | None = None,
+) -> ContextResult:
+    """Pack ranked *docs* into at most *budget* tokens.
+
+    Snippets are taken best-first and duplicates are skipped. The first
+    snippet that does not fit is cut to the remaining budget; anything after
+    it is dropped and counted in `ContextResult.dropped`. *ids*, parallel to
+    *docs*, are reported for the snippets actually kept in
+    `ContextResult.doc_ids` (the first id of a duplicated text).
+    """
+
+    budget = RAG_CONTEXT_TOKENS if budget is None else budget
+    sep_tokens = count(separator)
+    unique: dict[str, str | None] = {}
+    for i, doc in enumerate(docs):
+        unique.setdefault(doc, None if ids is None else ids[i])
+    kept: list[str] = []
+    kept_ids: list[str] = []
+    used = 0
+    truncated = False
+
+    for doc, doc_id in unique.items():
+        sep = sep_tokens if kept else 0
+        cost = count(doc) + sep
+        if used + cost > budget:
+            partial = truncate_tokens(doc, budget - used - sep)
+            if partial:
+                kept.append(partial)
+                if doc_id is not None:
+                    kept_ids.append(doc_id)
+                used += count(partial) + sep
+                truncated = True
+            break
+        kept.append(doc)
+        if doc_id is not None:
+            kept_ids.append(doc_id)
+        used += cost
+
+    return ContextResult(
+        text=separator.join(kept),
+        tokens=used,
+        budget=budget,
+        docs=kept,
+        doc_ids=kept_ids,
+        dropped=len(unique) - len(kept),
+        truncated=truncated,
+    )
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+"""DataStream framing for the chat response, with token coalescing.
+
+The assistant-ui DataStream protocol used by ``/chat`` is one JSON object per
+line: ``{"type": "0", "value": "<text>"}`` for text deltas, ``"3"`` for an
+error and ``"d"`` for the finish message. Writing one frame per model token
+costs a ``json.dumps`` call and a socket write per token. `DataStreamWriter`
+instead buffers text until either `max_bytes` have accumulated or
+`max_delay` seconds have passed since the first buffered token, then emits a
+single frame. The deadline is enforced even if the model stalls. The first
+token is always sent on its own, so coalescing never delays time-to-first-
+token.
+
+Frames are assembled from precomputed byte prefixes and the C string escaper
+behind the ``json`` module, so encoding one frame costs one escape call and
+one concatenation.
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from json.encoder import encode_basestring  # type: ignore[attr-defined]
+from typing import Any
+
+__all__ = [
+    "DATASTREAM_MAX_BYTES",
+    "DATASTREAM_MAX_DELAY",
+    "text_frame",
+    "error_frame",
+    "finish_frame",
+    "DataStreamWriter",
+]
+
+# Coalescing window: flush after this many bytes of text (counted as
+# characters) or this many seconds after the first buffered token, whichever
+# comes first.
+DATASTREAM_MAX_BYTES = int(os.getenv("DATASTREAM_MAX_BYTES", "64"))
+DATASTREAM_MAX_DELAY = float(os.getenv("DATASTREAM_MAX_DELAY_MS", "16")) / 1000
+
+_TEXT_PREFIX = b'{"type": "0", "value": '
+_ERROR_PREFIX = b'{"type": "3", "value": '
+_FRAME_END = b"}\n"
+
+
+def text_frame(text: str) -> bytes:
+    return _TEXT_PREFIX + encode_basestring(text).encode() + _FRAME_END
+
+
+def error_frame(message: str) -> bytes:
+    return _ERROR_PREFIX + encode_basestring(message).encode() + _FRAME_END
+
+
+def finish_frame(usage: dict[str, int] | None = None) -> bytes:
+    usage = usage or {}
+    chunk = {
+        "type": "d",
+        "value": {
+            "finishReason": "stop",
+            "usage": {
+                "promptTokens": usage.get("prompt_tokens", 0),
+                "completionTokens": usage.get("completion_tokens", 0),
+            },
+        },
+    }
+    return (json.dumps(chunk) + "\n").encode()
+
+
+class DataStreamWriter:
+    """Coalesce a stream of text tokens into DataStream text frames."""
+
+    def __init__(
+        self,
+        max_bytes: int = DATASTREAM_MAX_BYTES,
+        max_delay: float = DATASTREAM_MAX_DELAY,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        # Set when `frames` stopped because the client went away.
+        self.disconnected = False
+
+    async def frames(
+        self,
+        items: AsyncIterator[Any],
+        disconnected: Callable[[], Awaitable[bool]] | None = None,
+        poll_interval: float = 0.1,
+    ) -> AsyncIterator[Any]:
+        """Yield text frames (bytes) for the ``str`` items of *items*.
+
+        Anything that is not a string is passed through unchanged, after the
+        text buffered so far has been flushed.
+
+        If *disconnected* is given it is polled every *poll_interval* seconds;
+        once it returns True the stream ends without flushing and *items* is
+        cancelled. A streaming response otherwise only notices a dead client
+        on its next write, which can be many seconds away while the model is
+        thinking.
+        """
+
+        # A pump task moves items into a deque so that whatever has already
+        # arrived is drained without awaiting. When the deque is empty the
+        # writer parks on one future, woken by the pump or by a deadline timer
+        # (no task per token).
+        loop = asyncio.get_running_loop()
+        channel = _Channel(loop)
+        pump = asyncio.create_task(channel.pump(items))
+        watcher = (
+            asyncio.create_task(channel.watch(disconnected, poll_interval))
+            if disconnected is not None
+            else None
+        )
+        buffer: list[str] = []
+        size = 0
+        deadline = 0.0
+        first = True
+        try:
+            while True:
+                if not channel.items:
+                    await channel.wait(deadline if buffer else None)
+                    if not channel.items:
+                        # Deadline passed with the model still thinking.
+                        yield text_frame("".join(buffer))
+                        buffer.clear()
+                        size = 0
+                        continue
+                item = channel.items.popleft()
+
+                if isinstance(item, str):
+                    if not buffer:
+                        deadline = loop.time() + self.max_delay
+                    buffer.append(item)
+                    size += len(item)
+                    if first or size >= self.max_bytes:
+                        first = False
+                        yield text_frame("".join(buffer))
+                        buffer.clear()
+                        size = 0
+                    continue
+
+                if item is _GONE:
+                    self.disconnected = True
+                    break
+                if buffer:
+                    yield text_frame("".join(buffer))
+                    buffer.clear()
+                    size = 0
+                if item is _END:
+                    break
+                if isinstance(item, _Failed):
+                    raise item.error
+                yield item
+        finally:
+            tasks = {pump} if watcher is None else {pump, watcher}
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+
+
+_END = object()
+_GONE = object()
+
+
+class _Failed:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def _wake(waiter: asyncio.Future[None]) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _Channel:
+    """Single-consumer buffer between the token source and the writer."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.items: deque[Any] = deque()
+        self._waiter: asyncio.Future[None] | None = None
+
+    def put(self, item: Any) -> None:  # noqa: ANN401
+        self.items.append(item)
+        if self._waiter is not None:
+            _wake(self._waiter)
+
+    async def wait(self, deadline: float | None) -> None:
+        """Return once an item is available or *deadline* (loop time) passes."""
+
+        if deadline is not None and deadline <= self.loop.time():
+            return
+        self._waiter = self.loop.create_future()
+        timer = None if deadline is None else self.loop.call_at(deadline, _wake, self._waiter)
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+            if timer is not None:
+                timer.cancel()
+
+    async def pump(self, items: AsyncIterator[Any]) -> None:
+        iterator = items.__aiter__()
+        try:
+            async for item in iterator:
+                self.put(item)
+        except BaseException as exc:
+            # Includes a CancelledError raised by the source itself; the
+            # writer re-raises it rather than waiting forever.
+            self.put(_Failed(exc))
+            if not isinstance(exc, Exception):
+                raise
+        else:
+            self.put(_END)
+        finally:
+            await iterator.aclose()  # type: ignore[attr-defined]
+
+    async def watch(
+        self, disconnected: Callable[[], Awaitable[bool]], interval: float
+    ) -> None:
+        while not await disconnected():
+            await asyncio.sleep(interval)
+        # Jump the queue: nothing buffered is worth sending any more.
+        self.items.appendleft(_GONE)
+        if self._waiter is not None:
+            _wake(self._waiter)
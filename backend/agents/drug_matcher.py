@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+"""Single-pass drug-name detection with an Aho-Corasick automaton.
+
+Every brand name, generic name and known synonym is compiled into one
+automaton, so finding all drug mentions in a message costs one linear pass
+over the text regardless of how many names the catalogue holds. Each surface
+form maps to the ids of the retrieval documents it refers to, letting the
+router (`is_med_query`) and retrieval (`retrieve_med_docs`) share one result.
+
+`DrugMatcher` tracks names per document id. Every change compiles a new
+automaton in the writing thread and swaps it in whole, so lookups (which run
+on the event loop) never compile or wait; they use whichever automaton was
+published last. A rebuild is linear in the total length of the names, and
+writes that arrive while one is running share the next rebuild.
+"""
+
+import threading
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import NamedTuple
+
+__all__ = [
+    "DRUG_SYNONYMS",
+    "Mention",
+    "AhoCorasick",
+    "DrugMatcher",
+]
+
+# alias -> canonical (generic) name. Aliases are registered for every
+# document that carries the canonical name.
+DRUG_SYNONYMS: dict[str, str] = {
+    "paracetamol": "acetaminophen",
+    "apap": "acetaminophen",
+    "tylenol": "acetaminophen",
+    "panadol": "acetaminophen",
+    "advil": "ibuprofen",
+    "motrin": "ibuprofen",
+    "nurofen": "ibuprofen",
+    "acetylsalicylic acid": "aspirin",
+    "asa": "aspirin",
+    "bayer": "aspirin",
+    "ecotrin": "aspirin",
+    "aleve": "naproxen",
+    "naprosyn": "naproxen",
+}
+
+
+@dataclass(frozen=True)
+class Mention:
+    """A drug name found in text, with its character span."""
+
+    start: int
+    end: int
+    name: str
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton over lower-cased patterns.
+
+    Matches are reported only on word boundaries, so "asa" does not fire
+    inside "nasal".
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.patterns = sorted({p.lower() for p in patterns if p.strip()})
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+        for idx, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(idx)
+
+        # Breadth-first pass to wire failure links and merge outputs.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, text: str) -> list[Mention]:
+        """Return every whole-word pattern occurrence in *text*."""
+
+        lowered = text.lower()
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        mentions = []
+        node = 0
+        for pos, char in enumerate(lowered):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for idx in out[node]:
+                pattern = patterns[idx]
+                start = pos - len(pattern) + 1
+                end = pos + 1
+                if (start == 0 or not lowered[start - 1].isalnum()) and (
+                    end == len(lowered) or not lowered[end].isalnum()
+                ):
+                    mentions.append(Mention(start, end, pattern))
+        return mentions
+
+
+class _Compiled(NamedTuple):
+    automaton: AhoCorasick
+    by_name: dict[str, set[str]]
+    # Vocabulary version the automaton was built from.
+    version: int
+
+
+class DrugMatcher:
+    """Maps drug mentions in free text to retrieval document ids."""
+
+    def __init__(self, synonyms: dict[str, str] | None = None) -> None:
+        self.synonyms = DRUG_SYNONYMS if synonyms is None else synonyms
+        self._aliases: dict[str, set[str]] = {}
+        for alias, canonical in self.synonyms.items():
+            self._aliases.setdefault(canonical.lower(), set()).add(alias.lower())
+        self._names: dict[str, set[str]] = {}
+        self._version = 0
+        self._compiled = _Compiled(AhoCorasick([]), {}, 0)
+        # Guards `_names`/`_version`; held only to read or change them.
+        self._lock = threading.Lock()
+        # Serialises rebuilds; lookups never take it.
+        self._build_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    # -- vocabulary --------------------------------------------------------
+
+    def _expand(self, names: Iterable[str]) -> set[str]:
+        expanded = set()
+        for name in names:
+            name = name.strip().lower()
+            if name:
+                expanded.add(name)
+                expanded |= self._aliases.get(name, set())
+        return expanded
+
+    def set(self, doc_id: str, names: Iterable[str]) -> None:
+        """Register (or replace) the names that refer to *doc_id*."""
+
+        expanded = self._expand(names)
+        with self._lock:
+            self._names[doc_id] = expanded
+            self._version += 1
+            version = self._version
+        self._rebuild(version)
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            if self._names.pop(doc_id, None) is None:
+                return
+            self._version += 1
+            version = self._version
+        self._rebuild(version)
+
+    def load(self, entries: Iterable[tuple[str, Iterable[str]]]) -> None:
+        """Replace the whole vocabulary with ``(doc_id, names)`` entries."""
+
+        names = {doc_id: self._expand(doc_names) for doc_id, doc_names in entries}
+        with self._lock:
+            self._names = names
+            self._version += 1
+            version = self._version
+        self._rebuild(version)
+
+    def _rebuild(self, version: int) -> None:
+        """Publish an automaton covering at least vocabulary *version*."""
+
+        with self._build_lock:
+            if self._compiled.version >= version:
+                # A rebuild that started after this write already covered it.
+                return
+            with self._lock:
+                names = dict(self._names)
+                version = self._version
+            by_name: dict[str, set[str]] = {}
+            for doc_id, doc_names in names.items():
+                for name in doc_names:
+                    by_name.setdefault(name, set()).add(doc_id)
+            self._compiled = _Compiled(AhoCorasick(by_name), by_name, version)
+
+    # -- lookup ------------------------------------------------------------
+
+    def mentions(self, text: str) -> list[Mention]:
+        return self._compiled.automaton.find_all(str(text))
+
+    def doc_ids(self, text: str) -> list[str]:
+        """Return ids of documents mentioned in *text*, in order of mention."""
+
+        automaton, by_name, _ = self._compiled
+        ids: dict[str, None] = {}
+        for mention in automaton.find_all(str(text)):
+            for doc_id in sorted(by_name[mention.name]):
+                ids[doc_id] = None
+        return list(ids)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+"""Deterministic offline chat model for tests and benchmarks.
+
+`FakeStreamingChatModel` streams a reply word by word after a configurable
+time-to-first-token, with a fixed delay between tokens, and reports token
+usage like a real provider. An optional per-prompt-token delay models
+prefill, so longer prompts answer later. Without an explicit `reply` it answers with the
+words of the last message, cycled to `max_tokens` words, so output is
+deterministic but still depends on the prompt.
+
+Select it with ``AGENT_MODEL=fake`` or with parameters, e.g.
+``AGENT_MODEL=fake:ttft_ms=300,token_ms=20,tokens=40,prefill_us=200``.
+"""
+
+import asyncio
+import itertools
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .context import count_tokens
+from .rag_utils import extract_text
+
+__all__ = ["FakeStreamingChatModel", "is_fake_model"]
+
+
+def is_fake_model(model_id: str) -> bool:
+    return model_id == "fake" or model_id.startswith("fake:")
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Offline chat model with scripted latency (see module docstring)."""
+
+    ttft: float = 0.0
+    token_latency: float = 0.0
+    # Extra time-to-first-token per prompt token, in seconds.
+    prompt_token_latency: float = 0.0
+    max_tokens: int = 32
+    reply: str | None = None
+
+    @classmethod
+    def from_spec(cls, model_id: str) -> FakeStreamingChatModel:
+        """Build from ``fake[:ttft_ms=..,token_ms=..,tokens=..,prefill_us=..,reply=..]``."""
+
+        params: dict[str, Any] = {}
+        _, _, spec = model_id.partition(":")
+        for item in filter(None, spec.split(",")):
+            key, _, value = item.partition("=")
+            if key == "ttft_ms":
+                params["ttft"] = float(value) / 1000
+            elif key == "token_ms":
+                params["token_latency"] = float(value) / 1000
+            elif key == "prefill_us":
+                params["prompt_token_latency"] = float(value) / 1e6
+            elif key == "tokens":
+                params["max_tokens"] = int(value)
+            elif key == "reply":
+                params["reply"] = value
+            else:
+                raise ValueError(f"Unknown fake model parameter {key!r} in {model_id!r}")
+        return cls(**params)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _tokens(self, messages: list[BaseMessage]) -> list[str]:
+        text = self.reply if self.reply is not None else extract_text(messages[-1])
+        words = text.split() or ["ok"]
+        if self.reply is None:
+            words = list(itertools.islice(itertools.cycle(words), self.max_tokens))
+        return [w + " " for w in words[:-1]] + [words[-1]]
+
+    def _usage(self, messages: list[BaseMessage], tokens: list[str]) -> dict[str, int]:
+        prompt = sum(count_tokens(extract_text(m)) for m in messages)
+        completion = count_tokens("".join(tokens))
+        return {
+            "input_tokens": prompt,
+            "output_tokens": completion,
+            "total_tokens": prompt + completion,
+        }
+
+    def _first_token_delay(self, messages: list[BaseMessage]) -> float:
+        if not self.prompt_token_latency:
+            return self.ttft
+        prompt = sum(count_tokens(extract_text(m)) for m in messages)
+        return self.ttft + self.prompt_token_latency * prompt
+
+    def _chunks(self, messages: list[BaseMessage]) -> Iterator[tuple[float, AIMessageChunk]]:
+        """(delay before it, chunk) pairs; usage rides on the last chunk."""
+
+        tokens = self._tokens(messages)
+        for i, token in enumerate(tokens):
+            usage = self._usage(messages, tokens) if i == len(tokens) - 1 else None
+            yield (
+                self._first_token_delay(messages) if i == 0 else self.token_latency,
+                AIMessageChunk(content=token, usage_metadata=usage),
+            )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self._first_token_delay(messages) + self.token_latency * (len(tokens) - 1))
+        message = AIMessage(
+            content="".join(tokens), usage_metadata=self._usage(messages, tokens)
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for delay, chunk in self._chunks(messages):
+            if delay:
+                time.sleep(delay)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for delay, chunk in self._chunks(messages):
+            if delay:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=chunk)
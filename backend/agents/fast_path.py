@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+"""Answer dose and cost lookups straight from the medication table.
+
+Questions like "what's the dose of Advil?" or "how much does Tylenol cost?"
+ask for a single field of a `Medication` row. `FastPath` answers them from
+the structured view kept by `MedicationIndex`: the drug matcher finds the
+rows and a template renders the answer. That takes microseconds, with no
+retrieval and no model call. The graph routes such questions to the
+``fast_answer`` node, which falls through to the RAG path whenever the
+fast path declines.
+
+The fast path only answers when:
+
+* the question asks for a dose and/or a cost (`lookup_kinds`);
+* it contains nothing that needs judgement, such as maximum or daily doses,
+  children, interactions or "should I take";
+* it names at least one stocked medication.
+
+Everything else goes to the model. The stored ``dose_mg`` is the strength
+the pharmacy stocks, not a dosing recommendation, and the answer says so.
+
+Counts and timings are exported under the "fast_path" metrics key. That
+includes the average latency an answered question saved compared with the
+RAG path, based on the node timings from `agents.tracing`.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+from . import metrics
+from .med_index import MedicationFacts, MedicationIndex, medication_index
+from .tracing import tracer
+
+__all__ = ["FAST_PATH_ENABLED", "lookup_kinds", "FastPath", "fast_path"]
+
+# Set AGENT_FAST_PATH=0 to send every medication question through RAG.
+FAST_PATH_ENABLED = os.getenv("AGENT_FAST_PATH", "1") != "0"
+
+# Most rows listed in one answer; broader matches go to the model.
+_MAX_ROWS = 5
+
+_DOSE = re.compile(r"\b(doses?|dosage|strength|how many (mg|milligrams))\b")
+_COST = re.compile(r"\b(costs?|price[ds]?|pricing|how much (is|are|does|do)|expensive|cheap)\b")
+# Anything that turns a lookup into a clinical or comparative question.
+_OPEN_ENDED = re.compile(
+    r"\b(why|side|effects?|interact\w*|safe\w*|pregnan\w*|child\w*|kids?|bab(y|ies)|"
+    r"max\w*|min\w*|daily|day|hours?|often|every|overdose|alcohol|compare\w*|vs|"
+    r"versus|instead|better|should|can|could|take|taking|with|if|when|insurance)\b"
+)
+
+
+def lookup_kinds(question: str) -> tuple[str, ...]:
+    """Return which fields (``"dose"``, ``"cost"``) *question* asks for.
+
+    An empty tuple means the question is not a plain lookup.
+    """
+
+    text = str(question).lower()
+    if _OPEN_ENDED.search(text):
+        return ()
+    return tuple(
+        kind for kind, pattern in (("dose", _DOSE), ("cost", _COST)) if pattern.search(text)
+    )
+
+
+def _render(facts: MedicationFacts, kinds: tuple[str, ...]) -> str:
+    parts = []
+    if "dose" in kinds:
+        parts.append(f"is stocked at {facts.dose_mg} mg per dose")
+    if "cost" in kinds:
+        parts.append(f"costs ${facts.cost_usd:.2f} per dose")
+    return f"{facts.brand_name} ({facts.generic}) " + " and ".join(parts) + "."
+
+
+class FastPath:
+    """Template answers for dose/cost lookups over a `MedicationIndex`."""
+
+    def __init__(self, index: MedicationIndex = medication_index, enabled: bool = True) -> None:
+        self.index = index
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.considered = 0
+        self.answered = 0
+        self.kinds: Counter[str] = Counter()
+        self._answer_us = 0.0
+
+    def _rows(self, question: str) -> list[MedicationFacts]:
+        matcher = self.index.matcher
+        ids = matcher.doc_ids(question)
+        rows = [(doc_id, self.index.facts(doc_id)) for doc_id in ids]
+        rows = [(doc_id, f) for doc_id, f in rows if f is not None]
+        # "Advil" also matches other ibuprofen rows through the synonym
+        # table; when a brand is named outright, answer for that brand only.
+        named = {m.name for m in matcher.mentions(question)}
+        exact = [(doc_id, f) for doc_id, f in rows if f.brand_name.lower() in named]
+        return [f for _, f in (exact or rows)]
+
+    def answer(self, question: str) -> str | None:
+        """Return the templated answer, or ``None`` if the model should answer."""
+
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        kinds = lookup_kinds(question)
+        rows = self._rows(question) if kinds else []
+        if len(rows) > _MAX_ROWS:
+            rows = []
+        text = " ".join(_render(f, kinds) for f in rows) if rows else None
+        if text is not None and "dose" in kinds:
+            text += " Ask your pharmacist or doctor how much of it to take."
+        elapsed = (time.perf_counter() - start) * 1e6
+        with self._lock:
+            self.considered += 1
+            if text is not None:
+                self.answered += 1
+                self.kinds.update(kinds)
+                self._answer_us += elapsed
+        return text
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            considered, answered = self.considered, self.answered
+            mean_us = self._answer_us / answered if answered else 0.0
+            kinds = dict(self.kinds)
+        traced = tracer.stats()
+        nodes, routes = traced["nodes"], traced["routes"]
+        # What the same question would have cost on the RAG path.
+        rag_ms = sum(nodes.get(n, {}).get("mean_ms", 0.0) for n in ("rag_retrieve", "rag_answer"))
+        # Lookups the fast path declined are routed to "rag_retrieve" as well.
+        med_questions = (
+            routes.get("fast_answer", 0) + routes.get("rag_retrieve", 0) - (considered - answered)
+        )
+        return {
+            "enabled": self.enabled,
+            "considered": considered,
+            "answered": answered,
+            "answer_rate": round(answered / considered, 4) if considered else 0.0,
+            "share_of_med_questions": (
+                round(answered / med_questions, 4) if med_questions > 0 else 0.0
+            ),
+            "kinds": kinds,
+            "mean_answer_us": round(mean_us, 2),
+            "rag_mean_ms": round(rag_ms, 3),
+            "saved_ms_per_answer": round(max(0.0, rag_ms - mean_us / 1000), 3) if rag_ms else None,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.considered = self.answered = 0
+            self.kinds.clear()
+            self._answer_us = 0.0
+
+
+fast_path = FastPath(enabled=FAST_PATH_ENABLED)
+metrics.register("fast_path", fast_path.stats)
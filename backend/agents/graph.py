@@ -1,27 +1,107 @@
 from __future__ import annotations
 
-import os
+import threading
+import time
+from typing import TYPE_CHECKING
 
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
 
 from .state import State
 
-from langgraph.graph import START, StateGraph
+from langgraph.graph import END, START, StateGraph
 
 # RAG helpers
-from .rag_utils import is_med_query, retrieve_med_docs
-
-__all__ = ["graph"]
+from .answer_cache import answer_cache
+from .compress import context_compressor
+from .context import build_context
+from .fast_path import fast_path, lookup_kinds
+from .hedging import AGENT_HEDGE_MODEL, HedgedChatModel, hedge_policy
+from .llm import AGENT_MODEL, get_limiter, init_pooled_chat_model
+from .memory import trim_history
+from .intent import MED, intent_router
+from .sources import gather_hits, retrieve_hits
+from .tracing import tracer
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langgraph.graph.state import CompiledStateGraph
+
+__all__ = ["graph", "build_graph", "get_llm"]
 
 # ---------------------------------------------------------------------------
 # LLM setup
 # ---------------------------------------------------------------------------
-# Users can set any supported model via the environment variable AGENT_MODEL.
-# Defaults to OpenAI GPT-4o-mini which supports tool calling and streaming.
+# The model comes from the AGENT_MODEL environment variable (see `agents.llm`).
 # See: https://langchain-ai.github.io/langgraph/tutorials/get-started/1-build-basic-chatbot/
-model_id = os.getenv("AGENT_MODEL", "openai:gpt-4o-mini")
-llm = init_chat_model(model_id)
+model_id = AGENT_MODEL
+
+# The model is created on first use (or by the API's startup warm-up), so
+# importing this module needs neither the provider SDK nor its credentials.
+# Tests may assign a fake model here directly.
+llm: BaseChatModel | None = None
+_llm_lock = threading.Lock()
+
+
+def get_llm() -> BaseChatModel:
+    """Return the shared chat model, initialising it on first call."""
+
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                llm = init_pooled_chat_model(model_id)
+    return llm
+
+
+def _invoke(messages):
+    """Call the model inside one of its provider's concurrency slots.
+
+    Time spent in the call itself (excluding any wait for a slot) is traced
+    as the "model" entry of the node metrics.
+    """
+
+    tracer.note_prompt(messages)
+    with get_limiter(model_id).slot():
+        start = time.perf_counter()
+        try:
+            return get_llm().invoke(messages)
+        finally:
+            tracer.record("model", (time.perf_counter() - start) * 1000)
+
+
+# Secondary model for hedged requests (see `agents.hedging`); only created
+# when AGENT_HEDGE_MODEL names a different model than the primary.
+hedge_model_id = AGENT_HEDGE_MODEL or model_id
+hedge_llm: BaseChatModel | None = None
+
+
+def get_hedge_llm() -> BaseChatModel:
+    global hedge_llm
+    if hedge_model_id == model_id:
+        return get_llm()
+    if hedge_llm is None:
+        with _llm_lock:
+            if hedge_llm is None:
+                hedge_llm = init_pooled_chat_model(hedge_model_id)
+    return hedge_llm
+
+
+async def _ainvoke(messages):
+    tracer.note_prompt(messages)
+    async with get_limiter(model_id).aslot():
+        model = get_llm()
+        if hedge_policy.enabled:
+            model = HedgedChatModel(
+                primary=model,
+                secondary=get_hedge_llm(),
+                policy=hedge_policy,
+                hedge_limiter=get_limiter(hedge_model_id),
+            )
+        start = time.perf_counter()
+        try:
+            return await model.ainvoke(messages)
+        finally:
+            tracer.record("model", (time.perf_counter() - start) * 1000)
 
 # ---------------------------------------------------------------------------
 # Node definitions
@@ -31,55 +111,108 @@ def chatbot(state: State):
     """
     LLM-only response node.
 
-    Takes the running `state`, invokes the underlying chat model with the full
-    message history, and returns an updated messages list containing the new
-    assistant reply. The use of `add_messages` in the State schema ensures the
-    list is appended rather than overwritten.
+    Takes the running `state`, invokes the underlying chat model with the
+    most recent slice of the message history (see `trim_history`), and returns
+    an updated messages list containing the new assistant reply. The use of
+    `add_messages` in the State schema ensures the list is appended rather
+    than overwritten.
     """
 
-    return {"messages": [llm.invoke(state["messages"])]}
+    return {"messages": [_invoke(trim_history(state["messages"]))]}
+
+
+async def achatbot(state: State):
+    """Async variant of :func:`chatbot` used by ``graph.ainvoke``/``astream``."""
+
+    return {"messages": [await _ainvoke(trim_history(state["messages"]))]}
 
 # 1. Routing helper ---------------------------------------------------------
 
 def _route(state: State) -> str:
     """Decide whether to invoke the RAG pipeline or default chatbot.
 
-    A *very* lightweight heuristic is applied: if the latest user message
-    contains medication-related keywords (drug, dose, mg, etc.) we choose the
-    RAG path. In production you might employ an LLM-based classifier or a
-    structured intent router instead.
+    The decision comes from `intent_router`: drug names in the catalogue,
+    then a local classifier trained on labelled prompts, with the keyword
+    regex as a fallback when the classifier is unsure. It takes tens of
+    microseconds, so no model call is spent on routing.
     """
 
     raw_text = _get_content(state["messages"][-1])
 
-    branch = "rag_retrieve" if is_med_query(raw_text) else "chatbot"
-    print(f"[Router] selected path: {branch}")
+    if intent_router.route(raw_text).label != MED:
+        branch = "chatbot"
+    elif fast_path.enabled and lookup_kinds(raw_text):
+        # Plain dose/cost lookups are tried against the medication table first.
+        branch = "fast_answer"
+    else:
+        branch = "rag_retrieve"
+    tracer.route(branch)
     return branch
 
-# 2. Retrieval node ---------------------------------------------------------
+# 1b. Fast-path node -----------------------------------------------------------
 
-def rag_retrieve(state: State):
-    """Fetch medication snippets relevant to the current user question."""
+def fast_answer(state: State):
+    """Answer a dose/cost lookup from the medication table (`agents.fast_path`).
 
-    question = _get_content(state["messages"][-1])
+    Returns no update when the fast path declines; `_after_fast_answer` then
+    continues with retrieval.
+    """
 
-    docs = retrieve_med_docs(question)
+    text = fast_path.answer(_get_content(state["messages"][-1]))
+    if text is None:
+        return {}
+    return {"messages": [AIMessage(content=text, response_metadata={"fast_path": "hit"})]}
 
-    # Concatenate docs for simple context injection. We also write it back to
-    # the state (so downstream nodes can access it) *and* add a synthetic
-    # tool/assistant message so that the full conversation history contains
-    # the retrieved knowledge.
 
-    context = "\n---\n".join(docs)
+def _after_fast_answer(state: State) -> str:
+    if isinstance(state["messages"][-1], AIMessage):
+        return END
+    tracer.route("rag_retrieve")
+    return "rag_retrieve"
+
+# 2. Retrieval node ---------------------------------------------------------
+
+def _pack(question: str, hits) -> dict:
+    # Keep only the sentences of each snippet that bear on the question (see
+    # `agents.compress`), then pack them into a fixed token budget so the
+    # answer prompt stays bounded however much was retrieved. The packed
+    # context is written back to the state for downstream nodes, along with
+    # its token count and the ids of the documents it was built from.
+    if context_compressor.enabled and hits:
+        start = time.perf_counter()
+        hits = context_compressor.compress(question, hits)
+        tracer.record("compress", (time.perf_counter() - start) * 1000, docs=len(hits))
+    packed = build_context([doc for _, doc in hits], ids=[doc_id for doc_id, _ in hits])
 
     return {
-        "context": context,
+        "context": packed.text,
+        "context_tokens": packed.tokens,
+        "context_doc_ids": packed.doc_ids,
     }
 
+
+def rag_retrieve(state: State):
+    """Fetch context relevant to the current user question.
+
+    Every registered retrieval source (drug index, patient records, ...) is
+    queried concurrently and their rankings merged; see `agents.sources`.
+    The snippets are then cut down to their relevant sentences.
+    """
+
+    question = _get_content(state["messages"][-1])
+    return _pack(question, retrieve_hits(question))
+
+
+async def arag_retrieve(state: State):
+    """Async variant of :func:`rag_retrieve` used by ``graph.ainvoke``/``astream``."""
+
+    question = _get_content(state["messages"][-1])
+    return _pack(question, await gather_hits(question))
+
 # 3. Answer-generation node -------------------------------------------------
 
-def rag_answer(state: State):
-    """Generate a final answer leveraging retrieved context."""
+def _rag_prompt(state: State) -> list[HumanMessage]:
+    """Build the context-grounded prompt shared by both answer variants."""
 
     # Robust extraction of the last user question.
     question = _get_content(state["messages"][-1])
@@ -93,8 +226,47 @@ def rag_answer(state: State):
         "answer concise.\n\n"
         f"Context:\n{context}\n\nQuestion: {question}"
     )
+    return [HumanMessage(content=prompt)]
+
+
+def _cached_answer(state: State) -> AIMessage | None:
+    question = _get_content(state["messages"][-1])
+    cached = answer_cache.lookup(question, state.get("context", "") or "")
+    if cached is None:
+        return None
+    return AIMessage(content=cached, response_metadata={"answer_cache": "hit"})
+
+
+def _cache_answer(state: State, answer) -> None:
+    answer_cache.store(
+        _get_content(state["messages"][-1]),
+        state.get("context", "") or "",
+        _get_content(answer),
+        doc_ids=state.get("context_doc_ids") or (),
+    )
+
+
+def rag_answer(state: State):
+    """Generate a final answer leveraging retrieved context.
 
-    answer = llm.invoke([HumanMessage(content=prompt)])
+    Repeated (or near-identical) questions over the same context are served
+    from `answer_cache` without calling the model.
+    """
+
+    answer = _cached_answer(state)
+    if answer is None:
+        answer = _invoke(_rag_prompt(state))
+        _cache_answer(state, answer)
+    return {"messages": [answer]}
+
+
+async def arag_answer(state: State):
+    """Async variant of :func:`rag_answer` used by ``graph.ainvoke``/``astream``."""
+
+    answer = _cached_answer(state)
+    if answer is None:
+        answer = await _ainvoke(_rag_prompt(state))
+        _cache_answer(state, answer)
     return {"messages": [answer]}
 
 # ---------------------------------------------------------------------------
@@ -116,16 +288,24 @@ def _get_content(msg):
 
 graph_builder = StateGraph(State)
 
-# Register nodes
-graph_builder.add_node("chatbot", chatbot)
-graph_builder.add_node("rag_retrieve", rag_retrieve)
-graph_builder.add_node("rag_answer", rag_answer)
-
-# Wiring: retrieval → answer, simple chat ends immediately.
+# Register nodes. LLM and retrieval nodes carry both a sync and an async
+# implementation: `graph.invoke`/`stream` (CLI) use the former, while
+# `graph.ainvoke`/`astream` (the API) await the model and the retrieval
+# sources directly instead of tying up the event loop.
+# Every node is wrapped by `tracer` for timing and token accounting.
+graph_builder.add_node("chatbot", tracer.wrap("chatbot", chatbot, achatbot))
+graph_builder.add_node(
+    "rag_retrieve", tracer.wrap("rag_retrieve", rag_retrieve, arag_retrieve)
+)
+graph_builder.add_node("rag_answer", tracer.wrap("rag_answer", rag_answer, arag_answer))
+graph_builder.add_node("fast_answer", tracer.wrap("fast_answer", fast_answer))
+
+# Wiring: retrieval → answer, simple chat ends immediately; a lookup the fast
+# path could not answer continues with retrieval.
 graph_builder.add_edge("rag_retrieve", "rag_answer")
+graph_builder.add_conditional_edges("fast_answer", _after_fast_answer, ["rag_retrieve", END])
 
 # Terminal edges
-from langgraph.graph import END  # local import to avoid polluting top-level namespace
 
 graph_builder.add_edge("rag_answer", END)
 graph_builder.add_edge("chatbot", END)
@@ -133,5 +313,21 @@ graph_builder.add_edge("chatbot", END)
 # Conditional entry routing based on the user's message content.
 graph_builder.add_conditional_edges(START, _route)
 
-# Compile graph
-graph = graph_builder.compile()
+
+def build_graph(checkpointer=None) -> CompiledStateGraph:
+    """Compile the graph, optionally persisting threads with *checkpointer*."""
+
+    return graph_builder.compile(checkpointer=checkpointer)
+
+
+# Stateless graph used by the CLI and tests, compiled on first access.
+_graph: CompiledStateGraph | None = None
+
+
+def __getattr__(name: str):
+    global _graph
+    if name == "graph":
+        if _graph is None:
+            _graph = build_graph()
+        return _graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
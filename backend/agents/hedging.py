@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+"""Hedged model requests to trim tail latency.
+
+When the primary request has not produced its first token within a deadline,
+a second request is started, against the same model or against
+`AGENT_HEDGE_MODEL`. Whichever streams a first token first is kept; the other
+is cancelled. The deadline tracks the `AGENT_HEDGE_PERCENTILE` of recently
+observed time-to-first-token, so only the slowest few percent of calls are
+duplicated.
+
+A hedge is only started when its provider has a free slot (see
+`agents.llm.Limiter.try_acquire`), so hedging never adds queueing under load.
+`hedge_policy.stats()` is exported under the "hedging" metrics key. It shows
+how often hedges fire and win, and how many extra prompt and completion tokens
+they cost.
+
+Hedging applies to the async path (`ainvoke`/`astream`) used by the API.
+Synchronous calls go straight to the primary model.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.chat_models import agenerate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langgraph.constants import TAG_NOSTREAM
+
+from . import metrics
+from .context import count_tokens
+from .rag_utils import extract_text
+
+__all__ = [
+    "AGENT_HEDGE_MODEL",
+    "HedgePolicy",
+    "HedgedChatModel",
+    "hedge_policy",
+]
+
+# Secondary model for hedges; unset means "hedge against the primary model".
+AGENT_HEDGE_MODEL = os.getenv("AGENT_HEDGE_MODEL") or None
+
+
+class HedgePolicy:
+    """Hedging deadline from a rolling window of time-to-first-token samples.
+
+    Until `min_samples` calls have been observed the deadline is
+    `initial_delay`; afterwards it is the *percentile* of the window, never
+    below `min_delay`.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 95.0,
+        initial_delay: float = 1.5,
+        min_delay: float = 0.25,
+        window: int = 500,
+        min_samples: int = 20,
+    ) -> None:
+        self.enabled = enabled
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._ttft: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped_busy = 0
+        self.extra_prompt_tokens = 0
+        self.extra_completion_tokens = 0
+
+    def deadline(self) -> float:
+        with self._lock:
+            if len(self._ttft) < self.min_samples:
+                return self.initial_delay
+            observed = metrics.percentile(sorted(self._ttft), self.percentile)
+            return self.initial_delay if observed is None else max(self.min_delay, observed)
+
+    def record(
+        self,
+        ttft: float,
+        *,
+        hedged: bool = False,
+        hedge_won: bool = False,
+        skipped_busy: bool = False,
+        extra_prompt_tokens: int = 0,
+        extra_completion_tokens: int = 0,
+    ) -> None:
+        with self._lock:
+            self._ttft.append(ttft)
+            self.calls += 1
+            self.hedged += hedged
+            self.hedge_wins += hedge_won
+            self.skipped_busy += skipped_busy
+            self.extra_prompt_tokens += extra_prompt_tokens
+            self.extra_completion_tokens += extra_completion_tokens
+
+    def stats(self) -> dict[str, Any]:
+        deadline = self.deadline()
+        with self._lock:
+            samples = sorted(self._ttft)
+            stats: dict[str, Any] = {
+                "enabled": self.enabled,
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "skipped_busy": self.skipped_busy,
+                "extra_requests": self.hedged,
+                "extra_prompt_tokens": self.extra_prompt_tokens,
+                "extra_completion_tokens": self.extra_completion_tokens,
+                "deadline_ms": round(deadline * 1000, 1),
+            }
+        for pct in (50, 95, 99):
+            observed = metrics.percentile(samples, pct)
+            stats[f"ttft_p{pct}_ms"] = None if observed is None else round(observed * 1000, 1)
+        return stats
+
+
+hedge_policy = HedgePolicy(
+    enabled=os.getenv("AGENT_HEDGE", "false").lower() in ("1", "true", "yes"),
+    percentile=float(os.getenv("AGENT_HEDGE_PERCENTILE", "95")),
+    initial_delay=float(os.getenv("AGENT_HEDGE_DELAY_MS", "1500")) / 1000,
+    min_delay=float(os.getenv("AGENT_HEDGE_MIN_DELAY_MS", "250")) / 1000,
+)
+metrics.register("hedging", hedge_policy.stats)
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that hedges *primary* with *secondary* per *policy*."""
+
+    primary: BaseChatModel
+    secondary: BaseChatModel
+    policy: HedgePolicy
+    # Limiter of the secondary's provider; the hedge only runs if it has a
+    # free slot.
+    hedge_limiter: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self.primary._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await agenerate_from_stream(
+            self._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+
+        async def attempt(model: BaseChatModel) -> tuple[AsyncIterator[Any], Any]:
+            # Attempts are tagged "nostream" so LangGraph does not forward
+            # their tokens; only the winner's are re-emitted below.
+            stream = model.astream(
+                messages, config={"tags": [TAG_NOSTREAM]}, stop=stop, **kwargs
+            ).__aiter__()
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+
+        primary = asyncio.create_task(attempt(self.primary))
+        hedge: asyncio.Task[tuple[AsyncIterator[Any], Any]] | None = None
+        holding_slot = False
+        skipped_busy = False
+        winner: asyncio.Task[tuple[AsyncIterator[Any], Any]] | None = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.policy.deadline())
+            if not done:
+                if self.hedge_limiter is None or self.hedge_limiter.try_acquire():
+                    holding_slot = self.hedge_limiter is not None
+                    hedge = asyncio.create_task(attempt(self.secondary))
+                else:
+                    skipped_busy = True
+
+            pending = {t for t in (primary, hedge) if t is not None}
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Prefer the primary if both land in the same tick.
+                for task in sorted(done, key=lambda t: t is not primary):
+                    if task.exception() is None:
+                        winner = task
+                        break
+            if winner is None:
+                # Every attempt failed; surface the primary's error.
+                raise primary.exception()  # type: ignore[misc]
+
+            loser = hedge if winner is primary else primary
+            extra_completion = 0
+            if loser is not None:
+                if loser.done() and loser.exception() is None:
+                    stream, first = loser.result()
+                    if first is not None:
+                        extra_completion = count_tokens(extract_text(first))
+                    await stream.aclose()  # type: ignore[attr-defined]
+                loser.cancel()
+                if holding_slot and loser is hedge:
+                    self.hedge_limiter.release()
+                    holding_slot = False
+
+            self.policy.record(
+                time.perf_counter() - start,
+                hedged=hedge is not None,
+                hedge_won=winner is hedge,
+                skipped_busy=skipped_busy,
+                extra_prompt_tokens=sum(
+                    count_tokens(extract_text(m)) + 4 for m in messages
+                )
+                if hedge is not None
+                else 0,
+                extra_completion_tokens=extra_completion,
+            )
+
+            stream, first = winner.result()
+            try:
+                if first is not None:
+                    yield ChatGenerationChunk(message=first)
+                    async for chunk in stream:
+                        yield ChatGenerationChunk(message=chunk)
+            finally:
+                # Also when our caller stops early: end the provider request.
+                await stream.aclose()  # type: ignore[attr-defined]
+        finally:
+            for task in (primary, hedge):
+                if task is not None and task is not winner:
+                    task.cancel()
+            if holding_slot:
+                self.hedge_limiter.release()
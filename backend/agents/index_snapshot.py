@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+"""On-disk, memory-mapped snapshots of a `VectorIndex`.
+
+Building the medication index means embedding every row. That cost is paid
+at every worker start, and every uvicorn worker then holds its own float32
+copy of the matrix. A snapshot stores the embeddings once, quantised to
+int8 (one float32 scale per row) or float16, in a single file:
+
+    8 bytes   magic ``PBVSNAP\\0``
+    8 bytes   little-endian header length
+    header    JSON scalars: version, dtype, dim, count, embedder, checksum,
+              and the byte lengths of the id and document blobs
+    vectors   count x dim, 64-byte aligned
+    scales    count float32 (int8 only), 64-byte aligned
+    ids       count + 1 uint64 offsets, 64-byte aligned, then the UTF-8 blob
+    docs      the same for the document texts
+
+`open_snapshot` maps the file with `numpy.memmap`. Opening a snapshot costs
+one small header parse plus decoding the ids; everything else is read
+lazily, and a document's text is decoded only when `MappedIndex.get` asks
+for it. Every worker that maps the same file shares one copy in the page
+cache.
+
+The header carries `content_checksum` of the documents and the embedder. A
+caller passes the checksum of its current data, and a snapshot built from
+anything else (rows added, edited or removed since, another embedder, or an
+older file format) is reported as stale (``None``). The caller then rebuilds
+it. `save_snapshot` writes to a temporary file and renames it, so workers
+that still map the old file keep a consistent view.
+
+The snapshot itself is read-only. `MappedIndex` keeps later upserts in a
+small in-memory `VectorIndex` overlay and masks the replaced or removed
+snapshot rows, so the medication routes can keep the index current.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from .vector_index import EmbedFn, VectorIndex, hash_embed, normalize_rows, top_k
+
+__all__ = [
+    "SNAPSHOT_VERSION",
+    "SNAPSHOT_DTYPES",
+    "embedder_name",
+    "content_checksum",
+    "save_snapshot",
+    "read_header",
+    "open_snapshot",
+    "MappedIndex",
+]
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the file layout or the checksum recipe changes.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_DTYPES = ("int8", "float16")
+
+_MAGIC = b"PBVSNAP\x00"
+_PREFIX = struct.Struct("<8sQ")
+_ALIGN = 64
+# Rows dequantised at a time while scoring; bounds the float32 scratch space.
+_BLOCK_ROWS = 8192
+
+
+def embedder_name(embed: EmbedFn) -> str:
+    return getattr(embed, "__name__", repr(embed))
+
+
+def content_checksum(items: Iterable[tuple[str, str]], embed: EmbedFn, dim: int) -> str:
+    """SHA-256 over the sorted ``(doc_id, text)`` pairs and the embedder."""
+
+    digest = hashlib.sha256(f"{SNAPSHOT_VERSION}\0{embedder_name(embed)}\0{dim}\0".encode())
+    for doc_id, text in sorted(items):
+        digest.update(f"{doc_id}\0{text}\0".encode())
+    return digest.hexdigest()
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+class _Layout(NamedTuple):
+    """Byte offsets of each section, derived from the header alone."""
+
+    vectors: int
+    scales: int
+    id_offsets: int
+    ids: int
+    doc_offsets: int
+    docs: int
+    end: int
+
+
+def _layout(header_len: int, header: dict[str, Any]) -> _Layout:
+    count, dim, dtype = header["count"], header["dim"], header["dtype"]
+    vectors = _aligned(_PREFIX.size + header_len)
+    scales = _aligned(vectors + count * dim * np.dtype(dtype).itemsize)
+    id_offsets = _aligned(scales + (count * 4 if dtype == "int8" else 0))
+    ids = id_offsets + (count + 1) * 8
+    doc_offsets = _aligned(ids + header["ids_bytes"])
+    docs = doc_offsets + (count + 1) * 8
+    return _Layout(vectors, scales, id_offsets, ids, doc_offsets, docs, docs + header["docs_bytes"])
+
+
+def _string_table(strings: Iterable[str]) -> tuple[np.ndarray, bytes]:
+    """Encode *strings* as ``count + 1`` byte offsets and one UTF-8 blob."""
+
+    encoded = [text.encode() for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.uint64)
+    return offsets, b"".join(encoded)
+
+
+class _StringTable(Sequence[str]):
+    """Read-only view of a `_string_table`; each string is decoded on access."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray) -> None:
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:  # type: ignore[override]
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._blob[int(self._offsets[i]) : int(self._offsets[i + 1])].tobytes().decode()
+
+    def __iter__(self) -> Iterator[str]:
+        # One copy of the blob beats a mapped slice per string when decoding all.
+        blob, bounds = self._blob.tobytes(), self._offsets.tolist()
+        return (blob[start:stop].decode() for start, stop in zip(bounds, bounds[1:]))
+
+
+def _quantize(matrix: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    # Symmetric per-row int8: the largest component of each row maps to 127.
+    peak = np.abs(matrix).max(axis=1) if len(matrix) else np.zeros(0, dtype=np.float32)
+    scales = np.where(peak > 0, peak / 127, 1).astype(np.float32)
+    return np.rint(matrix / scales[:, None]).astype(np.int8), scales
+
+
+def save_snapshot(
+    index: VectorIndex, path: str | Path, checksum: str, dtype: str = "int8"
+) -> Path:
+    """Write *index* to *path* atomically and return the path."""
+
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"dtype must be one of {SNAPSHOT_DTYPES}, not {dtype!r}")
+    path = Path(path)
+    ids = index.ids
+    id_offsets, id_blob = _string_table(ids)
+    doc_offsets, doc_blob = _string_table(index.get(doc_id) or "" for doc_id in ids)
+    fields = {
+        "version": SNAPSHOT_VERSION,
+        "dtype": dtype,
+        "dim": index.dim,
+        "count": len(ids),
+        "embed": embedder_name(index.embed),
+        "checksum": checksum,
+        "created": time.time(),
+        "ids_bytes": len(id_blob),
+        "docs_bytes": len(doc_blob),
+    }
+    header = json.dumps(fields).encode()
+    vectors, scales = _quantize(index.matrix, dtype)
+    layout = _layout(len(header), fields)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        f.write(_PREFIX.pack(_MAGIC, len(header)))
+        f.write(header)
+        f.seek(layout.vectors)
+        f.write(vectors.tobytes())
+        if scales is not None:
+            f.seek(layout.scales)
+            f.write(scales.tobytes())
+        f.seek(layout.id_offsets)
+        f.write(id_offsets.tobytes() + id_blob)
+        f.seek(layout.doc_offsets)
+        f.write(doc_offsets.tobytes() + doc_blob)
+        f.truncate(layout.end)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def _read_prefix(path: Path) -> tuple[dict[str, Any], int] | None:
+    try:
+        with path.open("rb") as f:
+            magic, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != _MAGIC:
+                return None
+            return json.loads(f.read(header_len)), header_len
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def read_header(path: str | Path) -> dict[str, Any] | None:
+    """Return the header of the snapshot at *path*, or ``None`` if unreadable."""
+
+    prefix = _read_prefix(Path(path))
+    return None if prefix is None else prefix[0]
+
+
+def open_snapshot(
+    path: str | Path,
+    checksum: str | None = None,
+    embed: EmbedFn = hash_embed,
+    dtype: str | None = None,
+) -> MappedIndex | None:
+    """Map the snapshot at *path*; ``None`` if it is missing or stale.
+
+    Stale means: another format version, embedder or *dtype*, a checksum
+    other than *checksum*, or a truncated file.
+    """
+
+    path = Path(path)
+    prefix = _read_prefix(path)
+    header, header_len = prefix if prefix is not None else (None, 0)
+    reason = None
+    if header is None:
+        reason = "missing or unreadable"
+    elif header.get("version") != SNAPSHOT_VERSION:
+        reason = f"format version {header.get('version')}"
+    elif checksum is not None and header["checksum"] != checksum:
+        reason = "checksum differs from the current data"
+    elif header["embed"] != embedder_name(embed):
+        reason = f"built with embedder {header['embed']}"
+    elif dtype is not None and header["dtype"] != dtype:
+        reason = f"stored as {header['dtype']}"
+    if reason is not None:
+        logger.info("Index snapshot %s is stale: %s", path, reason)
+        return None
+
+    count, dim, stored = header["count"], header["dim"], header["dtype"]
+    layout = _layout(header_len, header)
+    if path.stat().st_size < layout.end:
+        logger.info("Index snapshot %s is stale: truncated", path)
+        return None
+    raw = np.memmap(path, dtype=np.uint8, mode="r", shape=(layout.end,))
+
+    def section(start: int, kind: Any, n: int) -> np.ndarray:  # noqa: ANN401
+        return raw[start : start + n * np.dtype(kind).itemsize].view(kind)
+
+    vectors = section(layout.vectors, stored, count * dim).reshape(count, dim)
+    scales = section(layout.scales, "<f4", count) if stored == "int8" else None
+    ids = _StringTable(
+        section(layout.id_offsets, "<u8", count + 1),
+        section(layout.ids, np.uint8, header["ids_bytes"]),
+    )
+    docs = _StringTable(
+        section(layout.doc_offsets, "<u8", count + 1),
+        section(layout.docs, np.uint8, header["docs_bytes"]),
+    )
+    # The ids feed the position map, so they are decoded now; docs stay mapped.
+    return MappedIndex(list(ids), docs, vectors, scales, embed=embed, dim=dim)
+
+
+class MappedIndex:
+    """A `VectorIndex`-compatible view over a mapped snapshot.
+
+    Snapshot rows are never written. `add` and `remove` mask the affected
+    rows and keep new versions in `overlay`, a regular in-memory index.
+    """
+
+    def __init__(
+        self,
+        ids: list[str],
+        docs: Sequence[str],
+        vectors: np.ndarray,
+        scales: np.ndarray | None,
+        embed: EmbedFn = hash_embed,
+        dim: int | None = None,
+    ) -> None:
+        self.embed = embed
+        self.dim = dim if dim is not None else vectors.shape[1]
+        self.overlay = VectorIndex(embed=embed, dim=self.dim)
+        self._ids = ids
+        self._docs = docs
+        self._vectors = vectors
+        self._scales = scales
+        self._pos = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._live = np.ones(len(ids), dtype=bool)
+        self._masked = 0
+
+    def __len__(self) -> int:
+        return len(self._ids) - self._masked + len(self.overlay)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self.overlay or self._base_pos(doc_id) is not None
+
+    def _base_pos(self, doc_id: object) -> int | None:
+        pos = self._pos.get(doc_id)  # type: ignore[call-overload]
+        return pos if pos is not None and self._live[pos] else None
+
+    @property
+    def ids(self) -> list[str]:
+        return [i for i, live in zip(self._ids, self._live) if live] + self.overlay.ids
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The live rows as one float32 array (a copy; for inspection)."""
+
+        base = self._dequantize(0, len(self._ids))[self._live]
+        return np.vstack([base, self.overlay.matrix])
+
+    def get(self, doc_id: str) -> str | None:
+        text = self.overlay.get(doc_id)
+        if text is not None:
+            return text
+        pos = self._base_pos(doc_id)
+        return None if pos is None else self._docs[pos]
+
+    # -- mutation ----------------------------------------------------------
+
+    def _mask(self, doc_ids: Iterable[str]) -> None:
+        for doc_id in doc_ids:
+            pos = self._base_pos(doc_id)
+            if pos is not None:
+                self._live[pos] = False
+                self._masked += 1
+
+    def add(self, items: Iterable[tuple[str, str]]) -> None:
+        pending = dict(items)
+        self._mask(pending)
+        self.overlay.add(pending.items())
+
+    def add_embedded(self, items: Iterable[tuple[str, str]], vectors: np.ndarray) -> None:
+        pending = dict(items)
+        self._mask(pending)
+        self.overlay.add_embedded(pending.items(), vectors)
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        doc_ids = list(doc_ids)
+        self._mask(doc_ids)
+        self.overlay.remove(doc_ids)
+
+    # -- search ------------------------------------------------------------
+
+    def _dequantize(self, start: int, stop: int) -> np.ndarray:
+        block = np.asarray(self._vectors[start:stop], dtype=np.float32)
+        if self._scales is not None:
+            block *= np.asarray(self._scales[start:stop])[:, None]
+        return block
+
+    def _base_scores(self, q: np.ndarray) -> np.ndarray:
+        n = len(self._ids)
+        scores = np.empty((len(q), n), dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, n)
+            scores[:, start:stop] = q @ np.asarray(self._vectors[start:stop], dtype=np.float32).T
+        if self._scales is not None:
+            # Scaling the n scores is cheaper than scaling the n x dim rows.
+            scores *= np.asarray(self._scales)
+        if self._masked:
+            scores[:, ~self._live] = -np.inf
+        return scores
+
+    def search_batch(
+        self, queries: Sequence[str], k: int = 3, threshold: float | None = None
+    ) -> list[list[tuple[str, float]]]:
+        if not queries:
+            return []
+        q = normalize_rows(np.asarray(self.embed(list(queries))))
+        scores = np.hstack([self._base_scores(q), q @ self.overlay.matrix.T])
+        n, extra = len(self._ids), self.overlay.ids
+        return [
+            [(self._ids[i] if i < n else extra[i - n], s) for i, s in hits if s != -np.inf]
+            for hits in top_k(scores, k, threshold)
+        ]
+
+    def search(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> list[tuple[str, float]]:
+        return self.search_batch([query], k, threshold)[0]
+
+    def retrieve(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> list[str]:
+        return [text for i, _ in self.search(query, k, threshold) if (text := self.get(i)) is not None]
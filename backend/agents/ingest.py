@@ -0,0 +1,556 @@
+"""
+Streaming ingestion of drug-label text into an on-disk retrieval store.
+
+Run from ``backend/`` with:
+    python -m agents.ingest labels/ --out label_index
+
+Each input file (or every ``.txt``/``.md`` file under an input directory) is
+read in 1 MiB blocks and split into overlapping chunks. A chunk is about
+`INGEST_CHUNK_BYTES` long, starts and ends on whitespace, and records its
+byte offsets in the source file. Chunks whose MinHash signature shows them
+to be near-duplicates (estimated Jaccard similarity of word 3-grams >=
+`INGEST_DEDUP_THRESHOLD`) of a chunk already in the store are dropped,
+whichever file or earlier run that chunk came from: one LSH index, seeded
+with the stored signatures, serves the whole run.
+Label text repeats a lot across products: the same warnings, the same
+generic in different packages. Candidate duplicates are found with
+locality-sensitive hashing over signature bands, so a chunk is compared
+with a handful of others rather than the whole store.
+
+Kept chunks are embedded in batches of `INGEST_BATCH` and streamed to disk,
+so memory stays bounded by the batch size and the LSH tables, whatever the
+file size. The store is content-addressed:
+
+    <out>/manifest.json          source path -> sha256, size, mtime, counts and
+                                 the shards its dropped chunks duplicated
+    <out>/shards/<sha256>.jsonl  one chunk per line: id, start, end, text
+    <out>/shards/<sha256>.vec    float32 embeddings, one row per chunk
+    <out>/shards/<sha256>.sig    uint32 MinHash signatures, one row per chunk
+
+A file whose size and mtime match the manifest is skipped without being
+read. A file with new mtime but known content (touched or copied) is
+hashed, then reuses the existing shard. Shards no longer referenced by
+any existing file are deleted, and files whose near-duplicates were dropped
+against one of them are ingested again, so no text is lost. `load_index` reads a store into a
+`VectorIndex`. Setting ``RAG_LABEL_DIR`` makes it a retrieval source of the
+agent (see `agents.sources`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO
+
+import numpy as np
+
+from .vector_index import DEFAULT_DIM, EmbedFn, VectorIndex, hash_embed
+
+__all__ = [
+    "INGEST_CHUNK_BYTES",
+    "INGEST_OVERLAP_BYTES",
+    "INGEST_BATCH",
+    "INGEST_DEDUP_THRESHOLD",
+    "Chunk",
+    "iter_chunks",
+    "MinHasher",
+    "LSHIndex",
+    "IngestReport",
+    "ingest",
+    "load_index",
+]
+
+INGEST_CHUNK_BYTES = int(os.getenv("INGEST_CHUNK_BYTES", "1200"))
+INGEST_OVERLAP_BYTES = int(os.getenv("INGEST_OVERLAP_BYTES", "200"))
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", "256"))
+INGEST_DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.8"))
+
+# 128 hashes in 16 bands of 8: pairs above ~0.7 Jaccard share a band with
+# high probability; candidates are then checked against the threshold.
+NUM_PERM = 128
+BANDS = 16
+
+_MANIFEST_VERSION = 2
+_READ_BLOCK = 1 << 20
+_SUFFIXES = {".txt", ".md"}
+_WHITESPACE = re.compile(rb"\s")
+_WORD = re.compile(r"[a-z0-9]+")
+# Per-file manifest fields describing its shard.
+_COUNT_KEYS = ("chunks", "duplicates", "deduped_against")
+
+# ---------------------------------------------------------------------------
+# Chunking
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A piece of a source file; *start*/*end* are byte offsets."""
+
+    start: int
+    end: int
+    text: str
+
+
+def _utf8_boundary(buf: bytearray, pos: int) -> int:
+    # Step back over UTF-8 continuation bytes so a cut never splits a character.
+    while 0 < pos < len(buf) and buf[pos] & 0xC0 == 0x80:
+        pos -= 1
+    return pos
+
+
+def iter_chunks(
+    stream: BinaryIO,
+    chunk_bytes: int = INGEST_CHUNK_BYTES,
+    overlap: int = INGEST_OVERLAP_BYTES,
+) -> Iterator[Chunk]:
+    """Yield overlapping chunks of a binary *stream*, reading it block by block."""
+
+    if not 0 <= overlap < chunk_bytes // 2:
+        raise ValueError("overlap must be less than half of chunk_bytes")
+    buf = bytearray()
+    offset = 0  # file offset of buf[0]
+    eof = False
+    while buf or not eof:
+        while not eof and len(buf) < chunk_bytes:
+            block = stream.read(_READ_BLOCK)
+            eof = not block
+            buf += block
+        if not buf:
+            break
+        if eof and len(buf) <= chunk_bytes:
+            cut = len(buf)
+        else:
+            # Cut after the last whitespace in the second half of the window.
+            cut = max(buf.rfind(b" ", chunk_bytes // 2, chunk_bytes),
+                      buf.rfind(b"\n", chunk_bytes // 2, chunk_bytes))
+            cut = cut + 1 if cut > 0 else _utf8_boundary(buf, chunk_bytes)
+        text = bytes(buf[:cut]).decode("utf-8", "replace").strip()
+        if text:
+            yield Chunk(offset, offset + cut, text)
+        if cut == len(buf) and eof:
+            break
+        # Next chunk starts `overlap` bytes back, at the following word.
+        step = max(cut - overlap, 1)
+        match = _WHITESPACE.search(buf, step, cut)
+        step = match.end() if match else _utf8_boundary(buf, step)
+        del buf[:step]
+        offset += step
+
+
+# ---------------------------------------------------------------------------
+# Near-duplicate detection
+# ---------------------------------------------------------------------------
+
+
+def _shingles(text: str, n: int = 3) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if len(words) < n:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i : i + n]) for i in range(len(words) - n + 1)]
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures of word 3-gram sets.
+
+    Each of the *num_perm* hash functions is ``((x ^ mask) * odd) >> 32`` on
+    the CRC32 of a shingle: cheap to vectorise and stable across processes,
+    which matters because signatures are stored on disk.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._masks = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)[:, None]
+        self._mults = (rng.integers(0, 1 << 31, num_perm, dtype=np.uint64) * 2 + 1)[:, None]
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = _shingles(text)
+        if not len(shingles):
+            return np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        hashed = ((shingles[None, :] ^ self._masks) * self._mults) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures with a similarity check.
+
+    Each signature may carry an *owner* (the ingest uses the sha256 of the
+    file it came from), reported by `duplicate_of`.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS, threshold: float = INGEST_DEDUP_THRESHOLD) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._tables: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self._signatures: list[np.ndarray] = []
+        self._owners: list[str | None] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _keys(self, signature: np.ndarray) -> Iterator[tuple[dict[bytes, list[int]], bytes]]:
+        for band, table in enumerate(self._tables):
+            yield table, signature[band * self.rows : (band + 1) * self.rows].tobytes()
+
+    def _match(self, signature: np.ndarray) -> int | None:
+        seen: set[int] = set()
+        for table, key in self._keys(signature):
+            for other in table.get(key, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                if np.mean(self._signatures[other] == signature) >= self.threshold:
+                    return other
+        return None
+
+    def is_duplicate(self, signature: np.ndarray) -> bool:
+        """True if a stored signature is at least `threshold` similar."""
+
+        return self._match(signature) is not None
+
+    def duplicate_of(self, signature: np.ndarray) -> tuple[bool, str | None]:
+        """``(is_duplicate, owner of the similar signature)``."""
+
+        ref = self._match(signature)
+        return (False, None) if ref is None else (True, self._owners[ref])
+
+    def add(self, signature: np.ndarray, owner: str | None = None) -> None:
+        ref = len(self._signatures)
+        self._signatures.append(signature)
+        self._owners.append(owner)
+        for table, key in self._keys(signature):
+            table.setdefault(key, []).append(ref)
+
+    def add_many(self, signatures: np.ndarray, owner: str | None = None) -> None:
+        for signature in signatures:
+            self.add(signature, owner)
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class IngestReport:
+    files: int = 0
+    skipped: int = 0  # unchanged size and mtime: not read at all
+    reused: int = 0  # content already in the store: hashed only
+    ingested: int = 0
+    # unchanged files ingested again: a file they deduplicated against changed
+    invalidated: int = 0
+    bytes_read: int = 0
+    chunks: int = 0
+    kept: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+    embed_seconds: float = 0.0  # part of `seconds` spent in the embedding function
+    peak_rss_mb: float | None = None
+    pruned: list[str] = field(default_factory=list)
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes_read / 1e6 / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {**self.__dict__, "mb_per_s": round(self.mb_per_s, 2)}
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _expand(paths: Iterable[str | Path]) -> list[Path]:
+    files: list[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(p for p in sorted(path.rglob("*")) if p.suffix in _SUFFIXES and p.is_file())
+        else:
+            files.append(path)
+    return files
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while block := f.read(_READ_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _Store:
+    def __init__(self, root: Path, params: dict[str, Any]) -> None:
+        self.root = root
+        self.shards = root / "shards"
+        self.shards.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = root / "manifest.json"
+        manifest: dict[str, Any] = {}
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+        if manifest.get("params") != params:
+            # Different chunking, embedding or hashing: nothing can be reused.
+            manifest = {}
+            for stale in self.shards.iterdir():
+                stale.unlink()
+        self.params = params
+        self.files: dict[str, dict[str, Any]] = manifest.get("files", {})
+
+    def shard(self, sha: str, suffix: str) -> Path:
+        return self.shards / f"{sha}{suffix}"
+
+    def has_shard(self, sha: str) -> bool:
+        return self.shard(sha, ".jsonl").exists()
+
+    def save(self) -> None:
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"params": self.params, "files": self.files}, indent=1))
+        os.replace(tmp, self.manifest_path)
+
+
+def _write_shard(
+    store: _Store,
+    path: Path,
+    sha: str,
+    chunks: Iterable[Chunk],
+    hasher: MinHasher,
+    lsh: LSHIndex,
+    embed: EmbedFn,
+    batch_size: int,
+    report: IngestReport,
+) -> dict[str, int]:
+    outputs = {suffix: store.shard(sha, suffix + ".tmp") for suffix in (".jsonl", ".vec", ".sig")}
+    kept = dropped = 0
+    deduped_against: set[str] = set()
+    batch: list[tuple[Chunk, np.ndarray]] = []
+    with (
+        outputs[".jsonl"].open("w") as texts,
+        outputs[".vec"].open("wb") as vectors,
+        outputs[".sig"].open("wb") as signatures,
+    ):
+
+        def flush() -> None:
+            nonlocal kept
+            start = time.perf_counter()
+            embedded = np.asarray(embed([chunk.text for chunk, _ in batch]), dtype=np.float32)
+            report.embed_seconds += time.perf_counter() - start
+            vectors.write(embedded.tobytes())
+            for chunk, signature in batch:
+                record = {"id": f"{sha[:16]}:{kept}", "start": chunk.start, "end": chunk.end, "text": chunk.text}
+                texts.write(json.dumps(record) + "\n")
+                signatures.write(signature.tobytes())
+                kept += 1
+            batch.clear()
+
+        for chunk in chunks:
+            signature = hasher.signature(chunk.text)
+            duplicate, owner = lsh.duplicate_of(signature)
+            if duplicate:
+                dropped += 1
+                if owner != sha:
+                    deduped_against.add(owner)  # type: ignore[arg-type]
+                continue
+            lsh.add(signature, sha)
+            batch.append((chunk, signature))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    for suffix, tmp in outputs.items():
+        os.replace(tmp, store.shard(sha, suffix))
+    report.chunks += kept + dropped
+    report.kept += kept
+    report.duplicates += dropped
+    return {"chunks": kept, "duplicates": dropped, "deduped_against": sorted(deduped_against)}
+
+
+def ingest(
+    paths: Iterable[str | Path],
+    out_dir: str | Path,
+    *,
+    chunk_bytes: int = INGEST_CHUNK_BYTES,
+    overlap: int = INGEST_OVERLAP_BYTES,
+    batch_size: int = INGEST_BATCH,
+    threshold: float = INGEST_DEDUP_THRESHOLD,
+    embed: EmbedFn = hash_embed,
+    dim: int = DEFAULT_DIM,
+) -> IngestReport:
+    """Ingest *paths* into the store at *out_dir* and return what happened."""
+
+    start = time.perf_counter()
+    params = {
+        "version": _MANIFEST_VERSION,
+        "embed": getattr(embed, "__name__", repr(embed)),
+        "dim": dim,
+        "chunk_bytes": chunk_bytes,
+        "overlap": overlap,
+        "num_perm": NUM_PERM,
+        "threshold": threshold,
+    }
+    store = _Store(Path(out_dir), params)
+    report = IngestReport()
+    stored = {entry["sha256"] for entry in store.files.values()}
+
+    # Pass 1: decide per file from stat(), hashing only files that changed.
+    pending: list[tuple[Path, str, os.stat_result]] = []
+    kept_as: dict[str, str] = {}  # file -> "skipped" / "reused"
+    for path in _expand(paths):
+        report.files += 1
+        key = str(path.resolve())
+        st = path.stat()
+        entry = store.files.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            report.skipped += 1
+            kept_as[key] = "skipped"
+            continue
+        sha = _sha256(path)
+        if store.has_shard(sha):
+            report.reused += 1
+            kept_as[key] = "reused"
+            same = entry is not None and entry["sha256"] == sha
+            counts = {k: entry[k] for k in _COUNT_KEYS} if same else _shard_counts(store, sha)
+            store.files[key] = {"sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns, **counts}
+            continue
+        store.files.pop(key, None)
+        pending.append((path, sha, st))
+
+    # Drop files that disappeared.
+    for key in [k for k in store.files if not Path(k).exists()]:
+        del store.files[key]
+        report.pruned.append(key)
+
+    # A shard that loses its last file takes its chunks along, including the
+    # only copies of chunks other shards dropped as its near-duplicates. Those
+    # shards are ingested again, and so on for shards that deduplicated
+    # against them.
+    stale = stored - {entry["sha256"] for entry in store.files.values()}
+    while True:
+        dependents = {
+            entry["sha256"]
+            for entry in store.files.values()
+            if entry["sha256"] not in stale and stale.intersection(entry["deduped_against"])
+        }
+        if not dependents:
+            break
+        stale |= dependents
+    for key in [k for k, entry in store.files.items() if entry["sha256"] in stale]:
+        path = Path(key)
+        if kept_as.get(key) == "reused":
+            report.reused -= 1
+        elif kept_as.get(key) == "skipped":
+            report.skipped -= 1
+        report.invalidated += 1
+        pending.append((path, store.files.pop(key)["sha256"], path.stat()))
+
+    # Then delete the shards nothing points at any more.
+    live = {entry["sha256"] for entry in store.files.values()}
+    for shard in store.shards.iterdir():
+        if shard.name.split(".", 1)[0] not in live:
+            shard.unlink()
+
+    # Pass 2: chunk, dedupe against everything kept so far, embed, write.
+    hasher = MinHasher(NUM_PERM)
+    lsh = LSHIndex(NUM_PERM, BANDS, threshold)
+    for sha in sorted(live):
+        sig = np.fromfile(store.shard(sha, ".sig"), dtype=np.uint32)
+        lsh.add_many(sig.reshape(-1, NUM_PERM), sha)
+    for path, sha, st in pending:
+        if not store.has_shard(sha):  # two new files with the same content
+            with path.open("rb") as f:
+                counts = _write_shard(
+                    store, path, sha, iter_chunks(f, chunk_bytes, overlap),
+                    hasher, lsh, embed, batch_size, report,
+                )
+            report.bytes_read += st.st_size
+        else:
+            counts = _shard_counts(store, sha)
+        report.ingested += 1
+        store.files[str(path.resolve())] = {
+            "sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns, **counts,
+        }
+        store.save()  # a crash keeps everything finished so far
+
+    store.save()
+    report.seconds = time.perf_counter() - start
+    report.peak_rss_mb = _peak_rss_mb()
+    return report
+
+
+def _shard_counts(store: _Store, sha: str) -> dict[str, Any]:
+    for entry in store.files.values():
+        if entry.get("sha256") == sha:
+            return {k: entry[k] for k in _COUNT_KEYS}
+    with store.shard(sha, ".jsonl").open() as f:
+        return {"chunks": sum(1 for _ in f), "duplicates": 0, "deduped_against": []}
+
+
+def load_index(out_dir: str | Path, index: VectorIndex | None = None) -> VectorIndex:
+    """Load every chunk of the store at *out_dir* into a `VectorIndex`."""
+
+    root = Path(out_dir)
+    manifest = json.loads((root / "manifest.json").read_text())
+    dim = manifest["params"]["dim"]
+    index = index if index is not None else VectorIndex(dim=dim)
+    for sha in sorted({entry["sha256"] for entry in manifest["files"].values()}):
+        with (root / "shards" / f"{sha}.jsonl").open() as f:
+            records = [json.loads(line) for line in f]
+        vectors = np.fromfile(root / "shards" / f"{sha}.vec", dtype=np.float32).reshape(-1, dim)
+        index.add_embedded(((r["id"], r["text"]) for r in records), vectors)
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="+", help="label files or directories of .txt/.md files")
+    parser.add_argument("--out", default=os.getenv("RAG_LABEL_DIR", "label_index"))
+    parser.add_argument("--chunk-bytes", type=int, default=INGEST_CHUNK_BYTES)
+    parser.add_argument("--overlap", type=int, default=INGEST_OVERLAP_BYTES)
+    parser.add_argument("--batch", type=int, default=INGEST_BATCH)
+    parser.add_argument("--threshold", type=float, default=INGEST_DEDUP_THRESHOLD)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = ingest(
+        args.paths,
+        args.out,
+        chunk_bytes=args.chunk_bytes,
+        overlap=args.overlap,
+        batch_size=args.batch,
+        threshold=args.threshold,
+    )
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+        return
+    print(
+        f"{report.files} files: {report.ingested} ingested "
+        f"({report.invalidated} after a near-duplicate source changed), {report.reused} reused, "
+        f"{report.skipped} unchanged, {len(report.pruned)} pruned"
+    )
+    print(
+        f"{report.chunks} chunks: {report.kept} kept, {report.duplicates} near-duplicates dropped"
+    )
+    peak = "n/a" if report.peak_rss_mb is None else f"{report.peak_rss_mb:.0f} MB"
+    print(
+        f"{report.bytes_read / 1e6:.1f} MB in {report.seconds:.2f} s "
+        f"({report.mb_per_s:.1f} MB/s), peak RSS {peak}"
+    )
+
+
+if __name__ == "__main__":
+    main()
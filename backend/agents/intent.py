@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+"""Local intent classifier that picks the graph branch for a message.
+
+The router used to call `is_med_query`, a keyword regex. The regex sends
+paraphrases like "which pill helps with a fever" to the chatbot, and sends
+off-topic messages that happen to contain "drug" to retrieval. An LLM
+classifier would fix that, but it would add a model round trip to every
+message.
+
+`IntentClassifier` is a small linear model: softmax regression over the
+`hash_embed` vector of a message, trained once from the labelled prompts in
+``intent_examples.txt``. Training takes tens of milliseconds, at startup or
+on first use. Classifying a message costs one embedding and one
+512 x 2 matrix product, tens of microseconds.
+
+Routing (`IntentRouter.route`) works in this order:
+
+1. A stocked drug name (`DrugMatcher`) always means a medication question.
+   The catalogue can hold names the examples never mention.
+2. Otherwise the classifier decides if its margin (probability of the best
+   label minus that of the runner-up) is at least `INTENT_MIN_MARGIN`.
+3. Otherwise the regex decides (`is_med_query`).
+
+How many messages each step decided, and the mean routing time, are
+exported under the "intent" metrics key. ``python -m agents.bench_intent``
+reports accuracy and latency against the keyword router.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from . import metrics
+from .rag_utils import get_matcher, is_med_query
+from .vector_index import EmbedFn, hash_embed
+
+__all__ = [
+    "EXAMPLES_FILE",
+    "INTENT_MIN_MARGIN",
+    "MED",
+    "CHAT",
+    "Intent",
+    "load_examples",
+    "IntentClassifier",
+    "IntentRouter",
+    "intent_router",
+]
+
+EXAMPLES_FILE = Path(__file__).with_name("intent_examples.txt")
+
+# Below this probability margin the classifier defers to the regex.
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.2"))
+
+MED = "med"
+CHAT = "chat"
+
+
+class Intent(NamedTuple):
+    label: str
+    confidence: float
+    # Which step decided: "drug_name", "classifier" or "fallback".
+    decided_by: str
+
+
+def load_examples(path: Path = EXAMPLES_FILE) -> list[tuple[str, str]]:
+    """Parse ``label:`` headers each followed by example lines."""
+
+    examples: list[tuple[str, str]] = []
+    label = ""
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.endswith(":"):
+            label = line[:-1]
+        else:
+            examples.append((line, label))
+    return examples
+
+
+class IntentClassifier:
+    """Softmax regression over a fixed text embedding.
+
+    Trained by full-batch gradient descent with L2 regularisation. There are
+    only a few hundred examples, so the whole training set is one matrix.
+    """
+
+    def __init__(
+        self,
+        embed: EmbedFn = hash_embed,
+        epochs: int = 500,
+        learning_rate: float = 4.0,
+        l2: float = 1e-4,
+    ) -> None:
+        self.embed = embed
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.labels: list[str] = []
+        self.weights = np.zeros((0, 0), dtype=np.float32)
+        self.bias = np.zeros(0, dtype=np.float32)
+
+    def fit(self, examples: Iterable[tuple[str, str]]) -> IntentClassifier:
+        examples = list(examples)
+        labels = sorted({label for _, label in examples})
+        x = self.embed([text for text, _ in examples])
+        y = np.eye(len(labels), dtype=np.float32)[[labels.index(lb) for _, lb in examples]]
+        w = np.zeros((x.shape[1], len(labels)), dtype=np.float32)
+        b = np.zeros(len(labels), dtype=np.float32)
+        for _ in range(self.epochs):
+            grad = (_softmax(x @ w + b) - y) / len(examples)
+            w -= self.learning_rate * (x.T @ grad + self.l2 * w)
+            b -= self.learning_rate * grad.sum(axis=0)
+        self.labels, self.weights, self.bias = labels, w, b
+        return self
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """Return ``(label, margin)`` for *text*."""
+
+        probs = _softmax(self.embed([text]) @ self.weights + self.bias)[0]
+        order = np.argsort(-probs)
+        margin = float(probs[order[0]] - probs[order[1]]) if len(order) > 1 else 1.0
+        return self.labels[int(order[0])], margin
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = np.exp(z - z.max(axis=1, keepdims=True))
+    return z / z.sum(axis=1, keepdims=True)
+
+
+class IntentRouter:
+    """Drug-name rule, then classifier, then regex; see the module docstring."""
+
+    def __init__(
+        self,
+        classifier: IntentClassifier | None = None,
+        min_margin: float = INTENT_MIN_MARGIN,
+    ) -> None:
+        self._classifier = classifier
+        self.min_margin = min_margin
+        self._lock = threading.Lock()
+        self.decided_by: Counter[str] = Counter()
+        self.labels: Counter[str] = Counter()
+        self._total_us = 0.0
+
+    def get_classifier(self) -> IntentClassifier:
+        """Return the classifier, training it from the examples on first call."""
+
+        if self._classifier is None:
+            with self._lock:
+                if self._classifier is None:
+                    self._classifier = IntentClassifier().fit(load_examples())
+        return self._classifier
+
+    def classify(self, text: str) -> Intent:
+        text = str(text)
+        if get_matcher().mentions(text):
+            return Intent(MED, 1.0, "drug_name")
+        label, margin = self.get_classifier().predict(text)
+        if margin >= self.min_margin:
+            return Intent(label, margin, "classifier")
+        return Intent(MED if is_med_query(text) else CHAT, margin, "fallback")
+
+    def route(self, text: str) -> Intent:
+        """`classify` *text* and count the decision."""
+
+        start = time.perf_counter()
+        intent = self.classify(text)
+        elapsed = (time.perf_counter() - start) * 1e6
+        with self._lock:
+            self.decided_by[intent.decided_by] += 1
+            self.labels[intent.label] += 1
+            self._total_us += elapsed
+        return intent
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = sum(self.decided_by.values())
+            return {
+                "routed": total,
+                "labels": dict(self.labels),
+                "decided_by": dict(self.decided_by),
+                "mean_us": round(self._total_us / total, 2) if total else 0.0,
+                "min_margin": self.min_margin,
+            }
+
+
+intent_router = IntentRouter()
+metrics.register("intent", intent_router.stats)
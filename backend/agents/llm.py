@@ -0,0 +1,393 @@
+from __future__ import annotations
+
+"""LLM execution layer: pooled HTTP clients, per-provider limits, backpressure.
+
+Every model call made by the graph goes through the `Limiter` of its provider
+(the ``openai`` in ``openai:gpt-4o-mini``):
+
+* at most `LLM_MAX_CONCURRENCY` calls are in flight; further callers wait in a
+  FIFO queue of at most `LLM_MAX_QUEUE` entries for up to `LLM_QUEUE_TIMEOUT`
+  seconds;
+* an optional token bucket (`LLM_RATE_PER_SECOND`, `LLM_BURST`) spaces calls
+  out to stay under the provider's request rate limit.
+
+A call that cannot be admitted raises `ProviderBusy` immediately instead of
+piling up; the API turns it into a ``429`` with ``Retry-After``.
+
+`init_pooled_chat_model` creates the chat model on shared keep-alive HTTP
+clients (for the OpenAI-compatible providers, whose LangChain wrappers accept
+one), so calls reuse warm connections instead of paying TCP/TLS setup.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Any
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+__all__ = [
+    "AGENT_MODEL",
+    "ProviderBusy",
+    "TokenBucket",
+    "Limiter",
+    "provider_of",
+    "get_limiter",
+    "init_pooled_chat_model",
+]
+
+# Users can set any supported model via the environment variable AGENT_MODEL.
+# Defaults to OpenAI GPT-4o-mini which supports tool calling and streaming.
+AGENT_MODEL = os.getenv("AGENT_MODEL", "openai:gpt-4o-mini")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+# Requests per second; 0 disables the token bucket.
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "0"))
+LLM_BURST = int(os.getenv("LLM_BURST", str(max(1, LLM_MAX_CONCURRENCY))))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+
+
+class ProviderBusy(Exception):
+    """The provider is at capacity; retry after `retry_after` seconds."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"LLM provider {provider!r} is busy: {reason}")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at *rate* tokens/second up to *burst*.
+
+    `reserve` always takes a token, possibly going into debt, and returns how
+    long the caller must wait before using it; `refund` gives it back.
+    """
+
+    def __init__(
+        self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def delay(self) -> float:
+        """Seconds until a token would be available, without taking one."""
+
+        with self._lock:
+            self._refill()
+            return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+# ---------------------------------------------------------------------------
+# Concurrency limiting
+# ---------------------------------------------------------------------------
+
+class _Waiter:
+    __slots__ = ("granted", "wake")
+
+    def __init__(self, wake: Callable[[], None]) -> None:
+        self.granted = False
+        self.wake = wake
+
+
+class Limiter:
+    """Per-provider admission control shared by sync and async callers.
+
+    Slots are handed directly to the longest-waiting caller on release, so
+    the queue is FIFO and works across threads and event loops.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        rate: float = LLM_RATE_PER_SECOND,
+        burst: int = LLM_BURST,
+    ) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._in_flight = 0
+        self._waiters: deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+        self.peak_queued = 0
+        self._wait_total = 0.0
+
+    # -- admission ----------------------------------------------------------
+
+    def check(self) -> None:
+        """Raise `ProviderBusy` if a new call would be rejected right now."""
+
+        with self._lock:
+            if self._in_flight >= self.max_concurrency and len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise ProviderBusy(self.name, "request queue is full", self.queue_timeout)
+        if self.bucket is not None:
+            delay = self.bucket.delay()
+            if delay > self.queue_timeout:
+                with self._lock:
+                    self.rejected += 1
+                raise ProviderBusy(self.name, "rate limit reached", delay)
+
+    def _enqueue(self, wake: Callable[[], None]) -> _Waiter | None:
+        """Take a slot (returning None) or join the queue (returning the waiter)."""
+
+        with self._lock:
+            if self._in_flight < self.max_concurrency and not self._waiters:
+                self._in_flight += 1
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise ProviderBusy(self.name, "request queue is full", self.queue_timeout)
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            self.peak_queued = max(self.peak_queued, len(self._waiters))
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Leave the queue; if a slot was granted meanwhile, pass it on."""
+
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return
+        self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                wake = waiter.wake
+            else:
+                self._in_flight -= 1
+                return
+        wake()
+
+    def _timed_out(self) -> ProviderBusy:
+        with self._lock:
+            self.rejected += 1
+        return ProviderBusy(self.name, "timed out waiting for a slot", self.queue_timeout)
+
+    def _admit(self, waited: float) -> float:
+        """Record an admitted call and return how long the rate limit delays it."""
+
+        delay = self.bucket.reserve() if self.bucket is not None else 0.0
+        if delay > self.queue_timeout:
+            self.bucket.refund()  # type: ignore[union-attr]
+            self._release()
+            with self._lock:
+                self.rejected += 1
+            raise ProviderBusy(self.name, "rate limit reached", delay)
+        with self._lock:
+            self.admitted += 1
+            self._wait_total += waited + delay
+        return delay
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now (and the rate allows it).
+
+        For optional work such as hedged requests, which should not queue or
+        add to the provider's load when it is already busy. Pair with
+        `release`.
+        """
+
+        with self._lock:
+            if self._in_flight >= self.max_concurrency or self._waiters:
+                return False
+            self._in_flight += 1
+        if self.bucket is not None and self.bucket.reserve() > 0:
+            self.bucket.refund()
+            self._release()
+            return False
+        with self._lock:
+            self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self._release()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """Hold one of the provider's call slots (async callers)."""
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(lambda: loop.call_soon_threadsafe(event.set))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(event.wait(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+                raise self._timed_out() from None
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+        delay = self._admit(time.perf_counter() - start)
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            self._release()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the provider's call slots (sync callers)."""
+
+        start = time.perf_counter()
+        event = threading.Event()
+        waiter = self._enqueue(event.set)
+        if waiter is not None and not event.wait(self.queue_timeout):
+            self._abandon(waiter)
+            raise self._timed_out()
+        delay = self._admit(time.perf_counter() - start)
+        try:
+            if delay:
+                time.sleep(delay)
+            yield
+        finally:
+            self._release()
+
+    # -- metrics ------------------------------------------------------------
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "max_queue": self.max_queue,
+                "peak_queued": self.peak_queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "mean_wait_ms": round(self._wait_total / self.admitted * 1000, 3)
+                if self.admitted
+                else 0.0,
+            }
+        if self.bucket is not None:
+            stats["rate_per_second"] = self.bucket.rate
+            stats["tokens_available"] = round(self.bucket.available, 3)
+        return stats
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+_limiters: dict[str, Limiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def provider_of(model_id: str) -> str:
+    """``"openai:gpt-4o-mini"`` -> ``"openai"``; un-prefixed ids share ``"default"``."""
+
+    return model_id.split(":", 1)[0] if ":" in model_id else "default"
+
+
+def get_limiter(model_id: str = AGENT_MODEL) -> Limiter:
+    """Return the (process-wide) limiter for *model_id*'s provider."""
+
+    provider = provider_of(model_id)
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = Limiter(provider)
+        return limiter
+
+
+metrics.register(
+    "llm", lambda: {name: limiter.stats() for name, limiter in sorted(_limiters.items())}
+)
+
+
+# ---------------------------------------------------------------------------
+# Model construction
+# ---------------------------------------------------------------------------
+
+# Providers whose LangChain chat model takes `http_client`/`http_async_client`.
+_HTTPX_PROVIDERS = {"openai", "azure_openai", "deepseek", "xai", "groq"}
+
+
+def _http_clients() -> dict[str, Any]:
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS,
+    )
+    timeout = httpx.Timeout(60.0, connect=5.0)
+    return {
+        "http_client": httpx.Client(limits=limits, timeout=timeout),
+        "http_async_client": httpx.AsyncClient(limits=limits, timeout=timeout),
+    }
+
+
+def init_pooled_chat_model(model_id: str = AGENT_MODEL, **kwargs: Any) -> BaseChatModel:
+    """Create the chat model for *model_id* on keep-alive pooled HTTP clients.
+
+    ``fake`` / ``fake:...`` ids give the offline `FakeStreamingChatModel`.
+    """
+
+    from .fake_llm import FakeStreamingChatModel, is_fake_model
+
+    if is_fake_model(model_id):
+        return FakeStreamingChatModel.from_spec(model_id)
+
+    # langchain.chat_models pulls in the provider SDKs; defer it.
+    from langchain.chat_models import init_chat_model
+
+    provider = provider_of(model_id)
+    if provider in _HTTPX_PROVIDERS:
+        kwargs = {**_http_clients(), **kwargs}
+    if provider in ("openai", "azure_openai"):
+        # Ask for token usage on streamed responses too (see agents.tracing).
+        kwargs.setdefault("stream_usage", True)
+    return init_chat_model(model_id, **kwargs)
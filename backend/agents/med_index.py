@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+"""Retrieval index over the live `Medication` table.
+
+The API loads every medication row once at startup (`MedicationIndex.load`)
+and then keeps the index in step with the `/medications` routes by upserting
+or removing single entries, so each write costs one embedding instead of a
+full rebuild.
+
+Alongside the embeddings the index keeps a BM25 index of the same snippets
+(`search_lexical`, used by the hybrid retrieval in `agents.sources`) and each
+row's structured fields
+(`MedicationFacts`), so lookups such as "what does Advil cost" can be
+answered without retrieval or a model call (see `agents.fast_path`).
+
+This module only relies on the attributes of a medication row (`id`,
+`brand_name`, `generic`, `dose_mg`, `cost_usd`) and does not import the app's
+models, keeping `agents` usable outside the API process.
+
+Each uvicorn worker holds its own copy of the index. The API announces every
+medication write over Postgres LISTEN/NOTIFY and each worker upserts the row
+into its own copy (see ``app.core.db.listen_for_medication_changes``), which
+also invalidates that worker's answer cache. With a snapshot path,
+`load` maps the embeddings from a file (see `agents.index_snapshot`) rather
+than embedding every row. All workers then share one copy of the matrix, and
+the file is rebuilt when its checksum no longer matches the table. With
+``ann=True`` the rows go into an `IVFIndex`, which searches approximately once
+the table is large (see `agents.ann`).
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, List, NamedTuple
+
+from . import metrics
+from .ann import IVFIndex
+from .bm25 import BM25Index
+from .drug_matcher import DrugMatcher
+from .index_snapshot import MappedIndex, content_checksum, open_snapshot, save_snapshot
+from .vector_index import VectorIndex
+
+__all__ = [
+    "MedicationFacts",
+    "medication_doc",
+    "MedicationIndex",
+    "medication_index",
+]
+
+
+class MedicationFacts(NamedTuple):
+    """The structured fields of one medication row."""
+
+    brand_name: str
+    generic: str
+    dose_mg: int
+    cost_usd: float
+
+    @classmethod
+    def of(cls, med: Any) -> MedicationFacts:  # noqa: ANN401
+        return cls(med.brand_name, med.generic, med.dose_mg, med.cost_usd)
+
+
+def medication_doc(med: Any) -> str:  # noqa: ANN401
+    """Render a medication row as the snippet fed to the answer prompt."""
+
+    return (
+        f"{med.brand_name} (generic: {med.generic}) is a medication stocked at "
+        f"a dose of {med.dose_mg} mg and costs ${med.cost_usd:.2f} per dose."
+    )
+
+
+logger = logging.getLogger(__name__)
+
+
+def _names(med: Any) -> list[str]:  # noqa: ANN401
+    return [med.brand_name, med.generic]
+
+
+class _ReadWriteLock:
+    """Any number of readers or a single writer; a waiting writer holds off new readers."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class MedicationIndex:
+    """Thread-safe wrapper that keys a `VectorIndex` by medication id.
+
+    Sync routes run in the threadpool while the chat route searches from the
+    event loop. Searches share a readers-writer lock, so vector and BM25
+    lookups (query embedding included) run side by side and only wait for
+    writes. Writes embed their row before taking the lock, so the lock is
+    held just long enough to put the row in place. The companion `matcher`
+    maps brand/generic names (and their synonyms) to the same ids.
+
+    *render* turns a row into its snippet (`medication_doc` by default).
+    """
+
+    def __init__(
+        self,
+        index: VectorIndex | MappedIndex | None = None,
+        render: Callable[[Any], str] = medication_doc,
+    ) -> None:
+        self.index = index if index is not None else VectorIndex()
+        self.matcher = DrugMatcher()
+        self.lexical = BM25Index()
+        self._render = render
+        self._facts: dict[str, MedicationFacts] = {}
+        self._listeners: list[Callable[[list[str]], Any]] = []
+        self._lock = _ReadWriteLock()
+        # How the last `load` obtained its embeddings; see `stats`.
+        self._last_load: dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def on_change(self, callback: Callable[[list[str]], Any]) -> None:
+        """Call *callback* with the affected ids after every upsert/remove."""
+
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _notify(self, med_id: str) -> None:
+        for callback in self._listeners:
+            callback([med_id])
+
+    def load(
+        self,
+        meds: Iterable[Any],
+        snapshot: str | Path | None = None,
+        dtype: str = "int8",
+        ann: bool = False,
+    ) -> None:
+        """Replace the whole index with *meds* (used once at startup).
+
+        With *snapshot*, embeddings come from that file when it matches
+        *meds*; otherwise they are computed and the file is (re)written.
+        With *ann*, search goes through an `IVFIndex`.
+        """
+
+        start = time.perf_counter()
+        meds = list(meds)
+        items = [(str(med.id), self._render(med)) for med in meds]
+        if snapshot is None:
+            fresh: VectorIndex | MappedIndex = self._build(items, ann)
+            source = "embedded"
+        else:
+            fresh, source = self._from_snapshot(Path(snapshot), items, dtype)
+            if ann and isinstance(fresh, MappedIndex):
+                # IVF keeps its rows in memory; the snapshot still spares the embedding.
+                ivf = self._empty(ann=True)
+                ivf.add_embedded(((i, fresh.get(i) or "") for i in fresh.ids), fresh.matrix)
+                fresh = ivf
+        facts = {str(med.id): MedicationFacts.of(med) for med in meds}
+        lexical = BM25Index(self.lexical.k1, self.lexical.b)
+        lexical.add(items)
+        with self._lock.write():
+            self.index = fresh
+            self.lexical = lexical
+            self._facts = facts
+            self._last_load = {
+                "source": source,
+                "snapshot": None if snapshot is None else str(snapshot),
+                "ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        self.matcher.load((str(med.id), _names(med)) for med in meds)
+
+    def _empty(self, ann: bool = False) -> VectorIndex:
+        cls = IVFIndex if ann else VectorIndex
+        return cls(embed=self.index.embed, dim=self.index.dim)
+
+    def _build(self, items: list[tuple[str, str]], ann: bool = False) -> VectorIndex:
+        fresh = self._empty(ann)
+        fresh.add(items)
+        return fresh
+
+    def _from_snapshot(
+        self, path: Path, items: list[tuple[str, str]], dtype: str
+    ) -> tuple[VectorIndex | MappedIndex, str]:
+        embed, dim = self.index.embed, self.index.dim
+        checksum = content_checksum(items, embed, dim)
+        mapped = open_snapshot(path, checksum, embed=embed, dtype=dtype)
+        if mapped is not None:
+            return mapped, "snapshot"
+        built = self._build(items)
+        try:
+            save_snapshot(built, path, checksum, dtype)
+        except OSError:
+            logger.warning("Could not write index snapshot %s", path, exc_info=True)
+            return built, "embedded"
+        # Map the file just written so this worker shares pages with the others.
+        mapped = open_snapshot(path, checksum, embed=embed, dtype=dtype)
+        return (mapped, "rebuilt") if mapped is not None else (built, "embedded")
+
+    def upsert(self, med: Any) -> None:  # noqa: ANN401
+        """Insert or refresh the entry for a single created/updated row."""
+
+        item = (str(med.id), self._render(med))
+        vectors = self.index.embed([item[1]])
+        with self._lock.write():
+            self.index.add_embedded([item], vectors)
+            self.lexical.add([item])
+            self._facts[str(med.id)] = MedicationFacts.of(med)
+            self._regroup()
+        self.matcher.set(str(med.id), _names(med))
+        self._notify(str(med.id))
+
+    def remove(self, med_id: Any) -> None:  # noqa: ANN401
+        with self._lock.write():
+            self.index.remove([str(med_id)])
+            self.lexical.remove([str(med_id)])
+            self._facts.pop(str(med_id), None)
+            self._regroup()
+        self.matcher.remove(str(med_id))
+        self._notify(str(med_id))
+
+    def _regroup(self) -> None:
+        # An IVF index regroups its rows on the first search after a write;
+        # doing it here keeps searches read-only so they can share the lock.
+        if isinstance(self.index, IVFIndex):
+            self.index.optimize()
+
+    def facts(self, doc_id: str) -> MedicationFacts | None:
+        with self._lock.read():
+            return self._facts.get(doc_id)
+
+    def get(self, doc_id: str) -> str | None:
+        with self._lock.read():
+            return self.index.get(doc_id)
+
+    def search(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> List[tuple[str, float]]:
+        with self._lock.read():
+            return self.index.search(query, k, threshold)
+
+    def retrieve(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> List[str]:
+        with self._lock.read():
+            return self.index.retrieve(query, k, threshold)
+
+    def search_lexical(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> List[tuple[str, float]]:
+        """BM25 ``(doc_id, score)`` hits for *query*."""
+
+        with self._lock.read():
+            return self.lexical.search(query, k, threshold)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock.read():
+            stats = {"documents": len(self.index), "last_load": dict(self._last_load)}
+            if isinstance(self.index, IVFIndex):
+                stats["ivf"] = self.index.stats()
+            return stats
+
+
+# Process-wide instance shared by the API routes and `rag_utils`.
+medication_index = MedicationIndex()
+metrics.register("medication_index", medication_index.stats)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+"""Conversation memory: checkpointer factory and history trimming.
+
+Threads are persisted by a LangGraph checkpointer so clients only send the
+newest message. `open_checkpointer` picks the backend from a URL:
+
+* ``postgresql://...``  – `AsyncPostgresSaver` (the API, using the app's DB)
+* ``sqlite:///path``    – `AsyncSqliteSaver` (local development)
+* ``memory`` / ``None`` – in-process `InMemorySaver` (tests)
+
+The stored history grows with the thread, but `trim_history` caps what is
+sent to the model at `AGENT_HISTORY_TOKENS` tokens. The newest human message
+is always sent, cut to the budget if it is over it by itself.
+"""
+
+import os
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from typing import Any
+
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    convert_to_messages,
+    trim_messages,
+)
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from .context import count_tokens, truncate_tokens
+from .rag_utils import extract_text
+
+__all__ = [
+    "AGENT_HISTORY_TOKENS",
+    "open_checkpointer",
+    "trim_history",
+]
+
+# Token budget for the message window handed to the chat model.
+AGENT_HISTORY_TOKENS = int(os.getenv("AGENT_HISTORY_TOKENS", "2000"))
+
+# A few tokens of per-message overhead for role markers.
+_MESSAGE_OVERHEAD = 4
+
+
+def _count_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(count_tokens(extract_text(m)) + _MESSAGE_OVERHEAD for m in messages)
+
+
+def trim_history(
+    messages: Sequence[Any], max_tokens: int | None = None
+) -> list[BaseMessage]:
+    """Keep the most recent messages that fit in *max_tokens*.
+
+    The window always starts on a human turn and keeps a leading system
+    message if there is one. When the newest human message does not fit by
+    itself, older turns are dropped and it is cut to the tokens left after
+    the system message (the system message too is dropped if it leaves no
+    room), so the model is never called without the question.
+    """
+
+    budget = AGENT_HISTORY_TOKENS if max_tokens is None else max_tokens
+    messages = convert_to_messages(messages)
+    trimmed = trim_messages(
+        messages,
+        max_tokens=budget,
+        token_counter=_count_message_tokens,
+        strategy="last",
+        start_on="human",
+        include_system=True,
+        allow_partial=False,
+    )
+    latest = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+    if latest is None or any(isinstance(m, HumanMessage) for m in trimmed):
+        return trimmed
+
+    system = [m for m in messages[:1] if isinstance(m, SystemMessage)]
+    room = budget - _count_message_tokens(system) - _MESSAGE_OVERHEAD
+    if room <= 0:
+        system = []
+        room = budget - _MESSAGE_OVERHEAD
+    text = truncate_tokens(extract_text(latest), room)
+    return [*system, latest.model_copy(update={"content": text})]
+
+
+@asynccontextmanager
+async def open_checkpointer(url: str | None) -> AsyncIterator[BaseCheckpointSaver]:
+    """Yield a ready-to-use async checkpointer for *url* (see module docstring)."""
+
+    if not url or url == "memory":
+        yield InMemorySaver()
+        return
+
+    if url.startswith("sqlite:///"):
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        async with AsyncSqliteSaver.from_conn_string(url[len("sqlite:///") :]) as saver:
+            await saver.setup()
+            yield saver
+        return
+
+    if url.startswith(("postgresql://", "postgres://")):
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        # A pool rather than a single connection, so concurrent chats don't
+        # serialise on checkpoint reads/writes.
+        async with AsyncConnectionPool(
+            url,
+            open=False,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        ) as pool:
+            saver = AsyncPostgresSaver(pool)  # type: ignore[arg-type]
+            await saver.setup()
+            yield saver
+        return
+
+    raise ValueError(f"Unsupported checkpointer URL: {url!r}")
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+"""Tiny registry for agent metrics.
+
+Components register a zero-argument callable returning a JSON-serialisable
+dict; `snapshot()` collects them all. The API exposes the snapshot at
+``GET /chat/metrics``.
+"""
+
+from collections.abc import Callable, Sequence
+from typing import Any
+
+__all__ = ["register", "unregister", "snapshot", "percentile"]
+
+_providers: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register(name: str, provider: Callable[[], dict[str, Any]]) -> None:
+    """Expose *provider*'s output under *name* (replacing any previous one)."""
+
+    _providers[name] = provider
+
+
+def unregister(name: str) -> None:
+    _providers.pop(name, None)
+
+
+def snapshot() -> dict[str, dict[str, Any]]:
+    """Return the current value of every registered metrics provider."""
+
+    return {name: provider() for name, provider in sorted(_providers.items())}
+
+
+def percentile(sorted_samples: Sequence[float], pct: float) -> float | None:
+    """Nearest-rank *pct* percentile of ascending *sorted_samples*; ``None`` if empty."""
+
+    if not sorted_samples:
+        return None
+    rank = round(pct / 100 * len(sorted_samples))
+    return sorted_samples[min(len(sorted_samples) - 1, max(0, rank - 1))]
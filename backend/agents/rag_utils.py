@@ -5,17 +5,42 @@ from __future__ import annotations
 This module keeps the graph definition (`graph.py`) lightweight by housing
 static medication snippets, text-extraction helpers, and simple heuristics for
 classifying whether an incoming question warrants retrieval.
+
+Retrieval is delegated to a pluggable `Retriever`; by default a `VectorIndex`
+over `MED_CORPUS` is built on first use. Use `set_retriever` to swap in a
+different backend (e.g. a larger corpus or a real embedding model). A
+retriever that also implements `LexicalRetriever` (such as `MedicationIndex`)
+feeds `retrieve_lexical_hits`, the BM25 half of hybrid retrieval.
+
+Drug names are detected by a `DrugMatcher` (one Aho-Corasick pass over the
+text) whose output drives both routing and retrieval; `set_matcher` installs
+one built from another catalogue alongside its retriever.
 """
 
+import os
 import re
-from typing import List, Any
+from typing import List, Any, Protocol, runtime_checkable
+
+from .drug_matcher import DrugMatcher
+from .vector_index import VectorIndex
 
 __all__ = [
     "MED_CORPUS",
     "PHARMA_PATTERN",
+    "RAG_TOP_K",
+    "RAG_MIN_SCORE",
+    "RAG_BM25_MIN_SCORE",
+    "Retriever",
+    "LexicalRetriever",
     "is_med_query",
     "extract_text",
+    "get_matcher",
+    "set_matcher",
+    "get_retriever",
+    "set_retriever",
+    "retrieve_med_hits",
     "retrieve_med_docs",
+    "retrieve_lexical_hits",
 ]
 
 # ---------------------------------------------------------------------------
@@ -43,19 +68,40 @@ MED_CORPUS: dict[str, str] = {
 }
 
 # ---------------------------------------------------------------------------
-# Query classification regex
+# Query classification
 # ---------------------------------------------------------------------------
 
+# Generic pharmacy vocabulary. Drug names themselves are found by the
+# `DrugMatcher` automaton so they can follow the catalogue.
 _pharma_keywords = [
     r"\bmed(ication|s)?\b",
     r"\bdrug(s)?\b",
     r"\bdos(e|ing|age)\b",
     r"\bmg\b",
     r"\btablet\b",
-    r"\baspirin\b|\bibuprofen\b|\bacetaminophen\b",
 ]
 PHARMA_PATTERN = re.compile("|".join(_pharma_keywords), re.IGNORECASE)
 
+_matcher: DrugMatcher | None = None
+
+
+def get_matcher() -> DrugMatcher:
+    """Return the active drug-name matcher (defaults to `MED_CORPUS` keys)."""
+
+    global _matcher
+    if _matcher is None:
+        matcher = DrugMatcher()
+        matcher.load((key, [key]) for key in MED_CORPUS)
+        _matcher = matcher
+    return _matcher
+
+
+def set_matcher(matcher: DrugMatcher | None) -> None:
+    """Install *matcher* for routing and retrieval (``None`` restores the default)."""
+
+    global _matcher
+    _matcher = matcher
+
 
 def extract_text(message: Any) -> str:  # noqa: ANN401
     """Return the raw textual content from a LangChain Message or fallback types."""
@@ -75,16 +121,122 @@ def extract_text(message: Any) -> str:  # noqa: ANN401
 
 def is_med_query(text: str) -> bool:
     """Quick heuristic deciding if *text* is about medication/pharma."""
-    return bool(PHARMA_PATTERN.search(str(text).lower()))
+    text = str(text)
+    return bool(PHARMA_PATTERN.search(text) or get_matcher().mentions(text))
 
 
 # ---------------------------------------------------------------------------
 # Retrieval helper
 # ---------------------------------------------------------------------------
 
-def retrieve_med_docs(query: str) -> List[str]:
-    """Return relevant medication snippets for *query* (case-insensitive)."""
+# Number of snippets handed to the answer prompt and the minimum cosine
+# similarity a snippet needs to be considered relevant at all.
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.1"))
+# Minimum BM25 score of a lexical hit. Terms every snippet contains ("dose",
+# "mg") score close to zero, so this keeps only real term matches.
+RAG_BM25_MIN_SCORE = float(os.getenv("RAG_BM25_MIN_SCORE", "1.0"))
+
+
+class Retriever(Protocol):
+    """Anything that can rank document ids for a question and return their text."""
+
+    def get(self, doc_id: str) -> str | None: ...
+
+    def search(
+        self, query: str, k: int = ..., threshold: float | None = ...
+    ) -> List[tuple[str, float]]: ...
+
+
+@runtime_checkable
+class LexicalRetriever(Retriever, Protocol):
+    """A `Retriever` that can also rank documents by BM25."""
+
+    def search_lexical(
+        self, query: str, k: int = ..., threshold: float | None = ...
+    ) -> List[tuple[str, float]]: ...
+
+
+_retriever: Retriever | None = None
+
+
+def get_retriever() -> Retriever:
+    """Return the active retriever, building the default index on first use."""
+
+    global _retriever
+    if _retriever is None:
+        index = VectorIndex()
+        index.add(MED_CORPUS.items())
+        _retriever = index
+    return _retriever
+
+
+def set_retriever(retriever: Retriever | None) -> None:
+    """Install *retriever* for `retrieve_med_docs` (``None`` restores the default)."""
+
+    global _retriever
+    _retriever = retriever
+
+
+def retrieve_med_hits(
+    query: str, k: int | None = None, threshold: float | None = None
+) -> List[tuple[str, str]]:
+    """Return up to *k* ``(doc_id, snippet)`` pairs relevant to *query*.
+
+    Documents for drugs named in the query come first; the retriever fills
+    any remaining slots. Snippets scoring below *threshold* are dropped, so an
+    off-topic question yields an empty list rather than the whole corpus.
+    """
+
+    query = str(query)
+    k = RAG_TOP_K if k is None else k
+    retriever = get_retriever()
+
+    hits: dict[str, str] = {}
+    for doc_id in get_matcher().doc_ids(query):
+        doc = retriever.get(doc_id)
+        if doc is not None:
+            hits[doc_id] = doc
+    if len(hits) < k:
+        ranked = retriever.search(
+            query, k=k, threshold=RAG_MIN_SCORE if threshold is None else threshold
+        )
+        for doc_id, _ in ranked:
+            if doc_id not in hits:
+                doc = retriever.get(doc_id)
+                if doc is not None:
+                    hits[doc_id] = doc
+    return list(hits.items())[:k]
+
+
+def retrieve_med_docs(
+    query: str, k: int | None = None, threshold: float | None = None
+) -> List[str]:
+    """Return up to *k* medication snippets relevant to *query*."""
+
+    return [doc for _, doc in retrieve_med_hits(query, k, threshold)]
+
+
+def retrieve_lexical_hits(
+    query: str, k: int | None = None, threshold: float | None = None
+) -> List[tuple[str, str]]:
+    """BM25 counterpart of `retrieve_med_hits`.
+
+    Empty when the active retriever has no lexical index (the default
+    `MED_CORPUS` index has none).
+    """
 
-    query_lc = str(query).lower()
-    hits = [doc for key, doc in MED_CORPUS.items() if key in query_lc]
-    return hits or list(MED_CORPUS.values()) 
\ No newline at end of file
+    retriever = get_retriever()
+    if not isinstance(retriever, LexicalRetriever):
+        return []
+    ranked = retriever.search_lexical(
+        str(query),
+        k=RAG_TOP_K if k is None else k,
+        threshold=RAG_BM25_MIN_SCORE if threshold is None else threshold,
+    )
+    hits = []
+    for doc_id, _ in ranked:
+        doc = retriever.get(doc_id)
+        if doc is not None:
+            hits.append((doc_id, doc))
+    return hits
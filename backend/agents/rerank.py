@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+"""Cheap reranking of fused retrieval results.
+
+Reciprocal-rank fusion (`agents.sources.merge_hits`) only sees ranks, so a
+snippet that both retrievers ranked second can beat one that contains every
+term of the question. `rerank` re-scores the fused list against the question
+itself:
+
+* coverage: the share of the question's BM25 terms found in the snippet;
+* dose match: a bonus when every number in the question ("81", "500") is
+  in the snippet, since a wrong strength is the costliest mistake;
+* prior: the fused rank, so fusion still breaks ties.
+
+It costs one `tokenize` per snippet, microseconds for the handful of snippets
+that reach the prompt, and needs no model. Enable it with ``RAG_RERANK=1``.
+"""
+
+import os
+from collections.abc import Sequence
+from typing import List
+
+from .bm25 import tokenize
+
+__all__ = ["RAG_RERANK", "rerank"]
+
+RAG_RERANK = os.getenv("RAG_RERANK", "0") != "0"
+
+_DOSE_BONUS = 0.5
+
+
+def rerank(question: str, hits: Sequence[tuple[str, str]]) -> List[tuple[str, str]]:
+    """Return *hits* (``(doc_id, text)`` pairs) reordered for *question*."""
+
+    terms = set(tokenize(question))
+    if not terms or len(hits) < 2:
+        return list(hits)
+    numbers = {t for t in terms if t[0].isdigit()}
+
+    def score(rank: int, text: str) -> float:
+        doc_terms = set(tokenize(text))
+        coverage = len(terms & doc_terms) / len(terms)
+        dose = _DOSE_BONUS if numbers and numbers <= doc_terms else 0.0
+        return coverage + dose + 1.0 / (rank + 2)
+
+    scored = [(score(rank, text), rank) for rank, (_, text) in enumerate(hits)]
+    scored.sort(key=lambda pair: (-pair[0], pair[1]))
+    return [hits[rank] for _, rank in scored]
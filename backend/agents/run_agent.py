@@ -6,7 +6,8 @@ Run with:
 
 Environment variables:
     OPENAI_API_KEY / ANTHROPIC_API_KEY etc.  - your model provider credentials.
-    AGENT_MODEL                              - override default model.
+    AGENT_MODEL                              - override default model
+                                               ("fake" runs offline, see agents.fake_llm).
 """
 
 from __future__ import annotations
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+"""In-process single-flight coalescing for streamed work.
+
+Concurrent callers asking for the same key share one producer: the first
+caller (the leader) starts it, later callers (followers) attach to the same
+flight and receive every item it yields, including the ones produced before
+they joined. The producer runs in its own task, so it keeps going if the
+leader goes away while followers are still listening; it is cancelled once
+the last subscriber leaves.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+from . import metrics
+
+__all__ = ["SingleFlight", "Subscription"]
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Flight(Generic[T]):
+    def __init__(self) -> None:
+        self.items: list[T] = []
+        self.error: BaseException | None = None
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: asyncio.Task[None] | None = None
+
+    def publish(self, item: Any) -> None:  # noqa: ANN401
+        if item is _DONE:
+            self.done = True
+        else:
+            self.items.append(item)
+        # Wake every waiter, then arm the event again for the next item.
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class Subscription(Generic[T]):
+    """Async iterator over a flight's items; `leader` is True for the starter."""
+
+    def __init__(self, owner: SingleFlight[T], key: Hashable, flight: _Flight[T], leader: bool) -> None:
+        self._owner = owner
+        self._key = key
+        self._flight = flight
+        self.leader = leader
+
+    async def __aiter__(self) -> AsyncIterator[T]:
+        flight = self._flight
+        flight.subscribers += 1
+        pos = 0
+        try:
+            while True:
+                while pos < len(flight.items):
+                    yield flight.items[pos]
+                    pos += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                flight.task.cancel()
+                self._owner._forget(self._key, flight)
+
+
+class SingleFlight(Generic[T]):
+    """Share one in-flight async producer between callers with the same key."""
+
+    def __init__(self, name: str | None = None) -> None:
+        self._flights: dict[Hashable, _Flight[T]] = {}
+        self.leaders = 0
+        self.followers = 0
+        if name:
+            metrics.register(name, self.stats)
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_rate": round(self.followers / total, 4) if total else 0.0,
+        }
+
+    def _forget(self, key: Hashable, flight: _Flight[T]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def join(self, key: Hashable, factory: Callable[[], AsyncIterator[T]]) -> Subscription[T]:
+        """Subscribe to the flight for *key*, starting `factory()` if none is running."""
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.followers += 1
+            return Subscription(self, key, flight, leader=False)
+
+        flight = _Flight()
+        self._flights[key] = flight
+        self.leaders += 1
+
+        async def produce() -> None:
+            try:
+                async for item in factory():
+                    flight.publish(item)
+            except asyncio.CancelledError:
+                flight.error = asyncio.CancelledError()
+                raise
+            except Exception as exc:  # surfaced to every subscriber
+                flight.error = exc
+            finally:
+                # Late arrivals must start a fresh flight from here on.
+                self._forget(key, flight)
+                flight.publish(_DONE)
+
+        flight.task = asyncio.create_task(produce())
+        return Subscription(self, key, flight, leader=True)
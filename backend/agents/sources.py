@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+"""Parallel retrieval across several context sources.
+
+The RAG path used to consult only the drug index. It can now consult several
+sources, for example:
+
+* ``drug_index`` – the medication index behind `retrieve_med_hits` (always on);
+* ``drug_lexical`` – BM25 over the same snippets (`retrieve_lexical_hits`,
+  on unless ``RAG_HYBRID=0``). It matches exact names and dose strings
+  ("81 mg") that the embedding blurs;
+* ``patient_meds`` – the current user's patients named in the question and
+  their assigned medications, read from Postgres (registered by the API, see
+  ``app.main``);
+* ``mcp_patients`` – the current user's patients on the MCP patient server
+  (`mcp_patient_source`);
+* ``labels`` – drug label chunks written by ``python -m agents.ingest``
+  (`label_source`, on by default when ``RAG_LABEL_DIR`` is set).
+
+`gather_hits` queries every registered source at the same time, so retrieval
+takes as long as the slowest source rather than the sum of all of them. Each
+source has its own timeout. A source that times out or fails contributes
+nothing, and the answer is built from whatever the others found.
+
+The per-source rankings are merged by weighted reciprocal rank (`merge_hits`).
+Duplicates, by document id or by identical text, are dropped, so the best
+documents from every source sit at the front of the context budget. With
+``RAG_RERANK=1`` the merged list is then reordered by `agents.rerank`.
+
+Every source call is traced as ``source:<name>`` in the node metrics, and
+the merge and rerank steps as ``fusion`` and ``rerank``, so the cost of
+fusion is visible next to the searches. Timeouts and errors per source are
+exported under the "sources" key.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any, List
+
+from . import metrics
+from .rag_utils import RAG_MIN_SCORE, RAG_TOP_K, retrieve_lexical_hits, retrieve_med_hits
+from .rerank import RAG_RERANK, rerank
+from .tracing import tracer
+
+__all__ = [
+    "RAG_SOURCE_TIMEOUT",
+    "RAG_LABEL_DIR",
+    "RAG_HYBRID",
+    "RAG_MCP_PATIENT_LIMIT",
+    "current_user_id",
+    "Hit",
+    "Source",
+    "drug_index_source",
+    "drug_lexical_source",
+    "mcp_patient_source",
+    "label_source",
+    "get_sources",
+    "register_source",
+    "unregister_source",
+    "reset_sources",
+    "merge_hits",
+    "gather_hits",
+    "retrieve_hits",
+]
+
+logger = logging.getLogger(__name__)
+
+# Default time budget of a single source, in seconds.
+RAG_SOURCE_TIMEOUT = float(os.getenv("RAG_SOURCE_TIMEOUT", "2.0"))
+
+# Store written by ``python -m agents.ingest --out``; unset disables labels.
+RAG_LABEL_DIR = os.getenv("RAG_LABEL_DIR")
+
+# Query BM25 alongside the embeddings by default.
+RAG_HYBRID = os.getenv("RAG_HYBRID", "1") != "0"
+
+# Page size of one `mcp_patient_source` lookup.
+RAG_MCP_PATIENT_LIMIT = int(os.getenv("RAG_MCP_PATIENT_LIMIT", "50"))
+
+# Id of the user the current question is asked for, set by the chat route.
+# Sources holding per-user records (the MCP patient server) only search that
+# user's records, and nothing without one.
+current_user_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "current_user_id", default=None
+)
+
+# ``(doc_id, text)``, best first: the shape `retrieve_med_hits` returns.
+Hit = tuple[str, str]
+
+# Reciprocal-rank damping constant (the usual value from the RRF paper).
+_RRF_K = 60
+
+
+class Source:
+    """A named retrieval backend with its own time budget.
+
+    *fetch* takes the question and returns ranked hits. It may be a plain
+    function (run in a worker thread) or a coroutine function. *weight*
+    scales the source's contribution when rankings are merged.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[str], List[Hit] | Awaitable[List[Hit]]],
+        timeout: float = RAG_SOURCE_TIMEOUT,
+        weight: float = 1.0,
+    ) -> None:
+        self.name = name
+        self.fetch = fetch
+        self.timeout = timeout
+        self.weight = weight
+        self._async = inspect.iscoroutinefunction(fetch)
+
+    def __repr__(self) -> str:
+        return f"Source({self.name!r}, timeout={self.timeout}, weight={self.weight})"
+
+    async def search(self, question: str) -> List[Hit]:
+        if self._async:
+            return list(await self.fetch(question))  # type: ignore[misc]
+        return list(await asyncio.to_thread(self.fetch, question))
+
+
+# ---------------------------------------------------------------------------
+# Built-in sources
+# ---------------------------------------------------------------------------
+
+def drug_index_source(timeout: float = RAG_SOURCE_TIMEOUT) -> Source:
+    """The active drug retriever (`rag_utils.get_retriever`)."""
+
+    return Source("drug_index", retrieve_med_hits, timeout=timeout)
+
+
+def drug_lexical_source(timeout: float = RAG_SOURCE_TIMEOUT) -> Source:
+    """BM25 over the active retriever's snippets (`retrieve_lexical_hits`)."""
+
+    return Source("drug_lexical", retrieve_lexical_hits, timeout=timeout)
+
+
+def _patient_names_in(question: str, patients: Iterable[dict[str, Any]]) -> List[dict[str, Any]]:
+    words = set(re.findall(r"[a-z][a-z'-]+", question.lower()))
+    return [
+        p
+        for p in patients
+        if words.intersection(str(p.get("name", "")).lower().split())
+    ]
+
+
+def mcp_patient_source(
+    url: str,
+    timeout: float = RAG_SOURCE_TIMEOUT,
+    tool: str = "list_patients",
+    limit: int = RAG_MCP_PATIENT_LIMIT,
+) -> Source:
+    """Patients named in the question, looked up on the MCP patient server.
+
+    *url* is the server's streamable-HTTP endpoint, e.g.
+    ``http://localhost:8001/mcp``. Requires the ``fastmcp`` package. Only
+    the first *limit* patients of the current user (`current_user_id`) are
+    fetched; without a user the server is not called.
+    """
+
+    async def fetch(question: str) -> List[Hit]:
+        owner_id = current_user_id.get()
+        if owner_id is None:
+            return []
+        from fastmcp import Client
+
+        async with Client(url) as client:
+            result = await client.call_tool(tool, {"owner_id": owner_id, "limit": limit})
+        patients: list[dict[str, Any]] = []
+        for block in result:
+            data = json.loads(getattr(block, "text", "") or "null")
+            patients.extend(data if isinstance(data, list) else [data] if data else [])
+        return [
+            (
+                f"mcp-patient:{p.get('id')}",
+                f"{p.get('name')} is a registered patient (patient service id {p.get('id')}).",
+            )
+            for p in _patient_names_in(question, patients)
+        ]
+
+    return Source("mcp_patients", fetch, timeout=timeout)
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+def label_source(directory: str, timeout: float = RAG_SOURCE_TIMEOUT) -> Source:
+    """Chunks of ingested drug labels stored under *directory*.
+
+    The store is loaded on the first search, so startup does not pay for it.
+    Large stores are searched approximately (`agents.ann.IVFIndex`).
+    """
+
+    index = None
+    lock = threading.Lock()
+
+    def fetch(question: str) -> List[Hit]:
+        nonlocal index
+        with lock:
+            if index is None:
+                from .ann import IVFIndex
+                from .ingest import load_index
+
+                # Exact search until the store reaches RAG_IVF_MIN_ROWS chunks.
+                index = load_index(directory, IVFIndex())
+                index.optimize()  # searches below run concurrently, unlocked
+        hits = index.search(question, k=RAG_TOP_K, threshold=RAG_MIN_SCORE)
+        return [(doc_id, index.get(doc_id) or "") for doc_id, _ in hits]
+
+    return Source("labels", fetch, timeout=timeout)
+
+
+def _default_sources() -> list[Source]:
+    sources = [drug_index_source()]
+    if RAG_HYBRID:
+        sources.append(drug_lexical_source())
+    if RAG_LABEL_DIR:
+        sources.append(label_source(RAG_LABEL_DIR))
+    return sources
+
+
+_sources: list[Source] = _default_sources()
+_failures: dict[str, Counter[str]] = {}
+_lock = threading.Lock()
+
+
+def get_sources() -> list[Source]:
+    with _lock:
+        return list(_sources)
+
+
+def register_source(source: Source) -> None:
+    """Add *source*, replacing any registered source with the same name."""
+
+    with _lock:
+        _sources[:] = [s for s in _sources if s.name != source.name] + [source]
+
+
+def unregister_source(name: str) -> None:
+    with _lock:
+        _sources[:] = [s for s in _sources if s.name != name]
+
+
+def reset_sources() -> None:
+    """Go back to the default sources (drug index, BM25 and labels, as configured)."""
+
+    with _lock:
+        _sources[:] = _default_sources()
+        _failures.clear()
+
+
+def _count(name: str, outcome: str) -> None:
+    with _lock:
+        _failures.setdefault(name, Counter())[outcome] += 1
+
+
+def _stats() -> dict[str, Any]:
+    with _lock:
+        return {
+            "sources": [s.name for s in _sources],
+            "failures": {name: dict(c) for name, c in sorted(_failures.items())},
+        }
+
+
+metrics.register("sources", _stats)
+
+# ---------------------------------------------------------------------------
+# Fan-out and merge
+# ---------------------------------------------------------------------------
+
+def merge_hits(results: Iterable[tuple[Source, List[Hit]]]) -> List[Hit]:
+    """Combine per-source rankings into one deduplicated ranking.
+
+    A document scores ``weight / (60 + rank)`` for every source that
+    returned it. Documents with the same id or the same text are counted
+    once. Ties keep source registration order.
+    """
+
+    scores: dict[str, float] = {}
+    texts: dict[str, str] = {}
+    same_text: dict[str, str] = {}
+    for source, hits in results:
+        for rank, (doc_id, text) in enumerate(hits):
+            doc_id = same_text.setdefault(" ".join(text.lower().split()), doc_id)
+            texts.setdefault(doc_id, text)
+            scores[doc_id] = scores.get(doc_id, 0.0) + source.weight / (_RRF_K + rank)
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    return [(doc_id, texts[doc_id]) for doc_id in ranked]
+
+
+async def _search(source: Source, question: str) -> List[Hit]:
+    start = time.perf_counter()
+    try:
+        hits = await asyncio.wait_for(source.search(question), source.timeout)
+    except asyncio.TimeoutError:
+        outcome = "timeouts"
+    except Exception:
+        logger.exception("retrieval source %r failed", source.name)
+        outcome = "errors"
+    else:
+        tracer.record(f"source:{source.name}", (time.perf_counter() - start) * 1000, docs=len(hits))
+        return hits
+    _count(source.name, outcome)
+    tracer.record(f"source:{source.name}", (time.perf_counter() - start) * 1000, error=True)
+    return []
+
+
+async def gather_hits(
+    question: str,
+    sources: Iterable[Source] | None = None,
+    reorder: bool | None = None,
+) -> List[Hit]:
+    """Query all *sources* (default: the registered ones) concurrently and merge.
+
+    *reorder* applies `rerank` to the merged list (default: ``RAG_RERANK``).
+    """
+
+    sources = get_sources() if sources is None else list(sources)
+    results = await asyncio.gather(*(_search(s, question) for s in sources))
+    start = time.perf_counter()
+    hits = merge_hits(zip(sources, results))
+    tracer.record("fusion", (time.perf_counter() - start) * 1000, docs=len(hits))
+    if RAG_RERANK if reorder is None else reorder:
+        start = time.perf_counter()
+        hits = rerank(question, hits)
+        tracer.record("rerank", (time.perf_counter() - start) * 1000, docs=len(hits))
+    return hits
+
+
+def retrieve_hits(
+    question: str,
+    sources: Iterable[Source] | None = None,
+    reorder: bool | None = None,
+) -> List[Hit]:
+    """Blocking `gather_hits` for the synchronous graph path (CLI, tests)."""
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(gather_hits(question, sources, reorder))
+    # Called from a thread that already runs a loop: use a fresh thread.
+    box: list[List[Hit]] = []
+    context = contextvars.copy_context()  # keeps `current_user_id`
+    worker = threading.Thread(
+        target=lambda: box.append(context.run(asyncio.run, gather_hits(question, sources, reorder)))
+    )
+    worker.start()
+    worker.join()
+    return box[0] if box else []
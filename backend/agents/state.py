@@ -3,7 +3,20 @@ from typing_extensions import TypedDict
 
 from langgraph.graph.message import add_messages
 
-__all__ = ["State"]
+__all__ = ["ANSWER_NODES", "State", "add_usage"]
+
+# Graph nodes whose model output is the user-visible answer. Anything else
+# that shows up on the "messages" stream (e.g. the echoed user input) is not.
+ANSWER_NODES = frozenset({"chatbot", "rag_answer", "fast_answer"})
+
+
+def add_usage(left: dict[str, int] | None, right: dict[str, int] | None) -> dict[str, int]:
+    """Reducer summing token counts, so `usage` accumulates over the thread."""
+
+    total = dict(left or {})
+    for key, value in (right or {}).items():
+        total[key] = total.get(key, 0) + value
+    return total
 
 
 class State(TypedDict):
@@ -19,4 +32,13 @@ class State(TypedDict):
     # Optional field that stores retrieved context when the router directs
     # the conversation through the RAG pipeline. Nodes that don't rely on
     # retrieval simply ignore it.
-    context: str | None 
+    context: str | None
+    # Token count of `context` as measured by `agents.context.count_tokens`;
+    # bounded by the RAG_CONTEXT_TOKENS budget.
+    context_tokens: int | None
+    # Ids of the documents packed into `context`, used to invalidate cached
+    # answers when one of them changes.
+    context_doc_ids: list[str] | None
+    # Model token usage (prompt_tokens / completion_tokens), added to by each
+    # node that calls the model; see `agents.tracing`.
+    usage: Annotated[dict[str, int] | None, add_usage]
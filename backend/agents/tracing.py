@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+"""Per-node timing and usage instrumentation for the agent graph.
+
+`tracer.wrap` turns a node function into a runnable that records, per call:
+
+* wall time of the node;
+* prompt/completion tokens of any model reply it returns. The provider's
+  `usage_metadata` is used when present; otherwise the counts are estimated
+  with `count_tokens`, the prompt from the messages the node actually sent
+  (reported by the model call through `Tracer.note_prompt`, e.g. after
+  `trim_history`). Cached and fast-path answers count as zero;
+* how many documents it retrieved (``context_doc_ids``).
+
+The token counts are also written to the state's `usage` key, so callers
+streaming ``updates`` can total them per request. The /chat route uses that
+for the finish chunk.
+
+Aggregates (calls, errors, p50/p95 wall time, tokens, documents) are exported
+under the "nodes" metrics key, together with routing decisions and time
+spent inside model calls ("model"). Every call is also logged as one JSON
+line on the ``agents.trace`` logger.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Sequence
+from contextvars import ContextVar
+from typing import Any
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from . import metrics
+from .context import count_tokens
+from .rag_utils import extract_text
+
+__all__ = ["NodeStats", "Tracer", "tracer"]
+
+logger = logging.getLogger("agents.trace")
+
+# Prompts sent to the model by the node running in this context, in call
+# order; see `Tracer.note_prompt`.
+_prompts: ContextVar[list[Sequence[Any]] | None] = ContextVar("prompts", default=None)
+
+
+class NodeStats:
+    """Running totals plus a window of recent wall times for one node."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.docs = 0
+        self._recent: deque[float] = deque(maxlen=window)
+
+    def add(
+        self,
+        ms: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        docs: int = 0,
+        error: bool = False,
+    ) -> None:
+        self.calls += 1
+        self.errors += error
+        self.total_ms += ms
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.docs += docs
+        self._recent.append(ms)
+
+    def as_dict(self) -> dict[str, Any]:
+        recent = sorted(self._recent)
+
+        def pct(p: float) -> float | None:
+            value = metrics.percentile(recent, p)
+            return None if value is None else round(value, 3)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "docs": self.docs,
+        }
+
+
+def _thread_id(config: RunnableConfig | None) -> str | None:
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+
+def _usage(
+    state: dict[str, Any], update: dict[str, Any], sent: list[Sequence[Any]]
+) -> dict[str, int]:
+    """Token usage of the model replies in a node's *update*.
+
+    *sent* holds the prompts the node noted, one per model call.
+    """
+
+    prompt = completion = 0
+    for message in update.get("messages") or ():
+        if not isinstance(message, AIMessage):
+            continue
+        meta = message.response_metadata
+        if meta.get("answer_cache") == "hit" or meta.get("fast_path") == "hit":
+            continue
+        usage = message.usage_metadata
+        if usage:
+            prompt += usage.get("input_tokens", 0)
+            completion += usage.get("output_tokens", 0)
+        else:
+            # Provider did not report usage: estimate from what the node sent,
+            # or from everything it could have sent if it did not say.
+            if sent:
+                seen = [extract_text(m) for m in sent.pop(0)]
+            else:
+                seen = [extract_text(m) for m in state.get("messages") or ()]
+                seen.append(state.get("context") or "")
+            prompt += sum(count_tokens(text) for text in seen)
+            completion += count_tokens(extract_text(message))
+    return {"prompt_tokens": prompt, "completion_tokens": completion} if completion else {}
+
+
+class Tracer:
+    """Collects `NodeStats` per node and logs one structured line per call."""
+
+    def __init__(self) -> None:
+        self._nodes: dict[str, NodeStats] = {}
+        self._routes: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        node: str,
+        ms: float,
+        *,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        docs: int | None = None,
+        error: bool = False,
+        thread_id: str | None = None,
+    ) -> None:
+        with self._lock:
+            stats = self._nodes.setdefault(node, NodeStats())
+            stats.add(ms, prompt_tokens, completion_tokens, docs or 0, error)
+        event: dict[str, Any] = {"event": "graph_node", "node": node, "ms": round(ms, 3)}
+        if prompt_tokens or completion_tokens:
+            event["prompt_tokens"] = prompt_tokens
+            event["completion_tokens"] = completion_tokens
+        if docs is not None:
+            event["docs"] = docs
+        if error:
+            event["error"] = True
+        if thread_id:
+            event["thread_id"] = thread_id
+        logger.info(json.dumps(event))
+
+    def route(self, branch: str) -> None:
+        with self._lock:
+            self._routes[branch] += 1
+        logger.info(json.dumps({"event": "graph_route", "branch": branch}))
+
+    def _finish(
+        self,
+        node: str,
+        start: float,
+        state: dict[str, Any],
+        update: Any,
+        config: RunnableConfig | None,
+        sent: list[Sequence[Any]],
+    ) -> Any:
+        ms = (time.perf_counter() - start) * 1000
+        if not isinstance(update, dict):
+            self.record(node, ms, thread_id=_thread_id(config))
+            return update
+        usage = _usage(state, update, sent)
+        doc_ids = update.get("context_doc_ids")
+        self.record(
+            node,
+            ms,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            docs=None if doc_ids is None else len(doc_ids),
+            thread_id=_thread_id(config),
+        )
+        return {**update, "usage": usage} if usage else update
+
+    def wrap(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        afunc: Callable[[Any], Any] | None = None,
+    ) -> RunnableLambda:
+        """Return a runnable for node *name* that times *func* / *afunc*."""
+
+        def run(state: dict[str, Any], config: RunnableConfig) -> Any:
+            start = time.perf_counter()
+            sent: list[Sequence[Any]] = []
+            token = _prompts.set(sent)
+            try:
+                update = func(state)
+            except BaseException:
+                self.record(name, (time.perf_counter() - start) * 1000, error=True)
+                raise
+            finally:
+                _prompts.reset(token)
+            return self._finish(name, start, state, update, config, sent)
+
+        async def arun(state: dict[str, Any], config: RunnableConfig) -> Any:
+            start = time.perf_counter()
+            sent: list[Sequence[Any]] = []
+            token = _prompts.set(sent)
+            try:
+                update = await afunc(state)  # type: ignore[misc]
+            except BaseException:
+                self.record(name, (time.perf_counter() - start) * 1000, error=True)
+                raise
+            finally:
+                _prompts.reset(token)
+            return self._finish(name, start, state, update, config, sent)
+
+        return RunnableLambda(run, afunc=arun if afunc is not None else None, name=name)
+
+    def note_prompt(self, messages: Sequence[Any]) -> None:
+        """Record *messages* as a prompt the running node sends to the model.
+
+        Usage estimates count these instead of the node's whole state.
+        Outside a wrapped node this does nothing.
+        """
+
+        sent = _prompts.get()
+        if sent is not None:
+            sent.append(messages)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            nodes = {name: s.as_dict() for name, s in sorted(self._nodes.items())}
+            return {"nodes": nodes, "routes": dict(self._routes)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._nodes.clear()
+            self._routes.clear()
+
+
+tracer = Tracer()
+metrics.register("nodes", tracer.stats)
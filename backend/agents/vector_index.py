@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+"""Dense vector retrieval for the medication RAG path.
+
+Documents are embedded once and kept as rows of a single L2-normalised NumPy
+matrix, so a query costs one matrix-vector product plus a partial sort no
+matter how the corpus grows. The embedding function is pluggable; the default
+`hash_embed` is a deterministic, dependency-free bag of hashed words and
+character trigrams that is good enough for drug-name lookups and makes tests
+reproducible. Swap in a real model via `VectorIndex(embed=...)`.
+"""
+
+import re
+import zlib
+from collections.abc import Callable, Iterable, Sequence
+
+import numpy as np
+
+__all__ = [
+    "EmbedFn",
+    "DEFAULT_DIM",
+    "STOPWORDS",
+    "hash_embed",
+    "normalize_rows",
+    "top_k",
+    "VectorIndex",
+]
+
+EmbedFn = Callable[[Sequence[str]], np.ndarray]
+
+DEFAULT_DIM = 512
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Function words carry no retrieval signal but dominate short questions.
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on "
+    "or per should than that the this to was what when which who why with you".split()
+)
+
+# ---------------------------------------------------------------------------
+# Embedding helpers
+# ---------------------------------------------------------------------------
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return *matrix* with each row scaled to unit length (zero rows stay zero)."""
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _features(text: str) -> Iterable[tuple[str, float]]:
+    for word in _TOKEN_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        yield word, 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield padded[i : i + 3], 0.5
+
+
+def hash_embed(texts: Sequence[str], dim: int = DEFAULT_DIM) -> np.ndarray:
+    """Deterministic local embedding: hashed word + trigram counts, normalised.
+
+    Uses CRC32 rather than `hash()` so vectors are stable across processes
+    (Python salts string hashes per interpreter run).
+    """
+
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature, weight in _features(text):
+            h = zlib.crc32(feature.encode())
+            # Use a spare hash bit as the sign to reduce collision bias.
+            out[row, h % dim] += weight if h & 0x80000000 else -weight
+    return normalize_rows(out)
+
+
+def top_k(
+    scores: np.ndarray, k: int, threshold: float | None = None
+) -> list[list[tuple[int, float]]]:
+    """Return the best ``k`` ``(column, score)`` pairs for each row of *scores*.
+
+    Uses ``argpartition`` so the cost is linear in the number of columns
+    rather than a full sort.
+    """
+
+    n_rows, n_cols = scores.shape
+    if n_cols == 0 or k <= 0:
+        return [[] for _ in range(n_rows)]
+    k = min(k, n_cols)
+    if k < n_cols:
+        cand = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        cand = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    cand_scores = np.take_along_axis(scores, cand, axis=1)
+    order = np.argsort(-cand_scores, axis=1, kind="stable")
+    cand = np.take_along_axis(cand, order, axis=1)
+    cand_scores = np.take_along_axis(cand_scores, order, axis=1)
+
+    results: list[list[tuple[int, float]]] = []
+    for idx_row, score_row in zip(cand, cand_scores):
+        hits = [
+            (int(i), float(s))
+            for i, s in zip(idx_row, score_row)
+            if threshold is None or s >= threshold
+        ]
+        results.append(hits)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+
+class VectorIndex:
+    """Cosine-similarity index over a normalised embedding matrix.
+
+    Rows are addressed by string ids so callers can upsert or drop individual
+    documents without rebuilding the whole matrix.
+    """
+
+    def __init__(self, embed: EmbedFn = hash_embed, dim: int = DEFAULT_DIM) -> None:
+        self.embed = embed
+        self.dim = dim
+        self._ids: list[str] = []
+        self._docs: list[str] = []
+        self._pos: dict[str, int] = {}
+        # Over-allocated row buffer; only the first len(self) rows are live.
+        self._buf = np.zeros((16, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._pos
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._buf[: len(self._ids)]
+
+    def _reserve(self, n_rows: int) -> None:
+        if n_rows <= self._buf.shape[0]:
+            return
+        capacity = max(n_rows, 2 * self._buf.shape[0])
+        buf = np.zeros((capacity, self.dim), dtype=np.float32)
+        buf[: len(self._ids)] = self.matrix
+        self._buf = buf
+
+    @property
+    def ids(self) -> list[str]:
+        return list(self._ids)
+
+    def get(self, doc_id: str) -> str | None:
+        pos = self._pos.get(doc_id)
+        return None if pos is None else self._docs[pos]
+
+    # -- mutation ----------------------------------------------------------
+
+    def add(self, items: Iterable[tuple[str, str]]) -> None:
+        """Insert or replace ``(doc_id, text)`` pairs, embedding them in one batch."""
+
+        pending = dict(items)
+        if not pending:
+            return
+        self.add_embedded(pending.items(), np.asarray(self.embed(list(pending.values()))))
+
+    def add_embedded(self, items: Iterable[tuple[str, str]], vectors: np.ndarray) -> None:
+        """Insert ``(doc_id, text)`` pairs whose embeddings are already known.
+
+        Row ``i`` of *vectors* belongs to the ``i``-th item; used to load
+        documents embedded ahead of time (see `agents.ingest`).
+        """
+
+        pending = dict(items)
+        if not pending:
+            return
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if len(pending) != len(vectors):
+            raise ValueError(f"{len(pending)} documents but {len(vectors)} vectors")
+        self._reserve(len(self._ids) + len(pending))
+        for (doc_id, text), vec in zip(pending.items(), vectors):
+            pos = self._pos.get(doc_id)
+            if pos is None:
+                pos = self._pos[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+                self._docs.append(text)
+            else:
+                self._docs[pos] = text
+            self._buf[pos] = vec
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        """Drop documents by id; unknown ids are ignored."""
+
+        for doc_id in doc_ids:
+            pos = self._pos.pop(doc_id, None)
+            if pos is None:
+                continue
+            # Swap the last row into the hole so removal stays O(dim).
+            last = len(self._ids) - 1
+            if pos != last:
+                last_id = self._ids[last]
+                self._ids[pos] = last_id
+                self._docs[pos] = self._docs[last]
+                self._buf[pos] = self._buf[last]
+                self._pos[last_id] = pos
+            self._ids.pop()
+            self._docs.pop()
+
+    # -- search ------------------------------------------------------------
+
+    def search_batch(
+        self, queries: Sequence[str], k: int = 3, threshold: float | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Return the top-``k`` ``(doc_id, score)`` hits for every query."""
+
+        if not queries:
+            return []
+        q = normalize_rows(np.asarray(self.embed(list(queries))))
+        scores = q @ self.matrix.T
+        return [
+            [(self._ids[i], s) for i, s in hits]
+            for hits in top_k(scores, k, threshold)
+        ]
+
+    def search(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> list[tuple[str, float]]:
+        return self.search_batch([query], k, threshold)[0]
+
+    def retrieve(
+        self, query: str, k: int = 3, threshold: float | None = None
+    ) -> list[str]:
+        """Return the text of the best matching documents for *query*."""
+
+        return [self._docs[self._pos[i]] for i, _ in self.search(query, k, threshold)]
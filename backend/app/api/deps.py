@@ -16,6 +16,9 @@ from app.models import TokenPayload, User
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
+optional_oauth2 = OAuth2PasswordBearer(
+    tokenUrl=f"{settings.API_V1_STR}/login/access-token", auto_error=False
+)
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -49,6 +52,18 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
+def get_optional_user(
+    session: SessionDep,
+    token: Annotated[str | None, Depends(optional_oauth2)],
+) -> User | None:
+    if not token:
+        return None
+    return get_current_user(session, token)
+
+
+OptionalUser = Annotated[User | None, Depends(get_optional_user)]
+
+
 def get_current_active_superuser(current_user: CurrentUser) -> User:
     if not current_user.is_superuser:
         raise HTTPException(
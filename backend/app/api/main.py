@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import patients, medications, login, private, users, utils, agent
+from app.api.routes import patients, medications, login, private, users, utils
 from app.core.config import settings
 
 api_router = APIRouter()
@@ -9,7 +9,11 @@ api_router.include_router(users.router)
 api_router.include_router(utils.router)
 api_router.include_router(patients.router)
 api_router.include_router(medications.router)
-api_router.include_router(agent.router)
+
+if settings.AGENT_ENABLED:
+    from app.api.routes import agent
+
+    api_router.include_router(agent.router)
 
 
 if settings.ENVIRONMENT == "local":
@@ -1,49 +1,242 @@
-from fastapi import APIRouter, Request
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
-import json
-import asyncio
+import hashlib
+import logging
+import math
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
 
-from agents.graph import graph
+from agents import metrics
+from agents.datastream import DataStreamWriter, error_frame, finish_frame
+from agents.llm import ProviderBusy, get_limiter
+from agents.rag_utils import extract_text
+from agents.singleflight import SingleFlight
+from agents.sources import current_user_id
+from agents.state import ANSWER_NODES
+from app.api.deps import OptionalUser, get_current_active_superuser
+from app.core.config import settings
 
 router = APIRouter(prefix="/chat", tags=["chat"])
+logger = logging.getLogger(__name__)
+
+# Identical questions asked concurrently against identical history share one
+# graph run (and one LLM call); see `_flight_key`.
+inflight: SingleFlight[str | dict[str, int]] = SingleFlight("singleflight")
+
+# How often the route polls for a client disconnect while waiting on the graph.
+DISCONNECT_POLL_SECONDS = 0.1
+
+_disconnects = 0
+metrics.register("chat", lambda: {"disconnects": _disconnects})
+
+
+def _chunk_text(message: AIMessage) -> str:
+    """Return the text carried by a streamed message chunk."""
+
+    content = message.content
+    if isinstance(content, str):
+        return content
+    # Some providers (e.g. Anthropic) stream a list of content blocks.
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+    )
+
+
+async def _answer_tokens(graph: Any, inputs: dict[str, Any], config: dict[str, Any]):
+    """Yield the answer text chunks produced by one graph run, then a final
+    dict with the run's token usage."""
+
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    # Per-user retrieval sources read the user from here; the graph's tasks
+    # copy it when they are created.
+    current_user_id.set(config["configurable"].get("user_id"))
+    # stream_mode="messages" surfaces LLM tokens as the model produces them,
+    # so the first chunk reaches the client after the model's own TTFT;
+    # "updates" carries each node's output, including its token usage.
+    # checkpoint_during=False saves the thread once, after the run, so no
+    # checkpoint write sits between two streamed tokens.
+    async for mode, payload in graph.astream(
+        inputs, config, stream_mode=["messages", "updates"], checkpoint_during=False
+    ):
+        if mode == "updates":
+            for update in payload.values():
+                for key, value in ((update or {}).get("usage") or {}).items():
+                    usage[key] = usage.get(key, 0) + value
+            continue
+        message, metadata = payload
+        if not isinstance(message, AIMessage):
+            continue
+        if metadata.get("langgraph_node") not in ANSWER_NODES:
+            continue
+        text = _chunk_text(message)
+        if text:
+            yield text
+    yield usage
+
+
+async def _flight_key(graph: Any, config: dict[str, Any], question: str) -> tuple[str, str]:
+    """Coalescing key: the question with case and whitespace folded, plus a
+    digest of the user and the thread's history, so two requests only share
+    an answer if they ask the same thing in the same conversation with the
+    same patient records. The answer cache's looser key is not used here:
+    a near miss there costs a model call, here it would checkpoint another
+    question's answer in the follower's thread."""
+
+    snapshot = await graph.aget_state(config)
+    history = snapshot.values.get("messages", []) if snapshot.values else []
+    digest = hashlib.sha256()
+    digest.update(str(config["configurable"].get("user_id")).encode())
+    digest.update(b"\0")
+    for message in history:
+        digest.update(message.type.encode())
+        digest.update(b"\0")
+        digest.update(extract_text(message).encode())
+        digest.update(b"\0")
+    return " ".join(question.lower().split()), digest.hexdigest()
 
 
 @router.post("/")
-async def chat_endpoint(request: Request):
-    """Stream the assistant reply in the DataStream format expected by assistant-ui."""
+async def chat_endpoint(request: Request, user: OptionalUser):
+    """Stream the assistant reply in the DataStream format expected by assistant-ui.
+
+    Conversation history lives server-side in the graph's checkpointer, keyed
+    by the caller and a thread id taken from the `threadId` body field or
+    `x-thread-id` header, so a thread id only ever continues the caller's own
+    conversation. Without one a new thread is started; its id is returned in
+    the `x-thread-id` response header so the client can continue it. An
+    anonymous request without a thread id is answered without keeping any
+    history, since nobody can tell it apart from a stranger's later on.
+
+    Concurrent requests asking the same question over the same history are
+    coalesced: one graph run serves all of them and every client receives
+    its streamed tokens.
+
+    A bearer token is optional. With one, retrieval can also search the
+    user's own records (see `agents.sources.current_user_id`).
+
+    When the model provider is at capacity the request is refused with 429
+    and a `Retry-After` header rather than queued indefinitely. If the client
+    goes away mid-answer the graph run and its model call are cancelled.
+    """
+
+    try:
+        get_limiter().check()
+    except ProviderBusy as exc:
+        raise HTTPException(
+            status_code=429,
+            detail=str(exc),
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        )
 
     data = await request.json()
 
-    # Extract the newest user message from the array sent by assistant-ui
+    requested_thread = data.get("threadId") or request.headers.get("x-thread-id")
+    thread_id = str(requested_thread or uuid.uuid4())
+    user_id = str(user.id) if user else None
+    one_shot = user is None and not requested_thread
+    config = {
+        "configurable": {
+            "thread_id": f"{user_id or 'anonymous'}:{thread_id}",
+            "user_id": user_id,
+        }
+    }
+    graph = request.app.state.chat_graph
+
+    # Only the newest user message is sent to the graph; earlier turns are
+    # restored from the checkpoint.
     messages = data.get("messages", [])
     user_message = next(
         (m for m in reversed(messages) if m.get("role") == "user"),
         {"content": ""},
     )
+    question = user_message.get("content", "")
+    inputs = {"messages": [{"role": "user", "content": question}]}
+
+    async def answer_tokens():
+        try:
+            async for item in thread_tokens():
+                yield item
+        finally:
+            if one_shot:
+                await graph.checkpointer.adelete_thread(
+                    config["configurable"]["thread_id"]
+                )
 
-    # 1. Run the LangGraph agent to get the final assistant message (blocking call)
-    result = graph.invoke({"messages": [{"role": "user", "content": user_message.get("content", "")}]})
-    assistant_msg = result["messages"][-1]
-    full_text = getattr(assistant_msg, "content", str(assistant_msg))
+    async def thread_tokens():
+        if not settings.AGENT_COALESCE_REQUESTS:
+            async for item in _answer_tokens(graph, inputs, config):
+                yield item
+            return
 
-    # 2. Generator that yields DataStream chunks (type "0" => TextDelta, type "d" => FinishMessage)
+        key = await _flight_key(graph, config, question)
+        flight = inflight.join(key, lambda: _answer_tokens(graph, inputs, config))
+        parts: list[str] = []
+        async for item in flight:
+            if isinstance(item, str):
+                parts.append(item)
+            yield item
+        if not flight.leader and not one_shot:
+            # The shared run only checkpointed the leader's thread; record the
+            # turn on this one too so follow-ups see it.
+            await graph.aupdate_state(
+                config,
+                {
+                    "messages": [
+                        HumanMessage(content=question),
+                        AIMessage(content="".join(parts)),
+                    ]
+                },
+                as_node="chatbot",
+            )
+
+    # Generator that yields DataStream chunks (type "0" => TextDelta,
+    # type "3" => Error, type "d" => FinishMessage). Tokens are coalesced into
+    # fewer, larger text frames by `DataStreamWriter`.
     async def data_stream():
-        # Stream each character; change to words/tokens if desired
-        for char in full_text:
-            chunk = {"type": "0", "value": char}
-            yield (json.dumps(chunk) + "\n").encode()
-            await asyncio.sleep(0.01)  # 10 ms delay – tweak as desired
-
-        finish_chunk = {
-            "type": "d",
-            "value": {
-                "finishReason": "stop",
-                "usage": {"promptTokens": 0, "completionTokens": 0},
-            },
-        }
-        yield (json.dumps(finish_chunk) + "\n").encode()
+        global _disconnects
+        usage: dict[str, int] = {}
+        writer = DataStreamWriter()
+        frames = writer.frames(
+            answer_tokens(),
+            disconnected=request.is_disconnected,
+            poll_interval=DISCONNECT_POLL_SECONDS,
+        )
+        try:
+            async for frame in frames:
+                if isinstance(frame, dict):
+                    usage = frame
+                    continue
+                yield frame
+        except ProviderBusy as exc:
+            # Admitted above but lost the race for a slot: report it in-band,
+            # the response status has already been sent.
+            yield error_frame(str(exc))
+            return
+        except Exception:
+            # Same reason: a failing model or node can only be reported in-band.
+            logger.exception("Chat stream failed")
+            yield error_frame("The assistant failed to answer. Please try again.")
+            return
+        if writer.disconnected:
+            # The writer has cancelled the graph run; nobody is listening.
+            _disconnects += 1
+            return
+        yield finish_frame(usage)
 
     headers = {"x-vercel-ai-data-stream": "v1"}
+    if not one_shot:
+        headers["x-thread-id"] = thread_id
     return StreamingResponse(
         data_stream(), media_type="text/plain; charset=utf-8", headers=headers
     )
+
+
+@router.get("/metrics", dependencies=[Depends(get_current_active_superuser)])
+def chat_metrics() -> dict[str, Any]:
+    """Agent runtime metrics (per-node timings, answer cache hit rate, ...)."""
+
+    return metrics.snapshot()
@@ -5,6 +5,7 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select
 
 from app.api.deps import CurrentUser, SessionDep
+from app.core.db import index_medication, unindex_medication
 from app.models import (
     Medication,
     MedicationCreate,
@@ -53,6 +54,7 @@ def create_medication(
     session.add(med)
     session.commit()
     session.refresh(med)
+    index_medication(med)
     return med
 
 
@@ -72,6 +74,7 @@ def update_medication(
     session.add(med)
     session.commit()
     session.refresh(med)
+    index_medication(med)
     return med
 
 
@@ -85,6 +88,7 @@ def delete_medication(
         raise HTTPException(status_code=404, detail="Medication not found")
     session.delete(med)
     session.commit()
+    unindex_medication(id)
     return Message(message="Medication deleted successfully")
 
 
@@ -69,6 +69,48 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # File holding a memory-mapped snapshot of the medication index's
+    # embeddings. Workers map it instead of embedding every row at startup;
+    # it is rewritten when the Medication table has changed. Unset: always embed.
+    AGENT_INDEX_SNAPSHOT: str | None = None
+    AGENT_INDEX_SNAPSHOT_DTYPE: Literal["int8", "float16"] = "int8"
+    # Search the medication index with an IVF (approximate) index. It stays
+    # exact below RAG_IVF_MIN_ROWS rows; tune recall with RAG_IVF_NPROBE.
+    AGENT_INDEX_ANN: bool = False
+
+    # Mount /chat and start the LangGraph agent. When disabled the agent's
+    # dependencies are never imported.
+    AGENT_ENABLED: bool = True
+    # Initialise the chat model during startup rather than on the first chat.
+    # Off by default so the app starts without provider credentials; a failure
+    # to create the model is logged, not raised.
+    AGENT_WARMUP: bool = False
+
+    # Where the chat agent persists conversation threads. Defaults to the app's
+    # Postgres; use "sqlite:///path" for a local file or "memory" for tests.
+    AGENT_CHECKPOINT_URL: str | None = None
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def agent_checkpoint_url(self) -> str:
+        if self.AGENT_CHECKPOINT_URL:
+            return self.AGENT_CHECKPOINT_URL
+        # psycopg wants a plain libpq URL, without SQLAlchemy's driver suffix.
+        return str(self.SQLALCHEMY_DATABASE_URI).replace(
+            "postgresql+psycopg://", "postgresql://", 1
+        )
+
+    # Share one graph run between identical concurrent chat questions.
+    AGENT_COALESCE_REQUESTS: bool = True
+
+    # Extra retrieval sources queried alongside the drug index. Patient records
+    # are only exposed to the agent when explicitly enabled, and then only the
+    # signed-in caller's own patients.
+    AGENT_PATIENT_RETRIEVAL: bool = False
+    # Streamable-HTTP URL of the MCP patient server (mcp/patient), if running.
+    # Only used with AGENT_PATIENT_RETRIEVAL, and only for signed-in callers.
+    AGENT_MCP_PATIENT_URL: str | None = None
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -1,11 +1,26 @@
-from sqlmodel import Session, create_engine, select
+import logging
+import re
+import threading
+import uuid
+
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, col, create_engine, select
 
 from app import crud
 from app.core.config import settings
-from app.models import User, UserCreate
+from app.models import Medication, Patient, User, UserCreate
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
+logger = logging.getLogger(__name__)
+
+# Every worker process keeps its own agent index. A worker that serves a
+# medication write announces it on this channel ("<worker>:<medication id>")
+# and the others re-read the row (see `listen_for_medication_changes`).
+MEDICATION_CHANNEL = "medication_changes"
+_WORKER = uuid.uuid4().hex
+
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
 # otherwise, SQLModel might fail to initialize relationships properly
@@ -31,3 +46,165 @@ def init_db(session: Session) -> None:
             is_superuser=True,
         )
         user = crud.create_user(session=session, user_create=user_in)
+
+
+def init_medication_index(session: Session) -> None:
+    """Build the agent's retrieval index from the Medication table.
+
+    Called once at startup when the agent is enabled; the medication routes
+    keep it current afterwards (see `index_medication`). With
+    ``AGENT_INDEX_SNAPSHOT`` set the embeddings are mapped from that file when
+    it still matches the table.
+    """
+    # The agent package is imported here, not at module level, so the app
+    # never loads it with AGENT_ENABLED off.
+    from agents.answer_cache import answer_cache
+    from agents.med_index import medication_index
+    from agents.rag_utils import set_matcher, set_retriever
+
+    medication_index.load(
+        session.exec(select(Medication)).all(),
+        snapshot=settings.AGENT_INDEX_SNAPSHOT,
+        dtype=settings.AGENT_INDEX_SNAPSHOT_DTYPE,
+        ann=settings.AGENT_INDEX_ANN,
+    )
+    set_retriever(medication_index)
+    set_matcher(medication_index.matcher)
+    medication_index.on_change(answer_cache.invalidate_docs)
+
+
+def index_medication(med: Medication) -> None:
+    """Add or refresh *med* in the agent's index (no-op with the agent off)."""
+    if not settings.AGENT_ENABLED:
+        return
+    from agents.med_index import medication_index
+
+    medication_index.upsert(med)
+    _announce_medication_change(med.id)
+
+
+def unindex_medication(med_id: uuid.UUID) -> None:
+    """Remove a deleted medication from the agent's index (no-op with the agent off)."""
+    if not settings.AGENT_ENABLED:
+        return
+    from agents.med_index import medication_index
+
+    medication_index.remove(med_id)
+    _announce_medication_change(med_id)
+
+
+def _announce_medication_change(med_id: uuid.UUID) -> None:
+    # The write is already committed: a failed announcement only delays the
+    # other workers until their listener reconnects and reloads.
+    try:
+        with engine.connect() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": MEDICATION_CHANNEL, "payload": f"{_WORKER}:{med_id}"},
+            )
+            conn.commit()
+    except Exception:
+        logger.exception("could not announce the change of medication %s", med_id)
+
+
+def _apply_medication_change(med_id: str) -> None:
+    from agents.med_index import medication_index
+
+    with Session(engine) as session:
+        med = session.get(Medication, uuid.UUID(med_id))
+        if med is None:
+            medication_index.remove(med_id)
+        else:
+            medication_index.upsert(med)
+
+
+def listen_for_medication_changes(
+    stop: threading.Event,
+    ready: threading.Event | None = None,
+    retry_seconds: float = 5.0,
+) -> None:
+    """Apply the medication writes served by other workers to this worker's
+    agent index, until *stop* is set.
+
+    Meant to run in a thread started before `init_medication_index`; *ready*
+    is set once the first LISTEN has been attempted, so no write committed
+    after the initial load is missed. Notifications sent while the listener
+    is disconnected are lost, so every reconnect reloads the whole index.
+    """
+    import psycopg
+
+    conninfo = engine.url.set(drivername="postgresql").render_as_string(
+        hide_password=False
+    )
+    reload = False
+    while not stop.is_set():
+        try:
+            with psycopg.connect(conninfo, autocommit=True) as conn:
+                conn.execute(f"LISTEN {MEDICATION_CHANNEL}")
+                if reload:
+                    from agents.answer_cache import answer_cache
+
+                    with Session(engine) as session:
+                        init_medication_index(session)
+                    answer_cache.clear()
+                if ready is not None:
+                    ready.set()
+                while not stop.is_set():
+                    for notify in conn.notifies(timeout=1.0):
+                        worker, _, med_id = notify.payload.partition(":")
+                        if worker != _WORKER:
+                            _apply_medication_change(med_id)
+        except Exception:
+            logger.exception("medication change listener failed; reconnecting")
+        reload = True
+        if ready is not None:
+            ready.set()
+        stop.wait(retry_seconds)
+
+
+def patient_medication_hits(question: str, limit: int = 5) -> list[tuple[str, str]]:
+    """Retrieval source for the agent: patients named in *question*.
+
+    A patient matches when their first or last name appears as a word in the
+    question. Each match becomes one ``(doc_id, snippet)`` pair listing the
+    patient's assigned medications. Like the ``/patients`` routes, only the
+    caller's own patients are searched (every patient for a superuser), and
+    nothing without a signed-in caller (`agents.sources.current_user_id`).
+    """
+    from agents.sources import current_user_id
+
+    user_id = current_user_id.get()
+    words = set(re.findall(r"[a-z][a-z'-]+", question.lower()))
+    if user_id is None or not words:
+        return []
+    with Session(engine) as session:
+        user = session.get(User, uuid.UUID(user_id))
+        if user is None or not user.is_active:
+            return []
+        statement = select(Patient).where(
+            or_(
+                func.lower(Patient.first_name).in_(words),
+                func.lower(Patient.last_name).in_(words),
+            )
+        )
+        if not user.is_superuser:
+            statement = statement.where(Patient.owner_id == user.id)
+        patients = session.exec(
+            statement.options(selectinload(Patient.medications))  # type: ignore[arg-type]
+            .order_by(col(Patient.last_name), col(Patient.first_name))
+            .limit(limit)
+        ).all()
+        return [(f"patient:{p.id}", _patient_doc(p)) for p in patients]
+
+
+def _patient_doc(patient: Patient) -> str:
+    name = f"{patient.first_name} {patient.last_name}"
+    meds = "; ".join(
+        f"{m.brand_name} (generic: {m.generic}) {m.dose_mg} mg"
+        for m in sorted(patient.medications, key=lambda m: m.brand_name)
+    )
+    return (
+        f"Patient {name} (age {patient.age}, {patient.height_cm:g} cm, "
+        f"{patient.weight_kg:g} kg) is assigned "
+        + (f"these medications: {meds}." if meds else "no medications.")
+    )
@@ -1,10 +1,25 @@
+import logging
+import threading
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
+from sqlmodel import Session
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import (
+    engine,
+    init_medication_index,
+    listen_for_medication_changes,
+    patient_medication_hits,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,8 +29,62 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(fastapi_app: FastAPI) -> AsyncIterator[None]:
+    if not settings.AGENT_ENABLED:
+        yield
+        return
+
+    # The agent stack (LangGraph, the model provider SDK) is imported here
+    # rather than at module level so that importing the app stays cheap.
+    from agents.graph import build_graph, get_llm
+    from agents.intent import intent_router
+    from agents.memory import open_checkpointer
+    from agents.sources import Source, mcp_patient_source, register_source
+
+    # Follow the medication writes served by the other workers. LISTEN is
+    # issued before the initial load so no write falls in between.
+    stop_listener, listening = threading.Event(), threading.Event()
+    listener = threading.Thread(
+        target=listen_for_medication_changes,
+        args=(stop_listener, listening),
+        name="medication-listener",
+        daemon=True,
+    )
+    listener.start()
+    try:
+        listening.wait(timeout=10)
+        with Session(engine) as session:
+            init_medication_index(session)
+
+        if settings.AGENT_PATIENT_RETRIEVAL:
+            register_source(Source("patient_meds", patient_medication_hits))
+            if settings.AGENT_MCP_PATIENT_URL:
+                register_source(mcp_patient_source(settings.AGENT_MCP_PATIENT_URL))
+
+        async with open_checkpointer(settings.agent_checkpoint_url) as checkpointer:
+            fastapi_app.state.chat_graph = build_graph(checkpointer)
+            if settings.AGENT_WARMUP:
+                # Create the model client and train the intent router now
+                # instead of on the first chat. Missing credentials only fail
+                # the chats that need the model, not the whole app.
+                try:
+                    get_llm()
+                except Exception:
+                    logger.exception(
+                        "chat model warm-up failed; it will be retried on first use"
+                    )
+                intent_router.get_classifier()
+            yield
+    finally:
+        stop_listener.set()
+        listener.join(timeout=5)
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
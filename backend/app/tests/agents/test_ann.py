@@ -0,0 +1,83 @@
+import random
+import uuid
+
+import numpy as np
+
+from agents.ann import IVFIndex, kmeans
+from agents.bench_retrieval import synthetic_corpus
+from agents.med_index import MedicationIndex
+from agents.vector_index import VectorIndex
+from app.models import Medication
+
+
+def _pair(n: int, **ivf) -> tuple[VectorIndex, IVFIndex]:
+    corpus = synthetic_corpus(n)
+    exact, ann = VectorIndex(), IVFIndex(**ivf)
+    exact.add(corpus.items())
+    ann.add(corpus.items())
+    return exact, ann
+
+
+def _passages(index: VectorIndex, n: int) -> list[str]:
+    rng = random.Random(3)
+    docs = [index.get(doc_id) or "" for doc_id in rng.sample(index.ids, n)]
+    return [" ".join(w for w in doc.split() if rng.random() < 0.6) for doc in docs]
+
+
+def test_kmeans_centroids_are_unit_vectors() -> None:
+    x = np.random.default_rng(0).normal(size=(500, 16)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+
+    centroids = kmeans(x, 10)
+
+    assert centroids.shape == (10, 16)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1, atol=1e-5)
+
+
+def test_small_index_stays_exact() -> None:
+    exact, ann = _pair(200, min_rows=1000)
+
+    assert ann.centroids is None
+    assert ann.search("what is the dose", k=5) == exact.search("what is the dose", k=5)
+
+
+def test_probing_every_list_is_exact_and_fewer_lists_keep_recall() -> None:
+    exact, ann = _pair(3000, min_rows=1000)
+    assert ann.centroids is not None and ann.stats()["lists"] == 54
+    queries = _passages(exact, 50)
+
+    ann.nprobe = len(ann.centroids)
+    found = [{i for i, _ in hits} for hits in ann.search_batch(queries, 3)]
+    assert found == [{i for i, _ in hits} for hits in exact.search_batch(queries, 3)]
+
+    ann.nprobe = 8
+    truth, found = exact.search_batch(queries, 1), ann.search_batch(queries, 3)
+    recall = sum(t[0][0] in {i for i, _ in f} for t, f in zip(truth, found)) / len(queries)
+    assert recall >= 0.8
+
+
+def test_writes_after_training() -> None:
+    _, ann = _pair(1500, min_rows=1000)
+    victim = ann.ids[0]
+
+    ann.add([("zyrtec", "Zyrtec cetirizine relieves hay fever and itchy eyes.")])
+    ann.remove([victim])
+
+    assert len(ann) == 1500
+    assert victim not in ann
+    ann.nprobe = 4
+    assert ann.search("zyrtec cetirizine hay fever", k=1)[0][0] == "zyrtec"
+    assert all(doc_id != victim for doc_id, _ in ann.search(ann.get(ann.ids[1]) or "", k=50))
+    # Doubling the row count retrains.
+    ann.add(synthetic_corpus(1600, seed=9).items())
+    assert ann.stats()["trained_rows"] == len(ann)
+
+
+def test_medication_index_can_use_ivf() -> None:
+    med = Medication(id=uuid.uuid4(), brand_name="Advil", generic="ibuprofen", dose_mg=200, cost_usd=0.25)
+    index = MedicationIndex()
+    index.load([med], ann=True)
+
+    assert isinstance(index.index, IVFIndex)
+    assert index.stats()["ivf"]["rows"] == 1
+    assert index.search("advil", k=1)[0][0] == str(med.id)
@@ -0,0 +1,107 @@
+from agents.answer_cache import AnswerCache, normalize_question
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_normalize_question() -> None:
+    assert normalize_question("  What is the MAXIMUM dose of Ibuprofen?? ") == "what max dose ibuprofen"
+
+
+def test_exact_and_near_duplicate_hits() -> None:
+    cache = AnswerCache()
+    cache.store("What is the max dose of ibuprofen?", "ctx", "1.2 g", doc_ids=["ibuprofen"])
+
+    assert cache.lookup("what is the MAXIMUM dose of ibuprofen", "ctx") == "1.2 g"
+    assert cache.lookup("ibuprofen: what is the max dose", "ctx") == "1.2 g"
+    assert cache.lookup("what's the max dose of ibuprofen", "ctx") == "1.2 g"
+    # Different question or different evidence never hits.
+    assert cache.lookup("what is the min dose of ibuprofen", "ctx") is None
+    assert cache.lookup("what is the max dose of ibuprofen", "other ctx") is None
+
+    stats = cache.stats()
+    assert stats.exact_hits == 2  # "what's" normalises like "what is"
+    assert stats.near_hits == 1
+    assert stats.misses == 2
+    assert stats.hit_rate == 3 / 5
+
+
+def test_added_qualifier_is_never_a_near_duplicate() -> None:
+    cache = AnswerCache()
+    cache.store("What is the maximum dose of ibuprofen?", "ctx", "1.2 g per day")
+
+    assert cache.lookup("What is the maximum dose of ibuprofen for kids?", "ctx") is None
+    for question in (
+        "maximum dose of ibuprofen tablets",  # dose form
+        "maximum dose of ibuprofen 200 mg",  # strength
+        "maximum dose of ibuprofen and aspirin",  # second drug
+        "maximum dose",  # qualifier removed
+    ):
+        assert cache.lookup(question, "ctx") is None, question
+    # Reordering, case, punctuation and function words still match.
+    assert cache.lookup("IBUPROFEN: what's the max dose?", "ctx") == "1.2 g per day"
+    assert cache.stats().near_hits == 1
+
+
+def test_questions_differing_in_meaningful_words_miss() -> None:
+    pairs = [
+        ("When should I take aspirin?", "Why should I take aspirin?"),
+        ("When should I take aspirin?", "How should I take aspirin?"),
+        ("Can I take aspirin with ibuprofen?", "Can I take aspirin or ibuprofen?"),
+        ("Can I take aspirin with food?", "Can I take aspirin without food?"),
+        ("Is aspirin safe for kids?", "Is aspirin safe for my kids?"),
+        ("Should I take aspirin?", "Should I not take aspirin?"),
+        # Same words, but the order is the question.
+        ("Take aspirin before ibuprofen?", "Take ibuprofen before aspirin?"),
+    ]
+    for stored, asked in pairs:
+        cache = AnswerCache()
+        cache.store(stored, "ctx", "answer")
+        assert cache.lookup(asked, "ctx") is None, (stored, asked)
+        assert cache.lookup(stored, "ctx") == "answer"
+
+
+def test_ttl_expiry() -> None:
+    clock = _Clock()
+    cache = AnswerCache(ttl_seconds=10, clock=clock)
+    cache.store("q", "ctx", "a")
+    clock.now = 9
+    assert cache.lookup("q", "ctx") == "a"
+    clock.now = 10
+    assert cache.lookup("q", "ctx") is None
+    assert cache.stats().expirations == 1
+    assert len(cache) == 0
+
+
+def test_lru_eviction_by_count_and_bytes() -> None:
+    cache = AnswerCache(max_entries=2)
+    cache.store("aspirin", "c", "a")
+    cache.store("ibuprofen", "c", "b")
+    assert cache.lookup("aspirin", "c") == "a"  # refreshes aspirin
+    cache.store("naproxen", "c", "c")
+    assert cache.lookup("ibuprofen", "c") is None
+    assert cache.lookup("aspirin", "c") == "a"
+    assert cache.stats().evictions == 1
+
+    small = AnswerCache(max_bytes=5000)
+    for i in range(10):
+        small.store(f"question {i}", "c", "x" * 1000)
+    assert small.stats().bytes <= 5000
+    assert 0 < len(small) < 10
+
+
+def test_invalidate_docs_drops_dependent_entries() -> None:
+    cache = AnswerCache()
+    cache.store("aspirin dose", "c1", "a", doc_ids=["m1"])
+    cache.store("ibuprofen dose", "c2", "b", doc_ids=["m2", "m1"])
+    cache.store("naproxen dose", "c3", "c", doc_ids=["m3"])
+
+    assert cache.invalidate_docs(["m1"]) == 2
+    assert cache.lookup("aspirin dose", "c1") is None
+    assert cache.lookup("ibuprofen dose", "c2") is None
+    assert cache.lookup("naproxen dose", "c3") == "c"
@@ -0,0 +1,48 @@
+from agents.bm25 import BM25Index, tokenize
+from agents.rag_utils import MED_CORPUS
+
+
+def _index() -> BM25Index:
+    index = BM25Index()
+    index.add(MED_CORPUS.items())
+    return index
+
+
+def test_tokenize_normalises_units_and_forms() -> None:
+    assert tokenize("Take 500mg Tylenol tablets") == ["take", "500", "mg", "tylenol", "tablet"]
+    assert tokenize("81 milligrams per dosage") == ["81", "mg", "dose"]
+    assert tokenize("what is the") == []
+
+
+def test_search_ranks_by_term_match() -> None:
+    index = _index()
+    assert index.search("max dose of aspirin")[0][0] == "aspirin"
+    assert index.search("81 mg")[0][0] == "aspirin"
+    assert index.search("paracetamol hepatotoxicity", k=1) == [
+        ("acetaminophen", index.search("paracetamol hepatotoxicity")[0][1])
+    ]
+
+
+def test_search_returns_distinct_docs_and_respects_threshold() -> None:
+    index = _index()
+    hits = index.search("ibuprofen aspirin acetaminophen dose mg", k=3)
+    assert sorted(doc_id for doc_id, _ in hits) == ["acetaminophen", "aspirin", "ibuprofen"]
+    best_score = hits[0][1]
+    assert index.search("ibuprofen aspirin acetaminophen dose mg", k=3, threshold=best_score) == [hits[0]]
+    assert index.search("weather forecast") == []
+
+
+def test_incremental_add_and_remove() -> None:
+    index = _index()
+    index.remove(["aspirin"])
+    assert len(index) == 2
+    assert all(doc_id != "aspirin" for doc_id, _ in index.search("aspirin 81 mg", k=5))
+
+    index.add([("bayer", "Bayer low dose aspirin 81 mg tablet")])
+    assert len(index) == 3
+    assert index.search("aspirin 81 mg")[0][0] == "bayer"
+
+    index.add([("bayer", "Bayer extra strength 500 mg caplet")])
+    assert len(index) == 3
+    assert all(doc_id != "bayer" for doc_id, _ in index.search("aspirin 81", k=5))
+    assert index.retrieve("extra strength", k=1) == ["Bayer extra strength 500 mg caplet"]
@@ -0,0 +1,89 @@
+import pytest
+
+import agents.graph as agent_graph
+from agents import sources
+from agents.compress import ContextCompressor, context_compressor, split_sentences
+from agents.context import count_tokens
+from agents.rag_utils import MED_CORPUS
+from agents.sources import Source
+from agents.tracing import tracer
+
+HITS = list(MED_CORPUS.items())
+
+
+def test_split_sentences_keeps_decimals_and_brackets() -> None:
+    text = "Advil costs $0.10 per dose. Max 1.2 g/24 h (with food). Take it. (Not for children.)"
+
+    assert split_sentences(text) == [
+        "Advil costs $0.10 per dose.",
+        "Max 1.2 g/24 h (with food).",
+        "Take it.",
+        "(Not for children.)",
+    ]
+
+
+def test_compress_keeps_matching_sentences_of_every_snippet() -> None:
+    out = dict(ContextCompressor().compress("what color is ibuprofen", HITS))
+
+    assert list(out) == ["aspirin", "ibuprofen", "acetaminophen"]
+    assert out["aspirin"] == "Aspirin is the color orange."
+    assert out["ibuprofen"].endswith("Ibuprofen is the color grey.")
+    assert "mg" not in out["ibuprofen"]
+
+
+def test_compress_respects_budget_in_rank_order() -> None:
+    budget = count_tokens("Aspirin is the color orange.") + count_tokens("Ibuprofen is the color grey.")
+    out = ContextCompressor(budget=budget).compress("what color is ibuprofen", HITS)
+
+    # Best sentences go in by snippet rank; the third no longer fits.
+    assert out == [("aspirin", "Aspirin is the color orange."), ("ibuprofen", "Ibuprofen is the color grey.")]
+
+
+def test_compress_leaves_snippets_alone_without_overlap() -> None:
+    compressor = ContextCompressor()
+
+    assert compressor.compress("can I take tylenol with food", HITS) == HITS
+    stats = compressor.stats()
+    assert (stats["calls"], stats["tokens_saved"]) == (1, 0)
+
+
+@pytest.fixture
+def label_source():
+    label = "Ibuprofen 200 mg film-coated tablets. The tablets are grey in color. Store below 25 C."
+    sources.register_source(Source("labels", lambda q: [("label:1", label)]))
+    yield
+    sources.reset_sources()
+
+
+def test_rag_retrieve_compresses_context(label_source, monkeypatch) -> None:
+    state = {"messages": [{"role": "user", "content": "what color is ibuprofen"}]}
+    monkeypatch.setattr(context_compressor, "enabled", False)
+    full = agent_graph.rag_retrieve(state)
+    before = tracer.stats()["nodes"].get("compress", {}).get("calls", 0)
+
+    monkeypatch.setattr(context_compressor, "enabled", True)
+    compressed = agent_graph.rag_retrieve(state)
+
+    assert "label:1" in compressed["context_doc_ids"]
+    assert "The tablets are grey in color." in compressed["context"]
+    assert "Store below" not in compressed["context"]
+    assert compressed["context_tokens"] < full["context_tokens"]
+    assert tracer.stats()["nodes"]["compress"]["calls"] == before + 1
+
+
+def test_packed_ids_follow_the_compressed_snippets(monkeypatch) -> None:
+    hits = [
+        ("x", "Aspirin is the color orange. Take 325 mg for pain."),
+        ("y", "Store below 25 C. Aspirin is the color orange."),
+        ("ibuprofen", MED_CORPUS["ibuprofen"]),
+    ]
+    monkeypatch.setattr(context_compressor, "enabled", True)
+
+    # "x" and "y" compress to the same sentence; only the first is packed.
+    update = agent_graph._pack("aspirin color", hits)
+    assert update["context_doc_ids"] == ["x", "ibuprofen"]
+    assert update["context"].count("orange") == 1
+
+    # With room for two sentences the ibuprofen snippet is dropped.
+    monkeypatch.setattr(context_compressor, "budget", 2 * count_tokens("Aspirin is the color orange."))
+    assert agent_graph._pack("aspirin color", hits)["context_doc_ids"] == ["x"]
@@ -0,0 +1,64 @@
+import agents.graph as agent_graph
+from agents.compress import context_compressor
+from agents.context import CONTEXT_SEPARATOR, build_context, count_tokens, truncate_tokens
+from agents.rag_utils import MED_CORPUS
+
+
+def test_count_and_truncate_tokens() -> None:
+    assert count_tokens("") == 0
+    assert count_tokens("Take 81 mg daily.") == count_tokens("Take 81 mg daily") + 1
+    text = "Aspirin is an analgesic, antipyretic, and antiplatelet agent."
+    prefix = truncate_tokens(text, 5)
+    assert text.startswith(prefix)
+    assert count_tokens(prefix) <= 5
+    assert truncate_tokens(text, 10_000) == text
+    assert truncate_tokens(text, 0) == ""
+
+
+def test_build_context_keeps_everything_within_budget() -> None:
+    docs = list(MED_CORPUS.values())
+    result = build_context(docs, budget=10_000)
+    assert result.docs == docs
+    assert result.dropped == 0
+    assert not result.truncated
+    assert result.tokens == count_tokens(result.text)
+
+
+def test_build_context_trims_to_budget_in_rank_order() -> None:
+    docs = list(MED_CORPUS.values())
+    first = count_tokens(docs[0])
+    result = build_context(docs + [docs[0]], budget=first + 20)
+    assert result.docs[0] == docs[0]
+    assert result.truncated
+    assert result.dropped == 1
+    assert result.tokens <= result.budget
+    assert result.tokens == count_tokens(result.text)
+
+
+def test_build_context_empty() -> None:
+    result = build_context([], budget=100)
+    assert result.text == ""
+    assert result.tokens == 0
+
+
+def test_build_context_reports_ids_of_kept_snippets() -> None:
+    docs = list(MED_CORPUS.values())
+    result = build_context(
+        [docs[0], docs[0], docs[1], docs[2]], budget=10_000, ids=["a", "dup", "b", "c"]
+    )
+    assert result.doc_ids == ["a", "b", "c"]
+    assert result.dropped == 0
+
+    result = build_context(docs, budget=count_tokens(docs[0]) + 20, ids=["a", "b", "c"])
+    assert result.doc_ids == ["a", "b"]  # "b" is the truncated one
+
+
+def test_packed_doc_ids_follow_duplicate_hits(monkeypatch) -> None:
+    monkeypatch.setattr(context_compressor, "enabled", False)
+    aspirin, ibuprofen = MED_CORPUS["aspirin"], MED_CORPUS["ibuprofen"]
+    hits = [("aspirin", aspirin), ("aspirin-copy", aspirin), ("ibuprofen", ibuprofen)]
+
+    update = agent_graph._pack("aspirin or ibuprofen", hits)
+
+    assert update["context_doc_ids"] == ["aspirin", "ibuprofen"]
+    assert update["context"] == aspirin + CONTEXT_SEPARATOR + ibuprofen
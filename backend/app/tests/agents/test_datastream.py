@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+
+from agents.datastream import DataStreamWriter, error_frame, finish_frame, text_frame
+
+
+async def _tokens(items, delay: float = 0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+def _frames(items, **kwargs) -> list:
+    async def run():
+        return [f async for f in DataStreamWriter(**kwargs).frames(items)]
+
+    return asyncio.run(run())
+
+
+def _text(frame: bytes) -> str:
+    chunk = json.loads(frame)
+    assert chunk["type"] == "0"
+    return chunk["value"]
+
+
+def test_frames_match_json_encoding() -> None:
+    for text in ['plain', 'quote " and \\ slash', "line\nbreak\t"]:
+        assert text_frame(text) == (json.dumps({"type": "0", "value": text}) + "\n").encode()
+        assert error_frame(text) == (json.dumps({"type": "3", "value": text}) + "\n").encode()
+    # Non-ASCII text is sent as UTF-8 rather than \u escapes.
+    assert json.loads(text_frame("naïve – 200 mg ✓")) == {"type": "0", "value": "naïve – 200 mg ✓"}
+
+    finish = json.loads(finish_frame({"prompt_tokens": 3, "completion_tokens": 5}))
+    assert finish["value"]["usage"] == {"promptTokens": 3, "completionTokens": 5}
+    assert json.loads(finish_frame())["value"]["usage"]["promptTokens"] == 0
+
+
+def test_first_token_alone_then_coalesced_by_size() -> None:
+    frames = _frames(_tokens(list("abcdefghij")), max_bytes=4, max_delay=10)
+
+    texts = [_text(f) for f in frames]
+    assert texts == ["a", "bcde", "fghi", "j"]
+
+
+def test_stalled_model_flushes_on_deadline() -> None:
+    async def stalling():
+        yield "first"
+        yield "b"
+        await asyncio.sleep(0.1)
+        yield "c"
+
+    frames = _frames(stalling(), max_bytes=1000, max_delay=0.01)
+
+    assert [_text(f) for f in frames] == ["first", "b", "c"]
+
+
+def test_non_text_items_pass_through_after_a_flush() -> None:
+    usage = {"prompt_tokens": 1, "completion_tokens": 2}
+    frames = _frames(_tokens(["a", "b", "c", usage]), max_bytes=1000, max_delay=10)
+
+    assert [_text(f) for f in frames[:-1]] == ["a", "bc"]
+    assert frames[-1] is usage
+
+
+def test_source_errors_propagate() -> None:
+    async def failing():
+        yield "a"
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError, match="provider down"):
+        _frames(failing())
+
+
+def test_disconnect_stops_and_cancels_the_source() -> None:
+    cancelled = False
+    gone = False
+
+    async def endless():
+        nonlocal cancelled
+        try:
+            while True:
+                yield "x"
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def disconnected() -> bool:
+        return gone
+
+    async def run():
+        nonlocal gone
+        writer = DataStreamWriter(max_bytes=1000, max_delay=10)
+        frames = []
+        async for frame in writer.frames(endless(), disconnected, poll_interval=0.01):
+            frames.append(frame)
+            gone = True
+        return writer, frames
+
+    writer, frames = asyncio.run(run())
+
+    assert writer.disconnected
+    assert cancelled
+    # Only the immediate first-token frame went out; the buffer was dropped.
+    assert [_text(f) for f in frames] == ["x"]
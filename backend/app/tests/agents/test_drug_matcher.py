@@ -0,0 +1,77 @@
+import threading
+from collections.abc import Iterable
+
+import pytest
+
+from agents import drug_matcher, rag_utils
+from agents.drug_matcher import AhoCorasick, DrugMatcher
+from agents.rag_utils import MED_CORPUS, is_med_query, retrieve_med_docs
+
+
+def test_automaton_finds_overlapping_whole_word_matches() -> None:
+    automaton = AhoCorasick(["aspirin", "acetylsalicylic acid", "acid", "asa"])
+    found = automaton.find_all("Is Acetylsalicylic Acid the same as aspirin? Not nasal.")
+    assert [m.name for m in found] == ["acetylsalicylic acid", "acid", "aspirin"]
+    assert found[0].start == 3
+    assert automaton.find_all("aspirins") == []
+
+
+def test_matcher_expands_synonyms_and_tracks_updates() -> None:
+    matcher = DrugMatcher()
+    matcher.load([("m1", ["Advil", "ibuprofen"]), ("m2", ["Tylenol", "acetaminophen"])])
+
+    assert matcher.doc_ids("is motrin safe with paracetamol?") == ["m1", "m2"]
+
+    matcher.set("m3", ["Aleve", "naproxen"])
+    assert matcher.doc_ids("naprosyn or advil") == ["m3", "m1"]
+
+    matcher.remove("m1")
+    assert matcher.doc_ids("advil") == []
+
+
+def test_lookups_use_the_published_automaton_while_a_write_compiles(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    matcher = DrugMatcher()
+    matcher.load([("m1", ["Advil", "ibuprofen"])])
+    compiling, release = threading.Event(), threading.Event()
+
+    def slow_automaton(patterns: Iterable[str]) -> AhoCorasick:
+        compiling.set()
+        release.wait(5)
+        return AhoCorasick(patterns)
+
+    monkeypatch.setattr(drug_matcher, "AhoCorasick", slow_automaton)
+    writer = threading.Thread(target=matcher.set, args=("m2", ["Aleve"]))
+    writer.start()
+    assert compiling.wait(5)
+    # The write compiles in its own thread; lookups keep the old vocabulary.
+    assert matcher.doc_ids("advil or aleve") == ["m1"]
+
+    release.set()
+    writer.join(5)
+    assert matcher.doc_ids("advil or aleve") == ["m1", "m2"]
+
+
+def test_router_uses_matcher() -> None:
+    rag_utils.set_matcher(None)
+    assert is_med_query("Tell me about Tylenol")
+    assert is_med_query("how many mg?")
+    assert not is_med_query("what is the weather like")
+
+    matcher = DrugMatcher()
+    matcher.load([("x", ["zorbexal"])])
+    rag_utils.set_matcher(matcher)
+    try:
+        assert is_med_query("is Zorbexal available?")
+    finally:
+        rag_utils.set_matcher(None)
+
+
+def test_retrieval_pins_mentioned_drugs() -> None:
+    rag_utils.set_matcher(None)
+    rag_utils.set_retriever(None)
+    docs = retrieve_med_docs("paracetamol", k=1)
+    assert docs == [MED_CORPUS["acetaminophen"]]
+    docs = retrieve_med_docs("advil vs bayer", k=3)
+    assert docs[:2] == [MED_CORPUS["ibuprofen"], MED_CORPUS["aspirin"]]
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agents.bench_agent import PROMPTS_FILE, percentiles, run_benchmark
+from agents.fake_llm import FakeStreamingChatModel
+from agents.intent import load_examples
+from agents.llm import init_pooled_chat_model
+
+
+def test_from_spec_and_init() -> None:
+    model = init_pooled_chat_model("fake:ttft_ms=250,token_ms=10,tokens=5")
+
+    assert isinstance(model, FakeStreamingChatModel)
+    assert (model.ttft, model.token_latency, model.max_tokens) == (0.25, 0.01, 5)
+    assert FakeStreamingChatModel.from_spec("fake:prefill_us=500").prompt_token_latency == 0.0005
+    with pytest.raises(ValueError):
+        FakeStreamingChatModel.from_spec("fake:speed=fast")
+
+
+def test_streams_with_scripted_latency() -> None:
+    model = FakeStreamingChatModel(ttft=0.1, token_latency=0.02, max_tokens=6)
+
+    async def run() -> tuple[float, float, list]:
+        start = time.perf_counter()
+        chunks = []
+        first = 0.0
+        async for chunk in model.astream([HumanMessage(content="one two three")]):
+            if not chunks:
+                first = time.perf_counter() - start
+            chunks.append(chunk)
+        return first, time.perf_counter() - start, chunks
+
+    first, total, chunks = asyncio.run(run())
+
+    assert "".join(c.content for c in chunks) == "one two three one two three"
+    assert 0.1 <= first < 0.2
+    assert 0.2 <= total < 0.4
+    assert chunks[-1].usage_metadata["output_tokens"] > 0
+
+
+def test_replies_are_deterministic() -> None:
+    model = FakeStreamingChatModel(max_tokens=4)
+    prompt = [HumanMessage(content="what color is ibuprofen")]
+
+    assert model.invoke(prompt).content == model.invoke(prompt).content
+
+
+def test_benchmark_reports_routing_and_latency() -> None:
+    report = run_benchmark(ttft_ms=5, token_ms=0, tokens=3, runs=1)
+
+    assert len(load_examples(PROMPTS_FILE)) == report["prompts"]
+    assert report["routing"]["what color is ibuprofen"] == "rag_answer"
+    assert report["routing"]["hi, how are you today?"] == "chatbot"
+    for target in ("graph", "route"):
+        ttft = report["latency"][target]["ttft"]
+        assert 5 <= ttft["p50_ms"] <= ttft["p95_ms"] <= ttft["p99_ms"]
+
+
+def test_percentiles_of_no_samples_are_empty() -> None:
+    assert percentiles([]) == {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    assert percentiles([0.003, 0.001, 0.002]) == pytest.approx(
+        {"p50_ms": 2.0, "p95_ms": 3.0, "p99_ms": 3.0}
+    )
@@ -0,0 +1,84 @@
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import agents.graph as agent_graph
+from agents.fast_path import FastPath, fast_path, lookup_kinds
+from agents.fake_llm import FakeStreamingChatModel
+from agents.med_index import MedicationIndex
+from app.models import Medication
+
+
+def _med(brand: str, generic: str, dose_mg: int, cost_usd: float) -> Medication:
+    return Medication(
+        id=uuid.uuid4(), brand_name=brand, generic=generic, dose_mg=dose_mg, cost_usd=cost_usd
+    )
+
+
+@pytest.fixture
+def index() -> MedicationIndex:
+    index = MedicationIndex()
+    index.load(
+        [
+            _med("Advil", "ibuprofen", 200, 0.25),
+            _med("Motrin", "ibuprofen", 400, 0.3),
+            _med("Tylenol", "acetaminophen", 500, 0.1),
+        ]
+    )
+    return index
+
+
+def test_lookup_kinds() -> None:
+    assert lookup_kinds("What's the dose of Advil?") == ("dose",)
+    assert lookup_kinds("How much does Tylenol cost?") == ("cost",)
+    assert lookup_kinds("Advil dosage and price") == ("dose", "cost")
+    assert lookup_kinds("What is the max dose of ibuprofen per day?") == ()
+    assert lookup_kinds("What dose should I take for a headache?") == ()
+    assert lookup_kinds("Can children take Advil?") == ()
+    assert lookup_kinds("Tell me about aspirin") == ()
+
+
+def test_answers_from_the_table(index: MedicationIndex) -> None:
+    fp = FastPath(index)
+
+    assert fp.answer("How much does Tylenol cost?") == "Tylenol (acetaminophen) costs $0.10 per dose."
+    dose = fp.answer("what's the dose of advil")
+    assert dose.startswith("Advil (ibuprofen) is stocked at 200 mg per dose.")
+    # The generic name covers every row stocking it.
+    both = fp.answer("ibuprofen price")
+    assert "Advil" in both and "Motrin" in both
+
+
+def test_declines_open_ended_and_unknown(index: MedicationIndex) -> None:
+    fp = FastPath(index)
+
+    assert fp.answer("Is Advil safe with alcohol?") is None
+    assert fp.answer("What does aspirin cost?") is None  # not stocked
+    assert FastPath(index, enabled=False).answer("Advil cost") is None
+
+    fp.answer("Advil cost")
+    stats = fp.stats()
+    assert stats["considered"] == 3
+    assert stats["answered"] == 1
+    assert stats["kinds"] == {"cost": 1}
+
+
+def test_graph_answers_lookup_without_the_model(
+    index: MedicationIndex, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(fast_path, "index", index)
+    model = FakeStreamingChatModel(ttft=0, token_latency=0, reply="from the model")
+    monkeypatch.setattr(agent_graph, "llm", model)
+    graph = agent_graph.build_graph()
+
+    looked_up = graph.invoke({"messages": [{"role": "user", "content": "How much does Advil cost?"}]})
+    assert looked_up["messages"][-1].content == "Advil (ibuprofen) costs $0.25 per dose."
+    assert looked_up["messages"][-1].response_metadata["fast_path"] == "hit"
+    assert not looked_up.get("context")
+
+    # Not stocked: falls through to retrieval and the model.
+    fallback = graph.invoke({"messages": [{"role": "user", "content": "What does aspirin cost?"}]})
+    assert isinstance(fallback["messages"][-1], AIMessage)
+    assert fallback["messages"][-1].content.startswith("from the model")
+    assert "aspirin" in fallback["context_doc_ids"]
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Any
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from agents.hedging import HedgedChatModel, HedgePolicy
+from agents.llm import Limiter
+
+
+class _DelayedFakeChatModel(GenericFakeChatModel):
+    """Streams its reply after waiting `delay` seconds for the first token."""
+
+    delay: float = 0.0
+
+    async def _astream(self, *args: Any, **kwargs: Any):
+        await asyncio.sleep(self.delay)
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+def _model(reply: str, delay: float) -> _DelayedFakeChatModel:
+    return _DelayedFakeChatModel(messages=iter([AIMessage(content=reply)]), delay=delay)
+
+
+def _ask(model: HedgedChatModel) -> tuple[str, float]:
+    start = time.perf_counter()
+    reply = asyncio.run(model.ainvoke([HumanMessage(content="hello there")]))
+    return reply.content, time.perf_counter() - start
+
+
+def test_slow_primary_is_hedged() -> None:
+    policy = HedgePolicy(enabled=True, initial_delay=0.05)
+    model = HedgedChatModel(
+        primary=_model("from primary", 1.0),
+        secondary=_model("from hedge", 0.0),
+        policy=policy,
+    )
+
+    reply, elapsed = _ask(model)
+
+    assert reply == "from hedge"
+    assert elapsed < 0.5
+    stats = policy.stats()
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["extra_prompt_tokens"] > 0
+
+
+def test_fast_primary_is_not_hedged() -> None:
+    policy = HedgePolicy(enabled=True, initial_delay=0.5)
+    model = HedgedChatModel(
+        primary=_model("from primary", 0.0),
+        secondary=_model("from hedge", 0.0),
+        policy=policy,
+    )
+
+    reply, _ = _ask(model)
+
+    assert reply == "from primary"
+    assert policy.stats()["hedged"] == 0
+    assert policy.stats()["calls"] == 1
+
+
+def test_no_hedge_when_provider_is_busy() -> None:
+    policy = HedgePolicy(enabled=True, initial_delay=0.05)
+    busy = Limiter("test", max_concurrency=0, max_queue=0)
+    model = HedgedChatModel(
+        primary=_model("from primary", 0.2),
+        secondary=_model("from hedge", 0.0),
+        policy=policy,
+        hedge_limiter=busy,
+    )
+
+    reply, _ = _ask(model)
+
+    assert reply == "from primary"
+    assert policy.stats()["skipped_busy"] == 1
+
+
+def test_deadline_follows_observed_percentile() -> None:
+    policy = HedgePolicy(percentile=90, initial_delay=2.0, min_delay=0.01, min_samples=10)
+    assert policy.deadline() == 2.0
+
+    for i in range(1, 11):
+        policy.record(i / 10)
+
+    assert policy.deadline() == 0.9
+
+
+def test_winning_stream_is_closed_when_the_caller_stops_early() -> None:
+    closed: list[bool] = []
+
+    class _Tracked(_DelayedFakeChatModel):
+        async def astream(self, *args: Any, **kwargs: Any):
+            try:
+                for word in ("one", "two", "three"):
+                    yield AIMessageChunk(content=word)
+            finally:
+                closed.append(True)
+
+    model = HedgedChatModel(
+        primary=_Tracked(messages=iter([])),
+        secondary=_model("from hedge", 0.0),
+        policy=HedgePolicy(enabled=True, initial_delay=1.0),
+    )
+
+    async def first_chunk_then_stop() -> list[bool]:
+        stream = model.astream([HumanMessage(content="hello there")])
+        async for _ in stream:
+            break
+        await stream.aclose()
+        return list(closed)
+
+    # Closed before the loop shuts down, not left to the garbage collector.
+    assert asyncio.run(first_chunk_then_stop()) == [True]
@@ -0,0 +1,89 @@
+import asyncio
+import uuid
+
+import pytest
+
+from agents import rag_utils, sources
+from agents.med_index import MedicationIndex
+from agents.rag_utils import retrieve_lexical_hits
+from agents.rerank import rerank
+from agents.sources import gather_hits
+from agents.tracing import tracer
+from app.models import Medication
+
+
+def _med(brand: str, generic: str, dose_mg: int, cost_usd: float = 0.1) -> Medication:
+    return Medication(id=uuid.uuid4(), brand_name=brand, generic=generic, dose_mg=dose_mg, cost_usd=cost_usd)
+
+
+@pytest.fixture
+def index(monkeypatch) -> MedicationIndex:
+    index = MedicationIndex()
+    index.load(
+        [
+            _med("Bayer", "aspirin", 325),
+            _med("Ecotrin", "aspirin", 81),
+            _med("Advil", "ibuprofen", 200),
+            _med("Tylenol", "acetaminophen", 500),
+        ]
+    )
+    monkeypatch.setattr(rag_utils, "_retriever", index)
+    sources.reset_sources()
+    yield index
+    sources.reset_sources()
+
+
+def test_lexical_index_follows_writes(index) -> None:
+    assert index.search_lexical("81 mg", k=1)[0][0] == _id(index, "Ecotrin")
+
+    aleve = _med("Aleve", "naproxen", 220)
+    index.upsert(aleve)
+    assert index.search_lexical("naproxen", k=1)[0][0] == str(aleve.id)
+    index.remove(aleve.id)
+    assert index.search_lexical("naproxen") == []
+
+
+def test_lexical_hits_need_a_lexical_retriever(index, monkeypatch) -> None:
+    hits = retrieve_lexical_hits("is advil 200 mg")
+    assert hits[0][0] == _id(index, "Advil")
+    # Terms every snippet shares score below the threshold.
+    assert retrieve_lexical_hits("what dose per mg") == []
+
+    monkeypatch.setattr(rag_utils, "_retriever", None)  # default MED_CORPUS index
+    assert retrieve_lexical_hits("aspirin") == []
+
+
+def test_rerank_prefers_full_coverage_and_matching_dose() -> None:
+    hits = [
+        ("a", "Aspirin 325 mg tablet for pain."),
+        ("b", "Ibuprofen 81 mg for fever."),
+        ("c", "Aspirin 81 mg tablet for heart protection."),
+    ]
+
+    assert rerank("aspirin 81 mg", hits)[0][0] == "c"
+    assert [i for i, _ in rerank("aspirin tablet", hits)] == ["a", "c", "b"]
+    assert rerank("what is it", hits) == hits  # no terms: fused order kept
+
+
+def test_hybrid_gathers_both_indexes_and_traces_stages(index) -> None:
+    assert [s.name for s in sources.get_sources()] == ["drug_index", "drug_lexical"]
+    stages = ("source:drug_index", "source:drug_lexical", "fusion", "rerank")
+    before = {stage: _calls(stage) for stage in stages}
+
+    hits = asyncio.run(gather_hits("aspirin 81 mg", reorder=True))
+
+    assert hits[0][0] == _id(index, "Ecotrin")
+    for stage in stages:
+        assert _calls(stage) == before[stage] + 1
+
+
+def _calls(stage: str) -> int:
+    return tracer.stats()["nodes"].get(stage, {}).get("calls", 0)
+
+
+def _id(index: MedicationIndex, brand: str) -> str:
+    for doc_id in index.index.ids:
+        facts = index.facts(doc_id)
+        if facts is not None and facts.brand_name == brand:
+            return doc_id
+    raise KeyError(brand)
@@ -0,0 +1,145 @@
+import uuid
+from collections.abc import Sequence
+
+import numpy as np
+import pytest
+
+from agents.bench_retrieval import synthetic_corpus
+from agents.index_snapshot import (
+    MappedIndex,
+    content_checksum,
+    open_snapshot,
+    read_header,
+    save_snapshot,
+)
+from agents.med_index import MedicationIndex, medication_doc
+from agents.vector_index import VectorIndex, hash_embed
+from app.models import Medication
+
+
+def _med(brand: str, generic: str, dose_mg: int = 200, cost_usd: float = 0.25) -> Medication:
+    return Medication(
+        id=uuid.uuid4(), brand_name=brand, generic=generic, dose_mg=dose_mg, cost_usd=cost_usd
+    )
+
+
+def _corpus_index(n: int = 300) -> VectorIndex:
+    index = VectorIndex()
+    index.add(synthetic_corpus(n).items())
+    return index
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_snapshot_search_matches_the_float32_index(tmp_path, dtype) -> None:
+    index = _corpus_index()
+    path = save_snapshot(index, tmp_path / "meds.idx", "sum", dtype)
+
+    mapped = open_snapshot(path, "sum", dtype=dtype)
+
+    assert isinstance(mapped, MappedIndex)
+    assert isinstance(mapped._vectors, np.memmap)
+    assert len(mapped) == len(index)
+    names = list(synthetic_corpus(300))
+    for name in names[:20]:
+        exact = index.search(f"typical dose of {name}", k=3)
+        approx = mapped.search(f"typical dose of {name}", k=3)
+        assert approx[0][0] == exact[0][0] == name
+        assert approx[0][1] == pytest.approx(exact[0][1], abs=0.02)
+    assert mapped.get(names[0]) == index.get(names[0])
+
+
+def test_header_holds_only_scalars_and_docs_stay_mapped(tmp_path) -> None:
+    index = VectorIndex()
+    index.add([("ß-1", "Ibuprofène 200 mg, à prendre au repas"), ("b", ""), ("c", "Tylenol 500 mg")])
+    path = save_snapshot(index, tmp_path / "meds.idx", "sum")
+
+    header = read_header(path)
+    assert header is not None
+    assert all(isinstance(value, (str, int, float)) for value in header.values())
+
+    mapped = open_snapshot(path, "sum")
+    assert mapped is not None
+    assert isinstance(mapped._docs, Sequence) and not isinstance(mapped._docs, list)
+    assert {doc_id: mapped.get(doc_id) for doc_id in ["ß-1", "b", "c"]} == {
+        doc_id: index.get(doc_id) for doc_id in ["ß-1", "b", "c"]
+    }
+    assert mapped.retrieve("tylenol", k=1) == ["Tylenol 500 mg"]
+
+
+def test_stale_or_damaged_snapshots_are_rejected(tmp_path) -> None:
+    path = save_snapshot(_corpus_index(20), tmp_path / "meds.idx", "old")
+
+    assert open_snapshot(tmp_path / "missing.idx") is None
+    assert open_snapshot(path, "new") is None
+    assert open_snapshot(path, "old", dtype="float16") is None
+    assert open_snapshot(path, "old", embed=lambda texts: hash_embed(texts)) is None
+
+    data = path.read_bytes()
+    path.write_bytes(data[:-10])
+    assert read_header(path) is not None
+    assert open_snapshot(path, "old") is None
+    path.write_bytes(b"not a snapshot")
+    assert open_snapshot(path) is None
+
+
+def test_checksum_tracks_content_not_order() -> None:
+    items = [("1", "Advil"), ("2", "Tylenol")]
+
+    assert content_checksum(items, hash_embed, 512) == content_checksum(items[::-1], hash_embed, 512)
+    assert content_checksum(items, hash_embed, 512) != content_checksum(
+        [("1", "Advil"), ("2", "Tylenol 500")], hash_embed, 512
+    )
+
+
+def test_mapped_index_overlays_writes(tmp_path) -> None:
+    index = _corpus_index(50)
+    mapped = open_snapshot(save_snapshot(index, tmp_path / "meds.idx", "sum"), "sum")
+    assert mapped is not None
+    first, second = index.ids[:2]
+
+    mapped.add([(first, "Zyrtec relieves hay fever")])
+    mapped.remove([second])
+
+    assert len(mapped) == 49
+    assert second not in mapped
+    assert mapped.get(first) == "Zyrtec relieves hay fever"
+    assert mapped.search("zyrtec hay fever", k=1)[0][0] == first
+    assert all(doc_id != second for doc_id, _ in mapped.search(second, k=49))
+    assert mapped.matrix.shape == (49, index.dim)
+
+
+def test_medication_index_reuses_snapshot_until_table_changes(tmp_path) -> None:
+    path = tmp_path / "meds.idx"
+    advil = _med("Advil", "ibuprofen")
+    tylenol = _med("Tylenol", "acetaminophen", 500, 0.1)
+
+    first = MedicationIndex()
+    first.load([advil, tylenol], snapshot=path)
+    assert first.stats()["last_load"]["source"] == "rebuilt"
+
+    second = MedicationIndex()
+    second.load([tylenol, advil], snapshot=path)
+    assert second.stats()["last_load"]["source"] == "snapshot"
+    assert isinstance(second.index, MappedIndex)
+    assert second.retrieve("how much does tylenol cost", k=1) == [medication_doc(tylenol)]
+
+    second.upsert(_med("Aleve", "naproxen", 220, 0.3))
+    assert len(second) == 3
+
+    tylenol.cost_usd = 0.12
+    third = MedicationIndex()
+    third.load([advil, tylenol], snapshot=path)
+    assert third.stats()["last_load"]["source"] == "rebuilt"
+    assert third.get(str(tylenol.id)) == medication_doc(tylenol)
+
+
+def test_empty_table_snapshot(tmp_path) -> None:
+    index = MedicationIndex()
+    index.load([], snapshot=tmp_path / "meds.idx")
+    index.load([], snapshot=tmp_path / "meds.idx")
+
+    assert index.stats() == {
+        "documents": 0,
+        "last_load": {**index.stats()["last_load"], "source": "snapshot"},
+    }
+    assert index.search("anything") == []
@@ -0,0 +1,141 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+from agents import sources
+from agents.ingest import LSHIndex, MinHasher, ingest, iter_chunks, load_index
+from agents.sources import gather_hits, label_source
+
+_BOILERPLATE = (
+    "Keep out of reach of children. In case of overdose, get medical help or contact "
+    "a Poison Control Center right away. Stop use and ask a doctor if symptoms last "
+    "more than ten days or redness or swelling is present. "
+)
+
+
+@pytest.fixture(autouse=True)
+def _reset_sources():
+    sources.reset_sources()
+    yield
+    sources.reset_sources()
+
+
+def _words(prefix: str, n: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n)) + ". "
+
+
+def test_chunks_are_byte_ranges_of_the_file() -> None:
+    data = ("naïve " + _words("dose", 400) + "\n" + _words("warning", 300)).encode()
+
+    chunks = list(iter_chunks(io.BytesIO(data), chunk_bytes=300, overlap=60))
+
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert len(chunk.text.encode()) <= 300
+        assert data[chunk.start : chunk.end].decode().strip() == chunk.text
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert prev.start < nxt.start < prev.end  # consecutive chunks overlap
+    assert chunks[-1].end == len(data)
+
+
+def test_minhash_flags_near_duplicates_only() -> None:
+    hasher = MinHasher()
+    lsh = LSHIndex()
+    lsh.add(hasher.signature(_BOILERPLATE * 3))
+
+    edited = (_BOILERPLATE * 3).replace("ten days", "7 days", 1)
+    assert lsh.is_duplicate(hasher.signature(edited))
+    assert not lsh.is_duplicate(hasher.signature(_words("ibuprofen", 80)))
+
+
+def test_ingest_drops_repeated_boilerplate(tmp_path) -> None:
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    for name in ("advil", "tylenol", "zyrtec"):
+        (labels / f"{name}.txt").write_text(_words(name, 150) + _BOILERPLATE * 4)
+
+    report = ingest([labels], tmp_path / "index", chunk_bytes=400, overlap=50)
+
+    assert report.ingested == 3
+    assert report.duplicates > 0
+    assert report.kept == report.chunks - report.duplicates
+    index = load_index(tmp_path / "index")
+    assert len(index) == report.kept
+    top_id, _ = index.search("tylenol3 tylenol4 tylenol5", k=1)[0]
+    assert "tylenol4" in index.get(top_id)
+
+
+def test_reingest_skips_unchanged_and_reuses_touched(tmp_path) -> None:
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    same, touched, edited = (labels / f"{n}.txt" for n in ("a", "b", "c"))
+    for path in (same, touched, edited):
+        path.write_text(_words(path.stem, 200))
+    ingest([labels], tmp_path / "index")
+
+    stat = touched.stat()
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    edited.write_text(_words("revised", 200))
+    report = ingest([labels], tmp_path / "index")
+
+    assert (report.skipped, report.reused, report.ingested) == (1, 1, 1)
+    assert report.bytes_read == edited.stat().st_size
+    shards = {p.name.split(".")[0] for p in (tmp_path / "index" / "shards").iterdir()}
+    assert len(shards) == 3  # the old version of c.txt was pruned
+
+    again = ingest([labels], tmp_path / "index")
+    assert (again.skipped, again.bytes_read) == (3, 0)
+
+
+def test_label_source_feeds_retrieval(tmp_path) -> None:
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    (labels / "zyrtec.txt").write_text("Zyrtec cetirizine relieves sneezing and itchy watery eyes. ")
+    ingest([labels], tmp_path / "index")
+
+    hits = asyncio.run(gather_hits("cetirizine for itchy eyes", [label_source(str(tmp_path / "index"))]))
+
+    assert hits and "cetirizine" in hits[0][1]
+
+
+def test_duplicates_are_found_across_files_and_runs(tmp_path) -> None:
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    (labels / "a.txt").write_text(_BOILERPLATE * 2)
+    (labels / "b.txt").write_text(_BOILERPLATE * 2 + "Store below 25 C.")
+
+    first = ingest([labels], tmp_path / "index", chunk_bytes=4096)
+
+    # One LSH index covers the whole run: b.txt repeats a.txt's only chunk.
+    assert (first.chunks, first.kept, first.duplicates) == (2, 1, 1)
+
+    # Later runs are checked against the chunks already in the store.
+    (labels / "c.txt").write_text("Warning: " + _BOILERPLATE * 2)
+    second = ingest([labels], tmp_path / "index", chunk_bytes=4096)
+    assert (second.ingested, second.kept, second.duplicates) == (1, 0, 1)
+    assert len(load_index(tmp_path / "index")) == 1
+
+
+def test_removing_a_file_restores_chunks_deduplicated_against_it(tmp_path) -> None:
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    a, b = labels / "a.txt", labels / "b.txt"
+    a.write_text(_BOILERPLATE * 2)
+    b.write_text(_BOILERPLATE * 2 + "Store below 25 C.")
+    first = ingest([labels], tmp_path / "index", chunk_bytes=4096)
+    assert (first.kept, first.duplicates) == (1, 1)
+
+    # b.txt is unchanged, but its chunk was only kept in a.txt's shard.
+    a.unlink()
+    second = ingest([labels], tmp_path / "index", chunk_bytes=4096)
+
+    assert (second.skipped, second.invalidated, second.ingested) == (0, 1, 1)
+    index = load_index(tmp_path / "index")
+    assert len(index) == 1
+    assert "Store below 25 C." in index.get(index.search("store below", k=1)[0][0])
+
+    # Nothing changed since: nothing is read again.
+    third = ingest([labels], tmp_path / "index", chunk_bytes=4096)
+    assert (third.skipped, third.invalidated, third.bytes_read) == (1, 0, 0)
@@ -0,0 +1,81 @@
+import time
+
+from agents import graph as agent_graph
+from agents.intent import CHAT, MED, IntentClassifier, IntentRouter, load_examples
+from agents.rag_utils import is_med_query
+
+
+def _route(text: str) -> str:
+    return agent_graph._route({"messages": [{"role": "user", "content": text}]})
+
+
+def test_examples_cover_both_labels() -> None:
+    labels = {label for _, label in load_examples()}
+    assert labels == {MED, CHAT}
+
+
+def test_classifier_learns_the_examples() -> None:
+    classifier = IntentClassifier().fit(
+        [
+            ("what dose of painkiller", MED),
+            ("which pill for a fever", MED),
+            ("tell me a joke", CHAT),
+            ("what is the weather", CHAT),
+        ]
+    )
+
+    label, margin = classifier.predict("which painkiller for a fever")
+    assert label == MED
+    assert 0 < margin <= 1
+    assert classifier.predict("tell me a weather joke")[0] == CHAT
+
+
+# Lines of intent_examples.txt the regex router got wrong. They are left out
+# of training below so the test measures generalisation, not recall.
+_HELD_OUT = {
+    # No drug name or pharmacy keyword: the regex sent these to chat.
+    "which pill helps with a fever": MED,
+    "what can I take for a headache": MED,
+    # Keyword false positive.
+    "help me name my drug-sniffing dog": CHAT,
+}
+
+
+def test_paraphrases_the_regex_missed() -> None:
+    examples = load_examples()
+    training = [(text, label) for text, label in examples if text not in _HELD_OUT]
+    assert len(training) == len(examples) - len(_HELD_OUT)
+    router = IntentRouter(IntentClassifier().fit(training))
+
+    for text, label in _HELD_OUT.items():
+        assert is_med_query(text) != (label == MED)
+        intent = router.classify(text)
+        assert (intent.label, intent.decided_by) == (label, "classifier")
+    # The app's router, trained on every example, also handles phrasings
+    # that appear nowhere in the file.
+    assert _route("what can I use to bring a fever down") == "rag_retrieve"
+    assert _route("hi, how are you today?") == "chatbot"
+
+
+def test_drug_names_and_low_confidence_fallback() -> None:
+    router = IntentRouter(min_margin=1.1)  # classifier never confident enough
+
+    assert router.classify("tell me about ibuprofen").decided_by == "drug_name"
+    fallback = router.classify("what is the usual dose")
+    assert fallback == (MED, fallback.confidence, "fallback")
+    assert router.classify("good morning").label == CHAT
+
+
+def test_routing_is_fast_and_counted() -> None:
+    router = IntentRouter()
+    router.get_classifier()
+
+    start = time.perf_counter()
+    for _ in range(100):
+        router.route("what should I cook for dinner tonight")
+    per_call = (time.perf_counter() - start) / 100
+
+    assert per_call < 0.001
+    stats = router.stats()
+    assert stats["routed"] == 100
+    assert sum(stats["decided_by"].values()) == 100
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.llm import Limiter, ProviderBusy, TokenBucket, provider_of
+
+
+def test_provider_of() -> None:
+    assert provider_of("openai:gpt-4o-mini") == "openai"
+    assert provider_of("gpt-4o-mini") == "default"
+
+
+def test_token_bucket_spaces_calls_after_burst() -> None:
+    now = [0.0]
+    bucket = TokenBucket(rate=2.0, burst=2, clock=lambda: now[0])
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+    now[0] += 1.0
+    assert bucket.reserve() == pytest.approx(0.0)
+
+
+def test_limiter_caps_concurrency_and_queues_fifo() -> None:
+    limiter = Limiter("test", max_concurrency=2, max_queue=10, queue_timeout=5, rate=0)
+    peak = 0
+    order: list[int] = []
+
+    async def call(i: int) -> None:
+        nonlocal peak
+        async with limiter.aslot():
+            peak = max(peak, limiter.stats()["in_flight"])
+            order.append(i)
+            await asyncio.sleep(0.02)
+
+    async def run() -> None:
+        await asyncio.gather(*(call(i) for i in range(6)))
+
+    asyncio.run(run())
+
+    assert peak == 2
+    assert order == list(range(6))
+    stats = limiter.stats()
+    assert stats["admitted"] == 6
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+    assert stats["peak_queued"] == 4
+
+
+def test_limiter_rejects_when_queue_is_full() -> None:
+    limiter = Limiter("test", max_concurrency=1, max_queue=1, queue_timeout=5, rate=0)
+
+    async def run() -> list[object]:
+        async def call() -> None:
+            async with limiter.aslot():
+                await asyncio.sleep(0.05)
+
+        return await asyncio.gather(*(call() for _ in range(3)), return_exceptions=True)
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+
+    assert sum(isinstance(r, ProviderBusy) for r in results) == 1
+    # The rejected call failed fast rather than waiting its turn.
+    assert time.perf_counter() - start < 1
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_limiter_times_out_queued_callers() -> None:
+    limiter = Limiter("test", max_concurrency=1, max_queue=5, queue_timeout=0.05, rate=0)
+    release = threading.Event()
+
+    def hold() -> None:
+        with limiter.slot():
+            release.wait(1)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    time.sleep(0.01)
+    try:
+        with pytest.raises(ProviderBusy):
+            with limiter.slot():
+                pass
+    finally:
+        release.set()
+        holder.join()
+
+    # The abandoned queue entry did not leak a slot.
+    with limiter.slot():
+        assert limiter.stats()["in_flight"] == 1
+    assert limiter.stats()["in_flight"] == 0
@@ -0,0 +1,85 @@
+import threading
+import uuid
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from agents.med_index import MedicationIndex, medication_doc
+from agents.vector_index import VectorIndex, hash_embed
+from app.models import Medication
+
+
+def _med(brand: str, generic: str, dose_mg: int = 200, cost_usd: float = 0.25) -> Medication:
+    return Medication(
+        id=uuid.uuid4(),
+        brand_name=brand,
+        generic=generic,
+        dose_mg=dose_mg,
+        cost_usd=cost_usd,
+    )
+
+
+def test_medication_doc_mentions_all_fields() -> None:
+    doc = medication_doc(_med("Advil", "ibuprofen", 200, 0.25))
+    assert "Advil" in doc
+    assert "ibuprofen" in doc
+    assert "200 mg" in doc
+    assert "$0.25" in doc
+
+
+def test_load_and_retrieve() -> None:
+    advil = _med("Advil", "ibuprofen")
+    tylenol = _med("Tylenol", "acetaminophen", 500, 0.1)
+    index = MedicationIndex()
+    index.load([advil, tylenol])
+
+    assert len(index) == 2
+    assert index.retrieve("how much does tylenol cost", k=1) == [medication_doc(tylenol)]
+
+
+def test_upsert_and_remove_touch_single_entry() -> None:
+    advil = _med("Advil", "ibuprofen")
+    tylenol = _med("Tylenol", "acetaminophen", 500, 0.1)
+    index = MedicationIndex()
+    index.load([advil, tylenol])
+    tylenol_row = index.index.matrix[index.index.ids.index(str(tylenol.id))].copy()
+
+    advil.dose_mg = 400
+    index.upsert(advil)
+    assert len(index) == 2
+    assert index.index.get(str(advil.id)) == medication_doc(advil)
+    # Untouched rows keep their existing vectors.
+    assert (index.index.matrix[index.index.ids.index(str(tylenol.id))] == tylenol_row).all()
+
+    aleve = _med("Aleve", "naproxen", 220, 0.3)
+    index.upsert(aleve)
+    assert len(index) == 3
+
+    index.remove(advil.id)
+    assert len(index) == 2
+    assert medication_doc(advil) not in index.retrieve("advil ibuprofen", k=3)
+
+
+def test_searches_do_not_wait_for_each_other() -> None:
+    searching = threading.Event()
+    # Each query embedding waits for a second one; serialised searches would
+    # break the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def embed(texts: Sequence[str]) -> np.ndarray:
+        if searching.is_set():
+            barrier.wait()
+        return hash_embed(texts)
+
+    advil = _med("Advil", "ibuprofen")
+    tylenol = _med("Tylenol", "acetaminophen", 500, 0.1)
+    index = MedicationIndex(VectorIndex(embed=embed))
+    index.load([advil, tylenol])
+    searching.set()
+
+    with ThreadPoolExecutor(2) as pool:
+        hits = list(pool.map(lambda q: index.search(q, k=1), ["advil", "tylenol"]))
+
+    assert hits[0][0][0] == str(advil.id)
+    assert hits[1][0][0] == str(tylenol.id)
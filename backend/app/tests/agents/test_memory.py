@@ -0,0 +1,78 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agents.context import count_tokens
+from agents.memory import open_checkpointer, trim_history
+
+
+def _conversation(turns: int) -> list:
+    messages: list = [SystemMessage(content="You are helpful.")]
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question number {i} about dosing"))
+        messages.append(AIMessage(content=f"answer number {i} " + "words " * 20))
+    messages.append(HumanMessage(content="latest question"))
+    return messages
+
+
+def test_trim_history_bounds_tokens_and_keeps_latest() -> None:
+    messages = _conversation(50)
+    trimmed = trim_history(messages, max_tokens=200)
+
+    assert trimmed[0] == messages[0]
+    assert trimmed[-1] == messages[-1]
+    assert isinstance(trimmed[1], HumanMessage)
+    assert len(trimmed) < len(messages)
+    assert sum(count_tokens(str(m.content)) + 4 for m in trimmed) <= 200
+
+
+def test_trim_history_keeps_short_conversations() -> None:
+    messages = _conversation(1)
+    assert trim_history(messages, max_tokens=10_000) == messages
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_open_checkpointer_persists_threads(kind: str, tmp_path: Path) -> None:
+    from langgraph.graph import START, MessagesState, StateGraph
+
+    url = "memory" if kind == "memory" else f"sqlite:///{tmp_path / 'threads.sqlite'}"
+    builder = StateGraph(MessagesState)
+    builder.add_node("echo", lambda s: {"messages": [AIMessage(content=str(len(s["messages"])))]})
+    builder.add_edge(START, "echo")
+
+    async def run() -> list:
+        async with open_checkpointer(url) as saver:
+            graph = builder.compile(checkpointer=saver)
+            config = {"configurable": {"thread_id": "t1"}}
+            await graph.ainvoke({"messages": [HumanMessage(content="a")]}, config)
+            result = await graph.ainvoke({"messages": [HumanMessage(content="b")]}, config)
+            return result["messages"]
+
+    messages = asyncio.run(run())
+    assert [m.content for m in messages] == ["a", "1", "b", "3"]
+
+
+def test_open_checkpointer_rejects_unknown_url() -> None:
+    async def run() -> None:
+        async with open_checkpointer("redis://localhost"):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_trim_history_cuts_an_oversized_latest_message() -> None:
+    messages = _conversation(3)
+    messages[-1] = HumanMessage(content="dose " * 3000 + "of ibuprofen?")
+    trimmed = trim_history(messages, max_tokens=200)
+
+    assert trimmed[0] == messages[0]
+    assert len(trimmed) == 2
+    assert isinstance(trimmed[1], HumanMessage)
+    assert messages[-1].content.startswith(trimmed[1].content)
+    assert 0 < sum(count_tokens(str(m.content)) + 4 for m in trimmed) <= 200
+
+    # Even a system prompt over the budget leaves room for the question.
+    assert trim_history([SystemMessage(content="rule " * 500), messages[-1]], max_tokens=50)[-1].content
@@ -0,0 +1,91 @@
+import asyncio
+
+from agents.singleflight import SingleFlight
+
+
+async def _collect(flight) -> list[str]:
+    return [item async for item in flight]
+
+
+def test_concurrent_joiners_share_one_producer() -> None:
+    starts = 0
+
+    async def produce():
+        nonlocal starts
+        starts += 1
+        for token in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def run():
+        sf: SingleFlight[str] = SingleFlight()
+        first = sf.join("q", produce)
+        await asyncio.sleep(0.015)  # join after the first token went out
+        second = sf.join("q", produce)
+        results = await asyncio.gather(_collect(first), _collect(second))
+        return sf, first, second, results
+
+    sf, first, second, results = asyncio.run(run())
+
+    assert starts == 1
+    assert results == [["a", "b", "c"], ["a", "b", "c"]]
+    assert first.leader and not second.leader
+    assert len(sf) == 0
+    assert sf.stats()["followers"] == 1
+
+
+def test_errors_reach_every_subscriber() -> None:
+    async def produce():
+        yield "a"
+        raise RuntimeError("provider down")
+
+    async def run():
+        sf: SingleFlight[str] = SingleFlight()
+        flights = [sf.join("q", produce) for _ in range(2)]
+        return await asyncio.gather(*(_collect(f) for f in flights), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_producer_is_cancelled_when_everyone_leaves() -> None:
+    async def run():
+        stopped = asyncio.Event()
+
+        async def produce():
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield "tick"
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        sf: SingleFlight[str] = SingleFlight()
+        stream = sf.join("q", produce).__aiter__()
+        assert await stream.__anext__() == "tick"
+        await stream.aclose()
+        await asyncio.wait_for(stopped.wait(), timeout=1)
+        return sf
+
+    sf = asyncio.run(run())
+
+    assert len(sf) == 0
+
+
+def test_different_keys_do_not_coalesce() -> None:
+    starts = 0
+
+    async def produce():
+        nonlocal starts
+        starts += 1
+        yield "x"
+
+    async def run():
+        sf: SingleFlight[str] = SingleFlight()
+        await asyncio.gather(*(_collect(sf.join(k, produce)) for k in ("a", "b")))
+
+    asyncio.run(run())
+
+    assert starts == 2
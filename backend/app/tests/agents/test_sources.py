@@ -0,0 +1,139 @@
+import asyncio
+import json
+import sys
+import time
+import types
+
+import pytest
+
+from agents import graph as agent_graph
+from agents import sources
+from agents.sources import Source, gather_hits, merge_hits, retrieve_hits
+
+
+@pytest.fixture(autouse=True)
+def _reset_sources():
+    sources.reset_sources()
+    yield
+    sources.reset_sources()
+
+
+def _slow(name: str, delay: float, hits):
+    async def fetch(question: str):
+        await asyncio.sleep(delay)
+        return hits
+
+    return Source(name, fetch)
+
+
+def test_merge_interleaves_sources_and_drops_duplicates() -> None:
+    a = Source("a", lambda q: [])
+    b = Source("b", lambda q: [])
+    merged = merge_hits(
+        [
+            (a, [("x", "X doc"), ("y", "Y doc"), ("z", "Z doc")]),
+            (b, [("p", "P doc"), ("y", "Y doc"), ("q", "x  DOC")]),
+        ]
+    )
+
+    ids = [doc_id for doc_id, _ in merged]
+    # "q" repeats x's text, so x and y were both found twice and lead.
+    assert ids == ["x", "y", "p", "z"]
+
+
+def test_weight_favours_a_source() -> None:
+    a = Source("a", lambda q: [], weight=1.0)
+    b = Source("b", lambda q: [], weight=2.0)
+
+    merged = merge_hits([(a, [("x", "X")]), (b, [("p", "P")])])
+
+    assert [doc_id for doc_id, _ in merged] == ["p", "x"]
+
+
+def test_sources_run_concurrently() -> None:
+    chosen = [
+        _slow("one", 0.1, [("1", "one")]),
+        _slow("two", 0.1, [("2", "two")]),
+        _slow("three", 0.1, [("3", "three")]),
+    ]
+
+    start = time.perf_counter()
+    hits = asyncio.run(gather_hits("q", chosen))
+    elapsed = time.perf_counter() - start
+
+    assert {doc_id for doc_id, _ in hits} == {"1", "2", "3"}
+    assert elapsed < 0.25
+
+
+def test_slow_or_failing_source_is_skipped() -> None:
+    def broken(question: str):
+        raise RuntimeError("db down")
+
+    slow = _slow("slow", 1.0, [("late", "late")])
+    slow.timeout = 0.05
+    chosen = [slow, Source("broken", broken), Source("ok", lambda q: [("a", "A")])]
+
+    start = time.perf_counter()
+    hits = retrieve_hits("q", chosen)
+
+    assert hits == [("a", "A")]
+    assert time.perf_counter() - start < 0.5
+    failures = sources._stats()["failures"]
+    assert failures["slow"] == {"timeouts": 1}
+    assert failures["broken"] == {"errors": 1}
+
+
+def test_registered_source_reaches_the_answer_context() -> None:
+    sources.register_source(
+        Source("patient_meds", lambda q: [("patient:1", "Patient Alice Smith takes Advil.")])
+    )
+
+    update = agent_graph.rag_retrieve({"messages": [{"role": "user", "content": "aspirin dose"}]})
+    aupdate = asyncio.run(
+        agent_graph.arag_retrieve({"messages": [{"role": "user", "content": "aspirin dose"}]})
+    )
+
+    assert update == aupdate
+    assert "aspirin" in update["context_doc_ids"]
+    assert "patient:1" in update["context_doc_ids"]
+    assert "Alice Smith" in update["context"]
+
+
+def test_patient_names_matched_by_word() -> None:
+    patients = [{"id": "p1", "name": "Alice Smith"}, {"id": "p2", "name": "Bob Johnson"}]
+
+    assert sources._patient_names_in("What does alice take?", patients) == [patients[0]]
+    assert sources._patient_names_in("Any dose advice?", patients) == []
+
+
+def test_mcp_patient_source_asks_for_one_page_of_the_users_patients(monkeypatch) -> None:
+    calls = []
+
+    class Client:
+        def __init__(self, url):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return None
+
+        async def call_tool(self, tool, arguments):
+            calls.append((tool, arguments))
+            return [types.SimpleNamespace(text=json.dumps([{"id": "p1", "name": "Alice Smith"}]))]
+
+    monkeypatch.setitem(sys.modules, "fastmcp", types.SimpleNamespace(Client=Client))
+    source = sources.mcp_patient_source("http://mcp.test/mcp", limit=10)
+
+    # No signed-in user: the server is not asked at all.
+    assert retrieve_hits("what does alice take", [source], reorder=False) == []
+    assert calls == []
+
+    token = sources.current_user_id.set("u1")
+    try:
+        hits = retrieve_hits("what does alice take", [source], reorder=False)
+    finally:
+        sources.current_user_id.reset(token)
+    assert [doc_id for doc_id, _ in hits] == ["mcp-patient:p1"]
+    assert calls == [("list_patients", {"owner_id": "u1", "limit": 10})]
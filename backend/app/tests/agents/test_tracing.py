@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+import agents.graph as agent_graph
+from agents import memory
+from agents.context import count_tokens
+from agents.state import add_usage
+from agents.tracing import Tracer
+
+
+def _reply(content: str, **kwargs) -> dict:
+    return {"messages": [AIMessage(content=content, **kwargs)]}
+
+
+def test_wrap_records_time_tokens_and_docs(caplog: pytest.LogCaptureFixture) -> None:
+    tracer = Tracer()
+    retrieve = tracer.wrap("retrieve", lambda state: {"context_doc_ids": ["1", "2"]})
+    answer = tracer.wrap(
+        "answer",
+        lambda state: _reply(
+            "sync",
+            usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15},
+        ),
+    )
+
+    with caplog.at_level(logging.INFO, logger="agents.trace"):
+        retrieve.invoke({"messages": []}, {"configurable": {"thread_id": "t1"}})
+        update = answer.invoke({"messages": [HumanMessage(content="hi")]})
+
+    assert update["usage"] == {"prompt_tokens": 12, "completion_tokens": 3}
+    stats = tracer.stats()["nodes"]
+    assert stats["retrieve"]["docs"] == 2
+    assert stats["answer"]["prompt_tokens"] == 12
+    assert stats["answer"]["calls"] == 1
+    event = json.loads(caplog.records[0].getMessage())
+    assert event["node"] == "retrieve"
+    assert event["docs"] == 2
+    assert event["thread_id"] == "t1"
+
+
+def test_async_variant_estimates_missing_usage_and_skips_cache_hits() -> None:
+    tracer = Tracer()
+
+    async def answer(state):
+        return _reply("two words")
+
+    async def cached(state):
+        return _reply("from cache", response_metadata={"answer_cache": "hit"})
+
+    state = {"messages": [HumanMessage(content="how much is aspirin")]}
+    estimated = asyncio.run(tracer.wrap("answer", lambda s: None, answer).ainvoke(state))
+    hit = asyncio.run(tracer.wrap("cached", lambda s: None, cached).ainvoke(state))
+
+    assert estimated["usage"]["completion_tokens"] > 0
+    assert estimated["usage"]["prompt_tokens"] > 0
+    assert "usage" not in hit
+
+
+def test_estimate_counts_the_prompt_the_node_sent() -> None:
+    tracer = Tracer()
+    history = [HumanMessage(content=f"earlier question number {i}") for i in range(50)]
+    sent = history[-2:]
+
+    def answer(state):
+        tracer.note_prompt(sent)
+        return _reply("two words")
+
+    update = tracer.wrap("answer", answer).invoke({"messages": history})
+
+    assert update["usage"]["prompt_tokens"] == sum(count_tokens(m.content) for m in sent)
+
+
+def test_chatbot_estimate_follows_the_trimmed_history(monkeypatch: pytest.MonkeyPatch) -> None:
+    # No usage_metadata, so the tracer has to estimate the prompt.
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="fine")]))
+    monkeypatch.setattr(agent_graph, "llm", model)
+    monkeypatch.setattr(memory, "AGENT_HISTORY_TOKENS", 40)
+    history = [HumanMessage(content="tell me about dosing " * 10) for _ in range(20)]
+    history.append(HumanMessage(content="latest question"))
+
+    update = Tracer().wrap("chatbot", agent_graph.chatbot).invoke({"messages": history})
+
+    sent = memory.trim_history(history)
+    assert update["usage"]["prompt_tokens"] == sum(count_tokens(m.content) for m in sent)
+    assert update["usage"]["prompt_tokens"] <= 40
+
+
+def test_errors_are_counted() -> None:
+    tracer = Tracer()
+
+    def boom(state):
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        tracer.wrap("boom", boom).invoke({})
+
+    assert tracer.stats()["nodes"]["boom"]["errors"] == 1
+
+
+def test_add_usage_sums() -> None:
+    assert add_usage({"prompt_tokens": 1}, {"prompt_tokens": 2, "completion_tokens": 3}) == {
+        "prompt_tokens": 3,
+        "completion_tokens": 3,
+    }
+    assert add_usage(None, None) == {}
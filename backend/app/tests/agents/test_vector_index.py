@@ -0,0 +1,80 @@
+import numpy as np
+
+from agents import rag_utils
+from agents.rag_utils import MED_CORPUS, retrieve_med_docs
+from agents.vector_index import VectorIndex, hash_embed, top_k
+
+
+def _index() -> VectorIndex:
+    index = VectorIndex()
+    index.add(MED_CORPUS.items())
+    return index
+
+
+def test_hash_embed_is_deterministic_and_normalised() -> None:
+    a = hash_embed(["Ibuprofen 200 mg tablet", "aspirin"])
+    b = hash_embed(["Ibuprofen 200 mg tablet", "aspirin"])
+    assert np.array_equal(a, b)
+    assert np.allclose(np.linalg.norm(a, axis=1), 1.0, atol=1e-5)
+
+
+def test_top_k_orders_and_thresholds() -> None:
+    scores = np.array([[0.1, 0.9, 0.5, 0.3]], dtype=np.float32)
+    assert [i for i, _ in top_k(scores, 2)[0]] == [1, 2]
+    assert [i for i, _ in top_k(scores, 10, threshold=0.4)[0]] == [1, 2]
+
+
+def test_search_ranks_matching_drug_first() -> None:
+    index = _index()
+    hits = index.search("what color is ibuprofen", k=3)
+    assert hits[0][0] == "ibuprofen"
+    assert len(hits) == 3
+
+
+def test_search_batch_matches_single_queries() -> None:
+    index = _index()
+    queries = ["aspirin", "paracetamol liver"]
+    batch = index.search_batch(queries, k=1)
+    assert [hits[0][0] for hits in batch] == ["aspirin", "acetaminophen"]
+    for hits, query in zip(batch, queries):
+        (doc_id, score), = index.search(query, k=1)
+        assert hits[0][0] == doc_id
+        assert abs(hits[0][1] - score) < 1e-5
+
+
+def test_add_replaces_and_remove_drops() -> None:
+    index = _index()
+    index.add([("ibuprofen", "Ibuprofen is now documented as purple.")])
+    assert len(index) == 3
+    assert index.get("ibuprofen") == "Ibuprofen is now documented as purple."
+
+    index.remove(["aspirin", "missing"])
+    assert len(index) == 2
+    assert "aspirin" not in index
+    assert all(doc_id != "aspirin" for doc_id, _ in index.search("aspirin", k=5))
+    assert index.matrix.shape == (2, index.dim)
+
+
+def test_retrieve_med_docs_caps_results() -> None:
+    rag_utils.set_retriever(None)
+    docs = retrieve_med_docs("what color is ibuprofen", k=1)
+    assert docs == [MED_CORPUS["ibuprofen"]]
+    # Off-topic questions no longer pull in the whole corpus.
+    assert retrieve_med_docs("what is the weather today") == []
+
+
+def test_set_retriever_swaps_backend() -> None:
+    class Stub:
+        def get(self, doc_id: str) -> str | None:
+            return f"stub:{doc_id}"
+
+        def search(
+            self, query: str, k: int = 3, threshold: float | None = None
+        ) -> list[tuple[str, float]]:
+            return [(query, 1.0)]
+
+    rag_utils.set_retriever(Stub())
+    try:
+        assert retrieve_med_docs("anything") == ["stub:anything"]
+    finally:
+        rag_utils.set_retriever(None)
@@ -0,0 +1,548 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from sqlmodel import Session
+
+import agents.graph as agent_graph
+from agents import rag_utils
+from agents.answer_cache import answer_cache
+from agents.fake_llm import FakeStreamingChatModel
+from agents.fast_path import fast_path
+from agents.llm import Limiter
+from agents.med_index import MedicationIndex
+from agents.rag_utils import extract_text
+from agents.sources import Source, register_source, unregister_source
+from app.api.routes import agent as agent_route
+from app.core.config import settings
+from app.core.db import patient_medication_hits
+from app.models import Medication, User
+from app.tests.utils.patient import create_random_patient
+from app.tests.utils.user import authentication_token_from_email
+
+
+@pytest.fixture(autouse=True)
+def _clear_answer_cache() -> None:
+    answer_cache.clear()
+
+
+def _fake_llm(*replies: str) -> GenericFakeChatModel:
+    return GenericFakeChatModel(messages=iter([AIMessage(content=r) for r in replies]))
+
+
+class _RecordingFakeChatModel(BaseChatModel):
+    """Fake model that echoes how many messages it was given."""
+
+    calls: list[list[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-fake"
+
+    def _generate(self, messages: list[BaseMessage], *_: Any, **__: Any) -> ChatResult:
+        self.calls.append(list(messages))
+        reply = AIMessage(content=f"seen {len(messages)}")
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+
+class _SlowFakeChatModel(BaseChatModel):
+    """Fake model that takes `delay` seconds per call, like a provider round trip."""
+
+    delay: float = 0.5
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _result(self) -> ChatResult:
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+    def _generate(self, messages: list[BaseMessage], *_: Any, **__: Any) -> ChatResult:
+        time.sleep(self.delay)
+        return self._result()
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], *_: Any, **__: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return self._result()
+
+
+class _DrippingFakeChatModel(BaseChatModel):
+    """Fake model streaming one token every `interval` seconds, for `tokens` tokens.
+
+    `events` records each produced token and whether the stream was cancelled.
+    """
+
+    interval: float = 0.05
+    tokens: int = 200
+    events: list[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "dripping-fake"
+
+    def _generate(self, messages: list[BaseMessage], *_: Any, **__: Any) -> ChatResult:
+        reply = AIMessage(content="tok " * self.tokens)
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+    async def _astream(self, messages: list[BaseMessage], *_: Any, **__: Any):
+        try:
+            for _ in range(self.tokens):
+                await asyncio.sleep(self.interval)
+                self.events.append("token")
+                yield ChatGenerationChunk(message=AIMessageChunk(content="tok "))
+        except asyncio.CancelledError:
+            self.events.append("cancelled")
+            raise
+
+
+class _FailingFakeChatModel(BaseChatModel):
+    """Fake model that streams a few tokens and then raises, like a dropped provider connection."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "failing-fake"
+
+    def _generate(self, messages: list[BaseMessage], *_: Any, **__: Any) -> ChatResult:
+        raise RuntimeError("provider connection reset")
+
+    async def _astream(self, messages: list[BaseMessage], *_: Any, **__: Any):
+        for token in ("Take ", "two "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        raise RuntimeError("provider connection reset")
+
+
+def _read_chunks(body: str) -> list[dict]:
+    return [json.loads(line) for line in body.splitlines() if line]
+
+
+def test_chat_streams_model_tokens(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(agent_graph, "llm", _fake_llm("Hello there, how can I help?"))
+
+    r = client.post(
+        f"{settings.API_V1_STR}/chat/",
+        json={"messages": [{"role": "user", "content": "hi"}]},
+    )
+
+    assert r.status_code == 200
+    assert r.headers["x-vercel-ai-data-stream"] == "v1"
+    chunks = _read_chunks(r.text)
+    deltas = [c["value"] for c in chunks if c["type"] == "0"]
+    # Tokens are forwarded as the model yields them, not one per character.
+    assert 1 < len(deltas) < len("Hello there, how can I help?")
+    assert "".join(deltas) == "Hello there, how can I help?"
+    assert chunks[-1]["type"] == "d"
+    assert chunks[-1]["value"]["finishReason"] == "stop"
+
+
+def test_chat_streams_rag_answer(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(agent_graph, "llm", _fake_llm("Ibuprofen is grey."))
+
+    r = client.post(
+        f"{settings.API_V1_STR}/chat/",
+        json={"messages": [{"role": "user", "content": "what color is ibuprofen"}]},
+    )
+
+    assert r.status_code == 200
+    deltas = [c["value"] for c in _read_chunks(r.text) if c["type"] == "0"]
+    assert "".join(deltas) == "Ibuprofen is grey."
+
+
+def test_chat_streams_fast_path_answer(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    index = MedicationIndex()
+    index.load(
+        [Medication(id=uuid.uuid4(), brand_name="Advil", generic="ibuprofen", dose_mg=200, cost_usd=0.25)]
+    )
+    monkeypatch.setattr(fast_path, "index", index)
+    monkeypatch.setattr(rag_utils, "_matcher", index.matcher)
+    model = _SlowFakeChatModel(delay=0)
+    monkeypatch.setattr(agent_graph, "llm", model)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/chat/",
+        json={"messages": [{"role": "user", "content": "How much does Advil cost?"}]},
+    )
+
+    chunks = _read_chunks(r.text)
+    deltas = [c["value"] for c in chunks if c["type"] == "0"]
+    assert "".join(deltas) == "Advil (ibuprofen) costs $0.25 per dose."
+    assert chunks[-1]["value"]["usage"]["completionTokens"] == 0
+    assert model.calls == 0
+
+
+def test_chat_requests_run_concurrently(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    delay = 0.5
+    n_requests = 5
+    monkeypatch.setattr(agent_graph, "llm", _SlowFakeChatModel(delay=delay))
+
+    def ask(i: int) -> int:
+        r = client.post(
+            f"{settings.API_V1_STR}/chat/",
+            json={"messages": [{"role": "user", "content": f"hello {i}"}]},
+        )
+        return r.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_requests) as pool:
+        statuses = list(pool.map(ask, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    assert statuses == [200] * n_requests
+    # All requests share one event loop; serialised they would need
+    # n_requests * delay seconds.
+    assert elapsed < delay * n_requests / 2
+
+
+def test_identical_concurrent_questions_share_one_run(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    n_requests = 5
+    model = _SlowFakeChatModel(delay=0.5)
+    monkeypatch.setattr(agent_graph, "llm", model)
+
+    def ask(_: int) -> tuple[str, str]:
+        r = client.post(
+            f"{settings.API_V1_STR}/chat/",
+            json={
+                "threadId": str(uuid.uuid4()),
+                "messages": [{"role": "user", "content": "Hello there!"}],
+            },
+        )
+        deltas = [c["value"] for c in _read_chunks(r.text) if c["type"] == "0"]
+        return r.headers["x-thread-id"], "".join(deltas)
+
+    with ThreadPoolExecutor(max_workers=n_requests) as pool:
+        results = list(pool.map(ask, range(n_requests)))
+
+    assert model.calls == 1
+    assert [answer for _, answer in results] == ["ok"] * n_requests
+    assert len({thread for thread, _ in results}) == n_requests
+
+
+def test_similar_concurrent_questions_do_not_share_a_run(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    model = _SlowFakeChatModel(delay=0.5)
+    monkeypatch.setattr(agent_graph, "llm", model)
+    questions = [
+        "When should I take aspirin?",
+        "Why should I take aspirin?",
+        "  when should I take ASPIRIN?",  # the same as the first
+    ]
+
+    def ask(question: str) -> int:
+        r = client.post(
+            f"{settings.API_V1_STR}/chat/",
+            json={"messages": [{"role": "user", "content": question}]},
+        )
+        return r.status_code
+
+    with ThreadPoolExecutor(max_workers=len(questions)) as pool:
+        assert list(pool.map(ask, questions)) == [200] * len(questions)
+
+    assert model.calls == 2
+
+
+def test_chat_rejects_with_429_when_provider_is_saturated(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    model = _RecordingFakeChatModel(calls=[])
+    monkeypatch.setattr(agent_graph, "llm", model)
+    saturated = Limiter("test", max_concurrency=0, max_queue=0, queue_timeout=3)
+    monkeypatch.setattr(agent_route, "get_limiter", lambda: saturated)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/chat/",
+        json={"messages": [{"role": "user", "content": "hi"}]},
+    )
+
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "3"
+    assert model.calls == []
+
+
+def test_client_disconnect_cancels_generation(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    model = _DrippingFakeChatModel(events=[])
+    monkeypatch.setattr(agent_graph, "llm", model)
+    body = json.dumps({"messages": [{"role": "user", "content": "tell me a story"}]})
+    scope = {
+        "type": "http",
+        # ASGI 2.4 servers no longer report disconnects to streaming
+        # responses; the route has to notice on its own.
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": f"{settings.API_V1_STR}/chat/",
+        "raw_path": f"{settings.API_V1_STR}/chat/".encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("testclient", 123),
+        "server": ("testserver", 80),
+        "state": {},
+    }
+
+    async def run() -> float:
+        gone = asyncio.Event()
+        request_sent = False
+        disconnected_at = 0.0
+
+        async def receive() -> dict[str, Any]:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body.encode(), "more_body": False}
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict[str, Any]) -> None:
+            nonlocal disconnected_at
+            if message["type"] == "http.response.body" and message.get("body"):
+                if not gone.is_set():
+                    # The browser closes the tab after the first token.
+                    disconnected_at = time.perf_counter()
+                    gone.set()
+
+        await asyncio.wait_for(client.app(scope, receive, send), timeout=5)
+        return time.perf_counter() - disconnected_at
+
+    elapsed = asyncio.run(run())
+
+    assert "cancelled" in model.events
+    assert elapsed < 1.0
+    # Generation stopped shortly after the disconnect, long before the
+    # model would have finished on its own.
+    assert model.events.count("token") < 10
+
+
+def test_model_failure_mid_stream_ends_with_an_error_chunk(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(agent_graph, "llm", _FailingFakeChatModel())
+
+    r = client.post(
+        f"{settings.API_V1_STR}/chat/",
+        json={"messages": [{"role": "user", "content": "tell me a story"}]},
+    )
+
+    assert r.status_code == 200
+    chunks = _read_chunks(r.text)
+    # The stream ends with an error instead of being cut off mid-response;
+    # the provider's message is not passed on to the client.
+    assert chunks[-1]["type"] == "3"
+    assert "connection reset" not in chunks[-1]["value"]
+    assert all(c["type"] != "d" for c in chunks)
+
+
+def test_graph_ainvoke_awaits_model(monkeypatch: pytest.MonkeyPatch) -> None:
+    delay = 0.3
+    n_calls = 4
+    monkeypatch.setattr(agent_graph, "llm", _SlowFakeChatModel(delay=delay))
+
+    async def run() -> list[Any]:
+        return await asyncio.gather(
+            *(
+                agent_graph.graph.ainvoke(
+                    {"messages": [{"role": "user", "content": "what dose of aspirin"}]}
+                )
+                for _ in range(n_calls)
+            )
+        )
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert all(r["messages"][-1].content == "ok" for r in results)
+    assert elapsed < delay * n_calls / 2
+
+
+def test_chat_thread_history_is_kept_server_side(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    superuser_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    model = _RecordingFakeChatModel(calls=[])
+    monkeypatch.setattr(agent_graph, "llm", model)
+
+    def ask(question: str, headers: dict[str, str], thread_id: str | None = None):
+        body = {"messages": [{"role": "user", "content": question}]}
+        if thread_id:
+            body["threadId"] = thread_id
+        r = client.post(f"{settings.API_V1_STR}/chat/", headers=headers, json=body)
+        assert r.status_code == 200
+        return r
+
+    r = ask("hi, I'm Sam", normal_user_token_headers)
+    thread_id = r.headers["x-thread-id"]
+
+    # The client only sends the newest message; the server supplies the rest.
+    r = ask("who am I?", normal_user_token_headers, thread_id)
+    assert r.headers["x-thread-id"] == thread_id
+    assert [m.content for m in model.calls[-1]] == ["hi, I'm Sam", "seen 1", "who am I?"]
+
+    # A different thread starts from scratch.
+    ask("who am I?", normal_user_token_headers, f"{thread_id}-other")
+    assert [m.content for m in model.calls[-1]] == ["who am I?"]
+
+    # So does the same thread id used by anyone else.
+    for headers in (superuser_token_headers, {}):
+        ask("who am I?", headers, thread_id)
+        assert [m.content for m in model.calls[-1]] == ["who am I?"]
+
+
+def test_anonymous_one_shot_chat_keeps_no_history(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(agent_graph, "llm", _fake_llm("Hello!"))
+    checkpointer = client.app.state.chat_graph.checkpointer
+    before = sum(1 for _ in checkpointer.list(None))
+
+    r = client.post(
+        f"{settings.API_V1_STR}/chat/",
+        json={"messages": [{"role": "user", "content": "hi"}]},
+    )
+
+    assert r.status_code == 200
+    assert "x-thread-id" not in r.headers
+    assert sum(1 for _ in checkpointer.list(None)) == before
+
+
+def test_patient_records_only_reach_their_owner(
+    client: TestClient, db: Session, normal_user_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    patient = create_random_patient(db)
+    owner = db.get(User, patient.owner_id)
+    owner_headers = authentication_token_from_email(client=client, email=owner.email, db=db)
+    register_source(Source("patient_meds", patient_medication_hits))
+    model = _RecordingFakeChatModel(calls=[])
+    monkeypatch.setattr(agent_graph, "llm", model)
+    question = f"what medications does {patient.first_name} take"
+
+    def prompt_for(headers: dict[str, str]) -> str:
+        answer_cache.clear()  # every call must reach the model
+        r = client.post(
+            f"{settings.API_V1_STR}/chat/",
+            headers=headers,
+            json={"messages": [{"role": "user", "content": question}]},
+        )
+        assert r.status_code == 200
+        return extract_text(model.calls[-1][-1])
+
+    try:
+        assert patient.last_name in prompt_for(owner_headers)
+        # Another user, or nobody, asking for the same name gets nothing.
+        assert patient.last_name not in prompt_for(normal_user_token_headers)
+        assert patient.last_name not in prompt_for({})
+    finally:
+        unregister_source("patient_meds")
+
+
+def test_rag_answers_are_cached(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    model = _RecordingFakeChatModel(calls=[])
+    monkeypatch.setattr(agent_graph, "llm", model)
+
+    for question in ["Max dose of ibuprofen?", "ibuprofen maximum dose"]:
+        r = client.post(
+            f"{settings.API_V1_STR}/chat/",
+            json={"messages": [{"role": "user", "content": question}]},
+        )
+        assert r.status_code == 200
+        deltas = [c["value"] for c in _read_chunks(r.text) if c["type"] == "0"]
+        assert "".join(deltas) == "seen 1"
+
+    assert len(model.calls) == 1
+
+    r = client.get(f"{settings.API_V1_STR}/chat/metrics", headers=superuser_token_headers)
+    assert r.status_code == 200
+    stats = r.json()["answer_cache"]
+    assert stats["hits"] >= 1
+    assert stats["misses"] >= 1
+
+
+def test_finish_chunk_reports_usage_and_nodes_are_traced(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(agent_graph, "llm", FakeStreamingChatModel(max_tokens=5))
+
+    r = client.post(
+        f"{settings.API_V1_STR}/chat/",
+        json={"messages": [{"role": "user", "content": "what dose of aspirin for pain"}]},
+    )
+
+    assert r.status_code == 200
+    usage = _read_chunks(r.text)[-1]["value"]["usage"]
+    assert usage["promptTokens"] > 0
+    assert usage["completionTokens"] > 0
+
+    r = client.get(f"{settings.API_V1_STR}/chat/metrics", headers=superuser_token_headers)
+    traced = r.json()["nodes"]
+    assert traced["routes"]["rag_retrieve"] >= 1
+    assert traced["nodes"]["rag_retrieve"]["docs"] >= 1
+    assert traced["nodes"]["rag_answer"]["completion_tokens"] > 0
+    assert traced["nodes"]["model"]["calls"] >= 1
+
+
+def test_chat_metrics_requires_superuser(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/chat/metrics")
+    assert r.status_code == 401
+
+
+def test_importing_app_does_not_build_agent() -> None:
+    probe = (
+        "import sys, app.main; "
+        "assert 'agents.graph' not in sys.modules; "
+        "assert 'langchain.chat_models' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", probe], check=True)
+
+
+def test_startup_with_agent_disabled_never_imports_agents() -> None:
+    probe = "\n".join(
+        [
+            "import sys",
+            "from fastapi.testclient import TestClient",
+            "import app.main",
+            "with TestClient(app.main.app):",
+            "    pass",
+            "loaded = [m for m in sys.modules if m.split('.')[0] == 'agents']",
+            "assert 'agents.med_index' not in sys.modules, loaded",
+            "assert not loaded, loaded",
+        ]
+    )
+    env = {**os.environ, "AGENT_ENABLED": "false"}
+    subprocess.run([sys.executable, "-c", probe], check=True, env=env)
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session
+
+from agents.med_index import medication_index
+from agents.rag_utils import retrieve_med_docs
+from app.core.config import settings
+from app.core.db import MEDICATION_CHANNEL, listen_for_medication_changes
+from app.models import Medication
+from app.tests.utils.utils import random_lower_string
+
+
+def test_medication_writes_update_agent_index(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    brand = f"brand{random_lower_string()}"
+    data = {"brand_name": brand, "generic": "naproxen", "dose_mg": 220, "cost_usd": 0.3}
+    size_before = len(medication_index)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/medications/",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert r.status_code == 200
+    med_id = r.json()["id"]
+    assert len(medication_index) == size_before + 1
+    docs = retrieve_med_docs(f"what is the dose of {brand}", k=1)
+    assert docs and brand in docs[0] and "220 mg" in docs[0]
+
+    r = client.put(
+        f"{settings.API_V1_STR}/medications/{med_id}",
+        headers=superuser_token_headers,
+        json={"dose_mg": 440},
+    )
+    assert r.status_code == 200
+    assert len(medication_index) == size_before + 1
+    docs = retrieve_med_docs(f"what is the dose of {brand}", k=1)
+    assert docs and "440 mg" in docs[0]
+
+    r = client.delete(
+        f"{settings.API_V1_STR}/medications/{med_id}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    assert len(medication_index) == size_before
+    assert all(brand not in doc for doc in retrieve_med_docs(brand, k=10))
+
+
+def _eventually(check, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_writes_served_by_another_worker_reach_this_index(
+    client: TestClient, db: Session
+) -> None:
+    stop, ready = threading.Event(), threading.Event()
+    listener = threading.Thread(target=listen_for_medication_changes, args=(stop, ready))
+    listener.start()
+    ready.wait(5)
+
+    def announce(med_id: object) -> None:
+        # What another worker's index_medication / unindex_medication sends.
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": MEDICATION_CHANNEL, "payload": f"other-worker:{med_id}"},
+        )
+        db.commit()
+
+    try:
+        med = Medication(
+            brand_name=f"brand{random_lower_string()}",
+            generic="naproxen",
+            dose_mg=220,
+            cost_usd=0.3,
+        )
+        db.add(med)
+        db.commit()
+        med_id = str(med.id)
+        assert medication_index.facts(med_id) is None
+
+        announce(med_id)
+        assert _eventually(lambda: medication_index.facts(med_id) is not None)
+
+        med.dose_mg = 440
+        db.add(med)
+        db.commit()
+        announce(med_id)
+        assert _eventually(lambda: medication_index.facts(med_id).dose_mg == 440)
+
+        db.delete(med)
+        db.commit()
+        announce(med_id)
+        assert _eventually(lambda: medication_index.facts(med_id) is None)
+    finally:
+        stop.set()
+        listener.join()
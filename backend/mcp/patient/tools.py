@@ -11,24 +11,35 @@ from typing import Final
 
 
 PATIENTS: Final[list[dict[str, str]]] = [
-    {"id": "p1", "name": "Alice Smith"},
-    {"id": "p2", "name": "Bob Johnson"},
-    {"id": "p3", "name": "Carol Williams"},
+    {"id": "p1", "name": "Alice Smith", "owner_id": "demo"},
+    {"id": "p2", "name": "Bob Johnson", "owner_id": "demo"},
+    {"id": "p3", "name": "Carol Williams", "owner_id": "demo"},
 ]
 
 
-def list_patients() -> list[dict[str, str]]:
-    """Return a hard-coded list of the current patients.
+def list_patients(
+    owner_id: str | None = None, skip: int = 0, limit: int = 100
+) -> list[dict[str, str]]:
+    """Return a page of the hard-coded list of the current patients.
 
     In a real system this would query a database or service. For now we
     simply return a static list so that the FastMCP demo has predictable
     output.
 
+    Parameters
+    ----------
+    owner_id:
+        Only return the patients of this user; ``None`` returns everyone's.
+    skip, limit:
+        Page through the result, like the ``/patients`` API route.
+
     Returns
     -------
     list[dict[str, str]]
-        Each element contains an ``id`` and ``name`` key identifying a patient.
+        Each element contains an ``id`` and ``name`` key identifying a patient
+        and the ``owner_id`` of the user it belongs to.
     """
 
-    # The slice copy guards against callers mutating our module-level constant.
-    return PATIENTS.copy()
+    patients = [p for p in PATIENTS if owner_id is None or p["owner_id"] == owner_id]
+    # Copies guard against callers mutating our module-level constant.
+    return [dict(p) for p in patients[skip : skip + limit]]